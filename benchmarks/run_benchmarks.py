@@ -0,0 +1,299 @@
+# benchmarks/run_benchmarks.py
+"""
+Banc d'essai des rendus sur des clips synthétiques.
+
+Les sources sont générées localement par ffmpeg (mire testsrc2 + son sinus),
+avec les formats typiques des clips Twitch (720p30, 1080p60) et plusieurs
+durées, puis mises en cache dans data/bench/sources/.
+
+Chaque cas (source × rendu × profil d'encodage) est mesuré sur plusieurs
+échantillons (--samples), chacun dans son propre processus Python, cache de
+rendu désactivé et caches de data/cache (zones webcam, textes, fond et
+séquence de fin préparés) redirigés vers un dossier vide : tous les
+échantillons partent du même état, sans lire ni remplir les caches de
+production. Pour chaque cas sont retenues les médianes de :
+  - le temps réel (wall) et le débit en images de sortie par seconde ;
+  - le pic de mémoire résidente (processus Python et ffmpeg lancés par lui) ;
+  - la taille du fichier produit.
+La comparaison tient compte de la dispersion des échantillons de référence.
+
+Utilisation :
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --durations 10 --formats 720p30 --renders gameplay-ffmpeg --samples 5
+    python benchmarks/run_benchmarks.py compare avant.json apres.json --threshold 0.10
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts'))
+
+SOURCES_DIR = os.path.join(ROOT_DIR, 'data', 'bench', 'sources')
+
+FORMATS = {
+    "720p30":  {"size": (1280, 720), "fps": 30},
+    "1080p60": {"size": (1920, 1080), "fps": 60},
+}
+RENDERS = ("gameplay-moviepy", "gameplay-ffmpeg", "chatting-moviepy")  # chatting : trim_video_for_short
+DEFAULT_DURATIONS = (10, 30)
+DEFAULT_PROFILES = ("fast-draft", "publish")
+DEFAULT_SAMPLES = 3
+
+# Métriques comparées : (clé, True si une valeur plus grande est meilleure)
+COMPARED_METRICS = (("wall_seconds", False), ("frames_per_second", True), ("peak_rss_mb", False))
+
+
+# --------------------------------------------------------------
+# Sources synthétiques
+# --------------------------------------------------------------
+def synthetic_source(fmt, duration):
+    """
+    Clip synthétique « façon Twitch » (H.264 + AAC), généré une fois puis réutilisé.
+    """
+    from moviepy.config import get_setting
+
+    spec = FORMATS[fmt]
+    w, h = spec["size"]
+    path = os.path.join(SOURCES_DIR, f"testsrc-{fmt}-{duration}s.mp4")
+    if os.path.exists(path):
+        return path
+    os.makedirs(SOURCES_DIR, exist_ok=True)
+    print(f"🧪 Génération de la source {os.path.basename(path)}...")
+    tmp_path = path + ".tmp.mp4"
+    cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+           "-f", "lavfi", "-i", f"testsrc2=size={w}x{h}:rate={spec['fps']}:duration={duration}",
+           "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}",
+           "-c:v", "libx264", "-preset", "veryfast", "-g", str(2 * spec['fps']), "-pix_fmt", "yuv420p",
+           "-c:a", "aac", "-b:a", "128k", "-shortest", tmp_path]
+    subprocess.run(cmd, check=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+# --------------------------------------------------------------
+# Exécution d'un cas (dans un processus dédié)
+# --------------------------------------------------------------
+def _run_case(case):
+    """
+    Exécuté dans le processus enfant : rend la source et affiche les mesures en JSON.
+    """
+    import assets_cache
+    import encode_profiles
+    import process_video_gameplay
+    import render_cache
+    import text_render
+    import webcam_detect
+    from process_video import trim_video_for_short
+
+    # Caches isolés de data/cache : état initial identique pour chaque échantillon
+    cache_dir = case["cache_dir"]
+    assets_cache.ASSET_CACHE_DIR = os.path.join(cache_dir, "assets")
+    text_render.TEXT_CACHE_DIR = os.path.join(cache_dir, "text")
+    webcam_detect.LAYOUT_CACHE_FILE = os.path.join(cache_dir, "layouts.json")
+    render_cache.RENDER_CACHE_DIR = os.path.join(cache_dir, "renders")
+
+    clip_data = {"id": "bench", "title": "Benchmark : rendu d'un clip synthétique",
+                 "broadcaster_name": "bench", "game_name": "Benchmark"}
+    kind, backend = case["render"].split("-")
+    output_path = case["output"]
+
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    if kind == "gameplay":
+        result = process_video_gameplay.process_gameplay_clip(
+            case["source"], output_path, case["duration"], clip_data, backend=backend,
+            encode_profile=case["profile"])
+    else:
+        result = trim_video_for_short(case["source"], output_path, case["duration"], clip_data,
+                                      enable_webcam_crop=True, encode_profile=case["profile"])
+    wall = time.perf_counter() - start_wall
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss : Kio sous Linux, octets sous macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    frames = min(case["duration"], process_video_gameplay.MAX_DURATION) * encode_profiles.OUTPUT_FPS
+    print("BENCH_RESULT " + json.dumps({
+        "ok": bool(result),
+        "wall_seconds": round(wall, 3),
+        "cpu_seconds": round(time.process_time() - start_cpu + children.ru_utime + children.ru_stime, 3),
+        "frames_per_second": round(frames / wall, 2) if wall else None,
+        "peak_rss_mb": round(max(own.ru_maxrss, children.ru_maxrss) * unit / 1e6, 1),
+        "output_bytes": os.path.getsize(result) if result else 0,
+    }))
+
+
+def _run_sample(case):
+    env = dict(os.environ, RENDER_CACHE="0")
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--case", json.dumps(case)],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env, cwd=ROOT_DIR)
+    line = next((l for l in proc.stdout.splitlines() if l.startswith("BENCH_RESULT ")), None)
+    if proc.returncode != 0 or line is None:
+        return {"ok": False, "error": proc.stderr.strip()[-500:]}
+    return json.loads(line[len("BENCH_RESULT "):])
+
+
+def run_case(source, fmt, duration, render, profile, workdir, samples=DEFAULT_SAMPLES):
+    """
+    Mesure le cas sur `samples` échantillons ; retourne les médianes et la dispersion du temps réel.
+    """
+    result = {"case": f"{render}/{profile}/{fmt}/{duration}s", "render": render, "profile": profile,
+              "format": fmt, "duration": duration}
+    runs = []
+    for i in range(samples):
+        case = {"source": source, "format": fmt, "duration": duration, "render": render, "profile": profile,
+                "output": os.path.join(workdir, f"{render}-{profile}-{fmt}-{duration}s.mp4"),
+                "cache_dir": tempfile.mkdtemp(prefix=f"cache-{i}-", dir=workdir)}
+        sample = _run_sample(case)
+        if not sample.get("ok"):
+            result.update(ok=False, error=sample.get("error", "rendu invalide"))
+            return result
+        runs.append(sample)
+
+    walls = [r["wall_seconds"] for r in runs]
+    result.update({key: round(statistics.median(r[key] for r in runs), 3)
+                   for key in ("wall_seconds", "cpu_seconds", "frames_per_second", "peak_rss_mb", "output_bytes")})
+    result.update(ok=True, samples=len(runs), wall_samples=walls,
+                  # Dispersion relative du temps réel : écart (max - min) / médiane
+                  wall_spread=round((max(walls) - min(walls)) / result["wall_seconds"], 3))
+    return result
+
+
+def _ffmpeg_version():
+    from moviepy.config import get_setting
+    out = subprocess.run([get_setting("FFMPEG_BINARY"), "-version"], stdout=subprocess.PIPE, text=True).stdout
+    return out.splitlines()[0] if out else None
+
+
+def _git_commit():
+    proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL, text=True, cwd=ROOT_DIR)
+    return proc.stdout.strip() or None
+
+
+def run_suite(durations, formats, renders, profiles, output_path=None, samples=DEFAULT_SAMPLES):
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        for fmt in formats:
+            for duration in durations:
+                source = synthetic_source(fmt, duration)
+                for render in renders:
+                    for profile in profiles:
+                        print(f"⏱️  {render} / {profile} / {fmt} / {duration}s ({samples} échantillon(s))...")
+                        result = run_case(source, fmt, duration, render, profile, workdir, samples)
+                        results.append(result)
+                        if result.get("ok"):
+                            print(f"\t✅ {result['wall_seconds']:.1f}s (±{result['wall_spread']:.0%}), "
+                                  f"{result['frames_per_second']:.1f} img/s, "
+                                  f"{result['peak_rss_mb']:.0f} Mo RSS, {result['output_bytes'] / 1e6:.1f} Mo")
+                        else:
+                            print(f"\t❌ Échec : {result.get('error', 'rendu invalide')}")
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "ffmpeg": _ffmpeg_version(),
+        },
+        "results": results,
+    }
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Résultats écrits dans {output_path}")
+    return report
+
+
+# --------------------------------------------------------------
+# Comparaison de deux exécutions
+# --------------------------------------------------------------
+def compare_reports(baseline, candidate, threshold=0.10):
+    """
+    Compare deux rapports cas par cas. Retourne la liste des régressions :
+    écart défavorable supérieur à `threshold` (en proportion) et à la
+    dispersion des échantillons de référence pour ce cas.
+    """
+    base = {r["case"]: r for r in baseline["results"] if r.get("ok")}
+    regressions = []
+    print(f"{'cas':<48} {'métrique':<18} {'avant':>10} {'après':>10} {'écart':>8}")
+    for result in candidate["results"]:
+        before = base.get(result["case"])
+        if not before or not result.get("ok"):
+            continue
+        # Le bruit de mesure du cas (temps et débit) relève le seuil
+        noise = max(before.get("wall_spread", 0.0), result.get("wall_spread", 0.0))
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            delta = (new - old) / old
+            worse = -delta if higher_is_better else delta
+            limit = threshold if metric == "peak_rss_mb" else max(threshold, noise)
+            flag = " ⚠️" if worse > limit else ""
+            print(f"{result['case']:<48} {metric:<18} {old:>10.2f} {new:>10.2f} {delta:>+7.1%}{flag}")
+            if worse > limit:
+                regressions.append((result["case"], metric, old, new))
+    if regressions:
+        print(f"❌ {len(regressions)} régression(s) au-delà de {threshold:.0%}.")
+    else:
+        print(f"✅ Aucune régression au-delà de {threshold:.0%}.")
+    return regressions
+
+
+def _load_report(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _csv(value, cast=str):
+    return [cast(v) for v in value.split(",") if v]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--case":
+        _run_case(json.loads(sys.argv[2]))
+        sys.exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "compare":
+        parser = argparse.ArgumentParser(description="Compare deux résultats de benchmark.")
+        parser.add_argument("baseline")
+        parser.add_argument("candidate")
+        parser.add_argument("--threshold", type=float, default=0.10,
+                            help="Écart défavorable toléré, en proportion (défaut : 0.10).")
+        args = parser.parse_args(sys.argv[2:])
+        found = compare_reports(_load_report(args.baseline), _load_report(args.candidate), args.threshold)
+        sys.exit(1 if found else 0)
+
+    parser = argparse.ArgumentParser(description="Benchmark des rendus sur des clips synthétiques.")
+    parser.add_argument("--durations", type=lambda v: _csv(v, int), default=list(DEFAULT_DURATIONS),
+                        help="Durées des sources en secondes, séparées par des virgules (défaut : 10,30).")
+    parser.add_argument("--formats", type=_csv, default=list(FORMATS),
+                        help=f"Formats des sources parmi {', '.join(FORMATS)}.")
+    parser.add_argument("--renders", type=_csv, default=list(RENDERS),
+                        help=f"Rendus parmi {', '.join(RENDERS)}.")
+    parser.add_argument("--profiles", type=_csv, default=list(DEFAULT_PROFILES),
+                        help="Profils d'encodage (voir encode_profiles).")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES,
+                        help=f"Échantillons par cas, médiane retenue (défaut : {DEFAULT_SAMPLES}).")
+    parser.add_argument("--output", default=None, help="Fichier JSON de résultats.")
+    args = parser.parse_args()
+
+    unknown = [f for f in args.formats if f not in FORMATS] + [r for r in args.renders if r not in RENDERS]
+    if unknown:
+        parser.error(f"valeur(s) inconnue(s) : {', '.join(unknown)}")
+    report = run_suite(args.durations, args.formats, args.renders, args.profiles, args.output,
+                       max(1, args.samples))
+    sys.exit(0 if all(r.get("ok") for r in report["results"]) else 1)
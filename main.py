@@ -1,139 +1,359 @@
 import sys
 import os
-import json
-from datetime import datetime, date
+import argparse
 
 # Ajoute le dossier scripts au PYTHONPATH
 sys.path.append(os.path.join(os.path.dirname(__file__), 'scripts'))
 
 import get_top_clips
+import history_store
+import fingerprint
+import clip_scoring
+import prescreen
 import download_clip
 import generate_metadata
 import upload_youtube
-from classify_clip_type import classify_clip_type
-from process_video_gameplay import process_gameplay_clip
+from classify_clip_type import classify_clip_type, classify_clips
+from process_video_gameplay import process_gameplay_clip, GAMEPLAY_LAYOUT
 from process_video_chatting import process_chatting_clip
+from pipeline import StagedPipeline
+import workspace
+import render_engine
+import encode_profiles
+import run_state
+import smart_crop
+import instrumentation
 
 # Dossiers et fichiers
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 os.makedirs(DATA_DIR, exist_ok=True)
 
-PUBLISHED_HISTORY_FILE = os.path.join(DATA_DIR, 'published_shorts_history.json')
-RAW_CLIP_PATH         = os.path.join(DATA_DIR, 'temp_raw_clip.mp4')
-PROCESSED_CLIP_PATH   = os.path.join(DATA_DIR, 'temp_processed_short.mp4')
-
 NUMBER_OF_CLIPS_TO_ATTEMPT_TO_PUBLISH = 3
+# Fenêtre de recherche des clips Twitch (en jours)
+CLIP_WINDOW_DAYS = 1
+# Nombre de clips retenus (classement + pré-filtrage) avant tout téléchargement (quota + marge pour les échecs)
+RANKED_CANDIDATES = int(os.getenv("RANKED_CANDIDATES", str(3 * NUMBER_OF_CLIPS_TO_ATTEMPT_TO_PUBLISH)))
+
+# Mode pipeline (étages téléchargement / rendu / upload en parallèle)
+PIPELINE_MODE             = os.getenv("PIPELINE_MODE", "0") == "1"
+PIPELINE_DOWNLOAD_WORKERS = int(os.getenv("PIPELINE_DOWNLOAD_WORKERS", "2"))
+PIPELINE_RENDER_WORKERS   = int(os.getenv("PIPELINE_RENDER_WORKERS", "1"))
+PIPELINE_UPLOAD_WORKERS   = int(os.getenv("PIPELINE_UPLOAD_WORKERS", "1"))
+# Nombre de clips traités « en avance » au-delà du quota, pour compenser les échecs
+PIPELINE_LOOKAHEAD        = int(os.getenv("PIPELINE_LOOKAHEAD", "1"))
+
+def render_clip(clip, downloaded_file, output_path, clip_type=None):
+    """
+    Classifie le clip (si clip_type n'est pas fourni) puis applique le traitement
+    adapté (chatting / gameplay). Retourne le chemin du Short rendu ou None.
+    """
+    # Debug : quel game_name on analyse ?
+    raw_game = clip.get('game_name')
+    print(f"ℹ️  game_name brut du clip : {raw_game!r}")
+
+    # Classification
+    if clip_type is None:
+        clip_type = classify_clip_type(clip)
+    print(f"📂 Type de clip détecté : {clip_type}")
+
+    # Choix du traitement
+    if clip_type == "chatting":
+        print("🛠️  Application du traitement JUST CHATTING")
+        return process_chatting_clip(
+            input_path=downloaded_file,
+            output_path=output_path,
+            max_duration_seconds=get_top_clips.MAX_VIDEO_DURATION_SECONDS,
+            clip_data=clip
+        )
+    print("🛠️  Application du traitement GAMEPLAY")
+    return process_gameplay_clip(
+        input_path=downloaded_file,
+        output_path=output_path,
+        max_duration_seconds=get_top_clips.MAX_VIDEO_DURATION_SECONDS,
+        clip_data=clip
+    )
+
+def publish_clip(clip, processed):
+    """
+    Génère les métadonnées et uploade le Short. Retourne l'ID YouTube ou None.
+    """
+    # Génération des métadonnées
+    with instrumentation.stage("metadata"):
+        metadata = generate_metadata.generate_youtube_metadata(clip)
 
-def load_published_history():
-    if not os.path.exists(PUBLISHED_HISTORY_FILE):
-        return {}
+    # Upload YouTube activé
     try:
-        with open(PUBLISHED_HISTORY_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return {}
-
-def save_published_history(history_data):
-    with open(PUBLISHED_HISTORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(history_data, f, indent=2, ensure_ascii=False)
-
-def get_today_published_ids(history_data):
-    today_str = date.today().isoformat()
-    return [item["twitch_clip_id"] for item in history_data.get(today_str, [])]
-
-def add_to_history(history_data, clip_id, youtube_id):
-    today_str = date.today().isoformat()
-    if today_str not in history_data:
-        history_data[today_str] = []
-    history_data[today_str].append({
-        "twitch_clip_id": clip_id,
-        "youtube_short_id": youtube_id,
-        "timestamp": datetime.now().isoformat()
-    })
-
-def main():
-    history = load_published_history()
-    today_published_ids = get_today_published_ids(history)
+        # Client construit une seule fois par exécution (identifiants, session HTTP, service)
+        with instrumentation.stage("youtube.client"):
+            youtube_client = upload_youtube.get_youtube_client()
+        with instrumentation.stage("youtube.upload"):
+            video_id = upload_youtube.upload_youtube_short(
+                youtube_client,
+                processed,
+                metadata
+            )
+        print(f"🎉 Short YouTube publié ! ID: {video_id}")
+    except Exception as e:
+        print(f"❌ Erreur lors de l'upload YouTube : {e}")
+        video_id = None
+    return video_id
 
-    clips_attempted = []
-    twitch_token = get_top_clips.get_twitch_access_token()
-    if not twitch_token:
-        return
+# ------------------------------------------------------------------
+# Étapes avec points de reprise (voir run_state)
+# ------------------------------------------------------------------
+def download_stage(clip, ws, state):
+    with instrumentation.stage("download", clip_id=clip['id']) as measure:
+        record = state.resume("downloaded", inputs=state.data["stages"]["fetched"]["inputs"])
+        if record:
+            measure["resumed"] = True
+            return record["artifact"]["path"]
+        downloaded_file = download_clip.download_twitch_clip(clip['url'], ws.fresh_raw_path())
+        if downloaded_file:
+            instrumentation.add(bytes_in=instrumentation.file_size(downloaded_file))
+            state.advance("downloaded", inputs=state.data["stages"]["fetched"]["inputs"], artifact=downloaded_file)
+        else:
+            measure["ok"] = False
+            state.fail("téléchargement")
+        return downloaded_file
+
+def classify_stage(clip, state):
+    inputs = run_state.inputs_hash(clip.get('game_id'), clip.get('game_name'))
+    record = state.resume("classified", inputs=inputs)
+    if record:
+        return record["clip_type"]
+    with instrumentation.stage("classify", clip_id=clip['id']):
+        clip_type = classify_clip_type(clip)
+    state.advance("classified", inputs=inputs, clip_type=clip_type)
+    return clip_type
 
-    eligible_clips = get_top_clips.get_eligible_short_clips(
-        access_token=twitch_token,
-        num_clips_per_source=50,
-        days_ago=1,
-        already_published_clip_ids=today_published_ids
+def render_inputs(clip, state, clip_type):
+    """
+    Hash de tout ce qui détermine le Short rendu : contenu du clip brut, type,
+    textes affichés et réglages du rendu.
+    """
+    return run_state.inputs_hash(
+        state.data["stages"]["downloaded"]["artifact"]["sha256"], clip_type,
+        clip.get('title'), clip.get('broadcaster_name'),
+        render_engine.RENDER_BACKEND, encode_profiles.ENCODE_PROFILE, GAMEPLAY_LAYOUT, smart_crop.SMART_CROP
     )
-    if not eligible_clips:
-        return
 
+def render_stage(clip, raw_path, output_path, state):
+    clip_type = classify_stage(clip, state)
+    inputs = render_inputs(clip, state, clip_type)
+    with instrumentation.stage("render", clip_id=clip['id'], clip_type=clip_type) as measure:
+        record = state.resume("rendered", inputs=inputs)
+        if record:
+            measure["resumed"] = True
+            return record["artifact"]["path"]
+        instrumentation.add(bytes_in=instrumentation.file_size(raw_path))
+        processed = render_clip(clip, raw_path, output_path, clip_type=clip_type)
+        if processed:
+            instrumentation.add(bytes_out=instrumentation.file_size(processed))
+            state.advance("rendered", inputs=inputs, artifact=processed)
+        else:
+            measure["ok"] = False
+            state.fail("rendu")
+        return processed
+
+def upload_stage(clip, processed, state):
+    # Upload déjà effectué avant l'interruption : ne jamais publier deux fois
+    record = state.resume("uploaded")
+    if record:
+        return record["video_id"]
+    with instrumentation.stage("upload", clip_id=clip['id']) as measure:
+        video_id = publish_clip(clip, processed)
+        if video_id:
+            state.advance("uploaded", inputs=state.data["stages"]["rendered"]["inputs"], video_id=video_id)
+        else:
+            measure["ok"] = False
+            state.fail("upload")
+    return video_id
+
+def run_sequential(eligible_clips, history, duplicates):
+    clips_attempted = []
     published_count = 0
     for clip in eligible_clips:
         if published_count >= NUMBER_OF_CLIPS_TO_ATTEMPT_TO_PUBLISH:
             break
 
-        if clip['id'] in clips_attempted or clip['id'] in today_published_ids:
+        if clip['id'] in clips_attempted or history.is_published(clip['id']):
             continue
         clips_attempted.append(clip['id'])
 
-        downloaded_file = download_clip.download_twitch_clip(clip['url'], RAW_CLIP_PATH)
-        if not downloaded_file:
-            continue
+        state = run_state.start_clip(clip)
+        ws = workspace.acquire_workspace(clip['id'])
+        try:
+            downloaded_file = download_stage(clip, ws, state)
+            if not downloaded_file:
+                continue
 
-        # Debug : quel game_name on analyse ?
-        raw_game = clip.get('game_name')
-        print(f"ℹ️  game_name brut du clip : {raw_game!r}")
+            # Quasi-doublon d'un clip publié ou déjà retenu : pas de rendu
+            with instrumentation.stage("fingerprint.check", clip_id=clip['id']):
+                duplicate = duplicates.check(clip['id'], downloaded_file)
+            if duplicate:
+                state.fail("quasi-doublon", final=True)
+                continue
 
-        # Classification
-        clip_type = classify_clip_type(clip)
-        print(f"📂 Type de clip détecté : {clip_type}")
-
-        # Choix du traitement
-        if clip_type == "chatting":
-            print("🛠️  Application du traitement JUST CHATTING")
-            processed = process_chatting_clip(
-                input_path=downloaded_file,
-                output_path=PROCESSED_CLIP_PATH,
-                max_duration_seconds=get_top_clips.MAX_VIDEO_DURATION_SECONDS,
-                clip_data=clip
-            )
+            processed = render_stage(clip, downloaded_file, ws.processed_path, state)
+            video_id = upload_stage(clip, processed, state) if processed else None
+        finally:
+            ws.release()
+
+        if video_id:
+            history.add(clip['id'], video_id)
+            duplicates.commit(clip['id'])
+            published_count += 1
         else:
-            print("🛠️  Application du traitement GAMEPLAY")
-            processed = process_gameplay_clip(
-                input_path=downloaded_file,
-                output_path=PROCESSED_CLIP_PATH,
-                max_duration_seconds=get_top_clips.MAX_VIDEO_DURATION_SECONDS,
-                clip_data=clip
-            )
+            duplicates.discard(clip['id'])
+    return published_count
 
-        if not processed:
+def run_pipeline(eligible_clips, history, duplicates):
+    candidates = []
+    seen_ids = set()
+    for clip in eligible_clips:
+        if clip['id'] in seen_ids or history.is_published(clip['id']):
             continue
+        seen_ids.add(clip['id'])
+        candidates.append(clip)
 
-        # Génération des métadonnées
-        metadata = generate_metadata.generate_youtube_metadata(clip)
+    workspaces = {}
+    states = {}
+
+    def download(clip):
+        state = states[clip['id']] = run_state.start_clip(clip)
+        ws = workspace.acquire_workspace(clip['id'])
+        workspaces[clip['id']] = ws
+        raw_path = download_stage(clip, ws, state)
+        # Quasi-doublon d'un clip publié ou déjà retenu : le clip ne passe pas au rendu
+        if not raw_path:
+            return None
+        with instrumentation.stage("fingerprint.check", clip_id=clip['id']):
+            duplicate = duplicates.check(clip['id'], raw_path)
+        if duplicate:
+            state.fail("quasi-doublon", final=True)
+            return None
+        return raw_path
+
+    def render(clip, raw_path):
+        return render_stage(clip, raw_path, workspaces[clip['id']].processed_path, states[clip['id']])
+
+    def upload(clip, processed):
+        return upload_stage(clip, processed, states[clip['id']])
+
+    def on_published(clip, video_id):
+        # Appelé sous le verrou du pipeline : l'historique n'est jamais écrit en parallèle
+        history.add(clip['id'], video_id)
+        duplicates.commit(clip['id'])
+
+    def on_dropped(clip, reason):
+        # Échec, exception ou quota atteint : l'empreinte réservée ne doit plus bloquer d'autres clips
+        duplicates.discard(clip['id'])
+        # Clip traité en avance mais non publié faute de quota : pas un clip interrompu,
+        # il ne doit pas passer devant les clips classés lors des exécutions suivantes
+        state = states.get(clip['id'])
+        if reason == "quota" and state is not None:
+            state.fail("quota atteint", final=True)
+
+    staged = StagedPipeline(
+        download_fn=download,
+        render_fn=render,
+        upload_fn=upload,
+        quota=NUMBER_OF_CLIPS_TO_ATTEMPT_TO_PUBLISH,
+        on_published=on_published,
+        on_dropped=on_dropped,
+        download_workers=PIPELINE_DOWNLOAD_WORKERS,
+        render_workers=PIPELINE_RENDER_WORKERS,
+        upload_workers=PIPELINE_UPLOAD_WORKERS,
+        lookahead=PIPELINE_LOOKAHEAD
+    )
+    try:
+        return len(staged.run(candidates))
+    finally:
+        for ws in workspaces.values():
+            ws.release()
+
+def run_publication(pipeline):
+    with instrumentation.stage("history"):
+        # Historique SQLite (l'ancien JSON est importé à la première ouverture)
+        history = history_store.get_history_store()
+        # Upload terminé mais exécution interrompue avant l'écriture de l'historique
+        for clip_id, video_id in run_state.uploaded_states():
+            if video_id and not history.is_published(clip_id):
+                print(f"↩️ Publication de {clip_id} ({video_id}) reprise dans l'historique.")
+                history.add(clip_id, video_id)
+        # Un clip de la fenêtre de recherche n'a pu être publié qu'après sa création
+        already_published_ids = history.published_clip_ids(since_days=CLIP_WINDOW_DAYS + 1)
+    with instrumentation.stage("workspace.budget"):
+        workspace.enforce_disk_budget()
+
+    with instrumentation.stage("twitch.token"):
+        twitch_token = get_top_clips.get_twitch_access_token()
+    if not twitch_token:
+        return
+
+    with instrumentation.stage("twitch.clips"):
+        eligible_clips = get_top_clips.get_eligible_short_clips(
+            num_clips_per_source=50,
+            days_ago=CLIP_WINDOW_DAYS,
+            already_published_clip_ids=already_published_ids
+        )
+    if not eligible_clips:
+        return
+
+    # Classement, puis pré-filtrage sur métadonnées et vignettes dans l'ordre du classement :
+    # seuls les meilleurs candidats survivants seront téléchargés et rendus
+    with instrumentation.stage("ranking"):
+        eligible_clips = clip_scoring.rank_clips(eligible_clips)
+    with instrumentation.stage("prescreen"):
+        eligible_clips = prescreen.prescreen_clips(eligible_clips, limit=RANKED_CANDIDATES)
+
+    # Clips interrompus lors d'une exécution précédente : repris en premier, à leur dernière étape
+    pending = run_state.pending_clips(exclude_ids=already_published_ids)
+    if pending:
+        print(f"↩️ {len(pending)} clip(s) interrompu(s) repris.")
+        pending_ids = {c['id'] for c in pending}
+        eligible_clips = pending + [c for c in eligible_clips if c['id'] not in pending_ids]
+    if not eligible_clips:
+        return
 
-        # Upload YouTube activé
+    # Classification de tous les candidats en une passe (requêtes Helix groupées + cache)
+    with instrumentation.stage("classify.batch"):
         try:
-            youtube_service = upload_youtube.get_authenticated_service()
-            video_id = upload_youtube.upload_youtube_short(
-                youtube_service,
-                processed,
-                metadata
-            )
-            print(f"🎉 Short YouTube publié ! ID: {video_id}")
+            classify_clips(eligible_clips, twitch_token)
         except Exception as e:
-            print(f"❌ Erreur lors de l'upload YouTube : {e}")
-            video_id = None
+            print(f"⚠️ Classification groupée impossible ({e}), classification clip par clip.")
 
-        if video_id:
-            add_to_history(history, clip['id'], video_id)
-            save_published_history(history)
-            today_published_ids = get_today_published_ids(history)
-            published_count += 1
+    # Index des empreintes des clips déjà publiés (détection des quasi-doublons)
+    with instrumentation.stage("fingerprint.index"):
+        duplicates = fingerprint.DuplicateFilter(history)
+
+    if pipeline:
+        print("🚀 Mode pipeline : téléchargement, rendu et upload en parallèle.")
+        published_count = run_pipeline(eligible_clips, history, duplicates)
+    else:
+        published_count = run_sequential(eligible_clips, history, duplicates)
 
     print(f"\n🎉 {published_count} Short(s) traité(s) avec succès.")
 
+def main(pipeline=None):
+    if pipeline is None:
+        pipeline = PIPELINE_MODE
+    # Mesures par étape (data/metrics/metrics.jsonl) et récapitulatif en fin d'exécution
+    with instrumentation.run(pipeline=pipeline, render_backend=render_engine.RENDER_BACKEND,
+                             encode_profile=encode_profiles.ENCODE_PROFILE):
+        run_publication(pipeline)
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Publication automatique de Shorts à partir de clips Twitch.")
+    parser.add_argument("--pipeline", action="store_true", default=None,
+                        help="Télécharge, rend et uploade les clips en parallèle (pools de workers par étage).")
+    parser.add_argument("--render-backend", choices=render_engine.RENDER_BACKENDS, default=None,
+                        help="Moteur de rendu de la mise en page gameplay (défaut : RENDER_BACKEND ou 'moviepy').")
+    parser.add_argument("--encode-profile", choices=sorted(encode_profiles.ENCODE_PROFILES), default=None,
+                        help="Profil d'encodage des Shorts (défaut : ENCODE_PROFILE ou 'publish').")
+    args = parser.parse_args()
+    if args.render_backend:
+        render_engine.RENDER_BACKEND = args.render_backend
+    if args.encode_profile:
+        encode_profiles.ENCODE_PROFILE = args.encode_profile
+    main(pipeline=args.pipeline)
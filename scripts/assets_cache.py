@@ -0,0 +1,135 @@
+# scripts/assets_cache.py
+"""
+Cache des assets préparés (fond et séquence de fin).
+
+Les assets sont normalisés une seule fois au format exact de sortie
+(résolution, fps, format de pixel, audio) puis réutilisés pour chaque clip.
+La clé de cache contient le hash du fichier source : modifier l'asset
+invalide automatiquement sa version préparée.
+
+La séquence de fin préparée est ensuite concaténée au rendu principal par
+le démuxeur concat de ffmpeg, en copie de flux (aucun ré-encodage).
+"""
+import hashlib
+import os
+import threading
+
+from moviepy.config import get_setting
+from PIL import Image
+
+import encode_profiles
+from ffmpeg_render import run_ffmpeg
+
+ASSETS_DIR      = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'assets'))
+ASSET_CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'cache', 'assets'))
+
+BACKGROUND_ASSET = os.path.join(ASSETS_DIR, 'fond_short.png')
+OUTRO_ASSET      = os.path.join(ASSETS_DIR, 'fin_de_short.mp4')
+
+_lock = threading.Lock()
+_hash_memo = {}
+
+
+def asset_hash(path):
+    """
+    Hash SHA-256 (tronqué) du contenu d'un asset, mémorisé par (chemin, taille, mtime).
+    """
+    st = os.stat(path)
+    memo_key = (path, st.st_size, st.st_mtime)
+    if memo_key not in _hash_memo:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        _hash_memo[memo_key] = h.hexdigest()[:16]
+    return _hash_memo[memo_key]
+
+
+def _cached(name, build):
+    """
+    Retourne le chemin en cache `name`, en le construisant via build(tmp_path) s'il manque.
+    L'écriture passe par un fichier temporaire puis un renommage atomique.
+    """
+    path = os.path.join(ASSET_CACHE_DIR, name)
+    with _lock:
+        if not os.path.exists(path):
+            os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+            root, ext = os.path.splitext(path)
+            tmp_path = f"{root}.tmp{ext}"
+            build(tmp_path)
+            os.replace(tmp_path, path)
+    return path
+
+
+def prepared_background(resolution):
+    """
+    Image de fond à la résolution exacte de sortie (RGB, alpha aplati sur du noir).
+    Retourne None si l'asset est absent.
+    """
+    if not os.path.exists(BACKGROUND_ASSET):
+        return None
+    W, H = resolution
+
+    def build(tmp_path):
+        print(f"🧱 Préparation du fond {os.path.basename(BACKGROUND_ASSET)} en {W}x{H}...")
+        img = Image.open(BACKGROUND_ASSET).convert('RGBA').resize((W, H), Image.LANCZOS)
+        flat = Image.new('RGBA', (W, H), (0, 0, 0, 255))
+        flat.alpha_composite(img)
+        flat.convert('RGB').save(tmp_path)
+
+    return _cached(f"background-{asset_hash(BACKGROUND_ASSET)}-{W}x{H}.png", build)
+
+
+def prepared_outro(resolution, profile, max_duration=None):
+    """
+    Séquence de fin ré-encodée une fois au format de sortie (résolution, fps,
+    yuv420p, AAC stéréo 44,1 kHz) avec le même profil d'encodage que la vidéo
+    principale. Retourne None si l'asset est absent.
+    """
+    if not os.path.exists(OUTRO_ASSET):
+        return None
+    W, H = resolution
+    fps_tag = f"{encode_profiles.OUTPUT_FPS:g}"
+    duration_tag = f"-{max_duration:g}s" if max_duration else ""
+
+    def build(tmp_path):
+        print(f"🧱 Préparation de la séquence de fin en {W}x{H}@{fps_tag}...")
+        cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error", "-i", OUTRO_ASSET]
+        if max_duration:
+            cmd += ["-t", f"{max_duration:.3f}"]
+        cmd += ["-vf", f"scale={W}:{H},fps={fps_tag},setsar=1"]
+        cmd += encode_profiles.ffmpeg_encode_args(profile)
+        cmd += ["-movflags", "+faststart", tmp_path]
+        run_ffmpeg(cmd)
+
+    name = f"outro-{asset_hash(OUTRO_ASSET)}-{W}x{H}-{fps_tag}fps{duration_tag}-{profile['name']}.mp4"
+    return _cached(name, build)
+
+
+def concat_with_outro(main_path, output_path, outro_path, metadata=None):
+    """
+    Concatène la vidéo principale et la séquence de fin préparée par le démuxeur
+    concat de ffmpeg, en copie de flux.
+    """
+    return concat_files([main_path, outro_path], output_path, metadata=metadata)
+
+
+def concat_files(paths, output_path, metadata=None):
+    """
+    Concatène des vidéos encodées avec les mêmes paramètres (démuxeur concat, copie de flux).
+    """
+    list_path = os.path.splitext(output_path)[0] + "-concat.txt"
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+           "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy"]
+    for key, value in (metadata or {}).items():
+        cmd += ["-metadata", f"{key}={value}"]
+    cmd += ["-movflags", "+faststart", output_path]
+    try:
+        run_ffmpeg(cmd)
+    finally:
+        os.remove(list_path)
+    return output_path
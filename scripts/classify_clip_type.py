@@ -1,62 +1,164 @@
 # scripts/classify_clip_type.py
 
 import os
-import requests
-from get_top_clips import get_twitch_access_token
-
-CLIENT_ID        = os.getenv("TWITCH_CLIENT_ID")
-HELIX_GAMES_URL  = "https://api.twitch.tv/helix/games"
-HELIX_CLIPS_URL  = "https://api.twitch.tv/helix/clips"
-
-def fetch_game_name(game_id, token):
-    headers = {
-        "Client-ID": CLIENT_ID,
-        "Authorization": f"Bearer {token}"
-    }
-    resp = requests.get(HELIX_GAMES_URL, headers=headers, params={"id": game_id})
-    resp.raise_for_status()
-    data = resp.json().get("data", [])
-    if data:
-        return data[0].get("name")
-    return None
+import json
+import time
+import threading
+
+import twitch_client
+
+# Helix accepte jusqu'à 100 paramètres 'id' par requête
+HELIX_MAX_IDS = 100
+
+# Cache persistant game_id → nom du jeu
+GAME_CACHE_FILE        = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'cache', 'game_names.json'))
+GAME_CACHE_TTL_SECONDS = int(os.getenv("GAME_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+_cache_lock = threading.Lock()
+_game_cache = None
+
+def _load_game_cache():
+    global _game_cache
+    if _game_cache is None:
+        try:
+            with open(GAME_CACHE_FILE, 'r', encoding='utf-8') as f:
+                _game_cache = json.load(f)
+        except (OSError, ValueError):
+            _game_cache = {}
+    return _game_cache
 
-def fetch_game_id(clip_id, token):
-    headers = {
-        "Client-ID": CLIENT_ID,
-        "Authorization": f"Bearer {token}"
-    }
-    resp = requests.get(HELIX_CLIPS_URL, headers=headers, params={"id": clip_id})
-    resp.raise_for_status()
-    data = resp.json().get("data", [])
-    if data:
-        return data[0].get("game_id")
+def _save_game_cache():
+    os.makedirs(os.path.dirname(GAME_CACHE_FILE), exist_ok=True)
+    tmp_path = GAME_CACHE_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(_game_cache, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, GAME_CACHE_FILE)
+
+def cached_game_name(game_id):
+    """
+    Nom du jeu depuis le cache disque, ou None s'il est absent ou expiré.
+    """
+    with _cache_lock:
+        entry = _load_game_cache().get(str(game_id))
+    if entry and time.time() - entry.get("fetched_at", 0) < GAME_CACHE_TTL_SECONDS:
+        return entry.get("name")
     return None
 
-def classify_clip_type(clip_data):
+def _chunks(items, size=HELIX_MAX_IDS):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def fetch_game_names(game_ids, token=None):
+    """
+    Résout une liste de game_id en noms de jeux, en une requête /helix/games
+    par lot de 100 ids. Les ids déjà en cache (et non expirés) ne sont pas redemandés.
+    Retourne un dict {game_id: nom}.
+    (token est ignoré : le jeton est géré par twitch_client.)
+    """
+    names = {}
+    missing = []
+    for game_id in dict.fromkeys(str(g) for g in game_ids if g):
+        name = cached_game_name(game_id)
+        if name:
+            names[game_id] = name
+        else:
+            missing.append(game_id)
+
+    if missing:
+        client = twitch_client.get_client()
+        now = time.time()
+        for batch in _chunks(missing):
+            for game in client.helix_get("games", [("id", g) for g in batch]).get("data", []):
+                names[game["id"]] = game.get("name")
+        with _cache_lock:
+            cache = _load_game_cache()
+            for game_id in missing:
+                if names.get(game_id):
+                    cache[game_id] = {"name": names[game_id], "fetched_at": now}
+            _save_game_cache()
+    return names
+
+def fetch_game_ids(clip_ids, token=None):
+    """
+    Résout une liste d'ids de clips en game_id, par lots de 100 ids sur /helix/clips.
+    Retourne un dict {clip_id: game_id}.
+    """
+    client = twitch_client.get_client()
+    game_ids = {}
+    for batch in _chunks(list(dict.fromkeys(clip_ids))):
+        for clip in client.helix_get("clips", [("id", c) for c in batch]).get("data", []):
+            game_ids[clip["id"]] = clip.get("game_id")
+    return game_ids
+
+def fetch_game_name(game_id, token=None):
+    return fetch_game_names([game_id], token).get(str(game_id))
+
+def fetch_game_id(clip_id, token=None):
+    return fetch_game_ids([clip_id], token).get(clip_id)
+
+def _type_from_game_name(game_name):
+    if game_name and game_name.lower() == "just chatting":
+        return "chatting"
+    elif not game_name:
+        # Si pas de jeu détecté on considère chatting  
+        return "chatting"
+    else:
+        return "gameplay"
+
+def classify_clips(clips, token=None):
+    """
+    Classe toute une liste de clips en une seule passe : au plus une requête
+    /helix/clips pour les game_id manquants et une requête /helix/games pour
+    les noms absents du cache (par lot de 100 ids).
+    Renseigne clip['game_id'], clip['game_name'] et clip['clip_type'] ; retourne la liste.
+    """
+    if not clips:
+        return clips
+
+    missing_game = [c["id"] for c in clips if not c.get("game_id")]
+    if missing_game:
+        resolved = fetch_game_ids(missing_game)
+        for clip in clips:
+            if not clip.get("game_id"):
+                clip["game_id"] = resolved.get(clip["id"])
+
+    game_ids = [c["game_id"] for c in clips if c.get("game_id")]
+    if any(cached_game_name(g) is None for g in game_ids):
+        names = fetch_game_names(game_ids)
+    else:
+        names = {str(g): cached_game_name(g) for g in game_ids}
+
+    for clip in clips:
+        game_name = names.get(str(clip.get("game_id"))) if clip.get("game_id") else None
+        if game_name:
+            clip["game_name"] = game_name
+        clip["clip_type"] = _type_from_game_name(game_name)
+    print(f"🔍 {len(clips)} clips classés ({sum(c['clip_type'] == 'gameplay' for c in clips)} gameplay).")
+    return clips
+
+def classify_clip_type(clip_data, token=None):
     """
     Renvoie 'chatting' si Just Chatting, 'gameplay' sinon.
+    Utilise le type déjà calculé par classify_clips() s'il est présent.
     """
-    token = get_twitch_access_token()
+    if clip_data.get("clip_type"):
+        return clip_data["clip_type"]
 
     # 1️⃣ Game ID (depuis clip_data ou en fetchant)
     game_id = clip_data.get("game_id")
     print(f"🔍 Debug classify: clip_id={clip_data['id']}, initial game_id={game_id!r}")
 
     if not game_id:
-        game_id = fetch_game_id(clip_data["id"], token)
+        game_id = fetch_game_id(clip_data["id"])
         print(f"🔄 Game ID récupéré via API clips: {game_id!r}")
 
-    # 2️⃣ Game Name
+    # 2️⃣ Game Name (cache disque, sinon API)
     game_name = None
     if game_id:
-        game_name = fetch_game_name(game_id, token)
+        game_name = cached_game_name(game_id)
+        if game_name is None:
+            game_name = fetch_game_name(game_id)
     print(f"🔍 Debug classify: final game_name={game_name!r}")
 
     # 3️⃣ Classification
-    if game_name and game_name.lower() == "just chatting":
-        return "chatting"
-    elif not game_name:
-        # Si pas de jeu détecté on considère chatting  
-        return "chatting"
-    else:
-        return "gameplay"
+    return _type_from_game_name(game_name)
@@ -0,0 +1,141 @@
+# scripts/clip_scoring.py
+"""
+Classement des clips candidats avant tout téléchargement.
+
+Chaque critère est une fonction clip -> valeur brute ; les valeurs sont
+normalisées dans [0, 1] sur l'ensemble des candidats puis pondérées.
+La formule se configure par SCORING_FORMULA, par exemple :
+    SCORING_FORMULA="views_per_hour:1.0,duration_fit:0.5,diversity:0.3"
+
+'diversity' n'est pas un critère par clip : c'est une pénalité appliquée
+lors de la sélection gloutonne, pour chaque clip déjà retenu du même jeu.
+"""
+import math
+import os
+from datetime import datetime, timezone
+
+DEFAULT_SCORING_FORMULA = "views_per_hour:1.0,duration_fit:0.5,diversity:0.3"
+SCORING_FORMULA = os.getenv("SCORING_FORMULA", DEFAULT_SCORING_FORMULA)
+
+# Durée idéale d'un Short et tolérance autour de cette durée (en secondes)
+TARGET_DURATION_SECONDS    = float(os.getenv("TARGET_DURATION_SECONDS", "40"))
+DURATION_TOLERANCE_SECONDS = float(os.getenv("DURATION_TOLERANCE_SECONDS", "25"))
+# Nombre de clips détaillés dans le journal du classement
+RANK_LOG_LIMIT = 10
+# Âge minimal pris en compte, pour ne pas survaloriser un clip créé il y a quelques secondes
+MIN_AGE_HOURS = 0.5
+
+
+def _parse_created_at(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def views_per_hour(clip, now=None):
+    """
+    Vues par heure depuis la création du clip (échelle log, les vues suivant une loi de puissance).
+    """
+    now = now or datetime.now(timezone.utc)
+    created = _parse_created_at(clip.get("created_at"))
+    age_hours = (now - created).total_seconds() / 3600 if created else 24.0
+    return math.log1p(clip.get("view_count", 0) / max(age_hours, MIN_AGE_HOURS))
+
+
+def duration_fit(clip, now=None):
+    """
+    Proximité de la durée du clip avec TARGET_DURATION_SECONDS (gaussienne, 1 = durée idéale).
+    """
+    delta = (float(clip.get("duration", 0.0)) - TARGET_DURATION_SECONDS) / DURATION_TOLERANCE_SECONDS
+    return math.exp(-delta * delta)
+
+
+SCORERS = {
+    "views_per_hour": views_per_hour,
+    "duration_fit": duration_fit,
+}
+
+
+def register_scorer(name, fn):
+    """
+    Ajoute un critère utilisable dans SCORING_FORMULA (fn(clip, now) -> float).
+    """
+    SCORERS[name] = fn
+
+
+def parse_formula(formula=None):
+    """
+    "a:1.0,b:0.5" -> {"a": 1.0, "b": 0.5}. Les critères inconnus sont ignorés.
+    """
+    weights = {}
+    for term in (formula or SCORING_FORMULA).split(","):
+        name, _, weight = term.strip().partition(":")
+        if not name:
+            continue
+        if name != "diversity" and name not in SCORERS:
+            print(f"⚠️ Critère de score inconnu '{name}', ignoré.")
+            continue
+        try:
+            weights[name] = float(weight) if weight else 1.0
+        except ValueError:
+            print(f"⚠️ Poids invalide pour '{name}' : {weight!r}, ignoré.")
+    return weights
+
+
+def _normalized(values):
+    lo, hi = min(values), max(values)
+    if hi - lo < 1e-12:
+        return [1.0 for _ in values]
+    return [(v - lo) / (hi - lo) for v in values]
+
+
+def _apply_scores(clips, weights, now=None):
+    now = now or datetime.now(timezone.utc)
+    scores = [0.0] * len(clips)
+    for name, weight in weights.items():
+        if name == "diversity" or not clips:
+            continue
+        values = _normalized([SCORERS[name](clip, now) for clip in clips])
+        scores = [s + weight * v for s, v in zip(scores, values)]
+    for clip, score in zip(clips, scores):
+        clip["score"] = round(score, 4)
+    return clips
+
+
+def score_clips(clips, formula=None, now=None):
+    """
+    Calcule clip['score'] (somme pondérée des critères normalisés, hors diversité).
+    """
+    return _apply_scores(clips, parse_formula(formula), now)
+
+
+def rank_clips(clips, top_n=None, formula=None, now=None):
+    """
+    Classe les candidats et retourne les top_n meilleurs (tous si top_n est None).
+    Sélection gloutonne : à chaque tour, le score d'un clip est diminué du poids
+    'diversity' pour chaque clip déjà retenu du même jeu.
+    """
+    weights = parse_formula(formula)
+    diversity = weights.get("diversity", 0.0)
+    _apply_scores(clips, weights, now)
+
+    remaining = list(clips)
+    selected = []
+    per_game = {}
+    limit = len(remaining) if top_n is None else min(top_n, len(remaining))
+    while len(selected) < limit:
+        best = max(remaining, key=lambda c: c["score"] - diversity * per_game.get(c.get("game_id"), 0))
+        remaining.remove(best)
+        selected.append(best)
+        per_game[best.get("game_id")] = per_game.get(best.get("game_id"), 0) + 1
+
+    print(f"🏆 {len(selected)} clip(s) retenu(s) sur {len(clips)} candidat(s) :")
+    for clip in selected[:RANK_LOG_LIMIT]:
+        print(f"  • {clip['id']} score={clip['score']:.3f} vues={clip.get('view_count', 0)} "
+              f"durée={clip.get('duration', 0):.0f}s jeu={clip.get('game_id')}")
+    if len(selected) > RANK_LOG_LIMIT:
+        print(f"  … et {len(selected) - RANK_LOG_LIMIT} autre(s).")
+    return selected
@@ -0,0 +1,197 @@
+# scripts/compositor.py
+"""
+Compositeur à calques statiques précomposés.
+
+CompositeVideoClip de MoviePy re-blitte chaque calque (avec son masque) à
+chaque image, y compris le fond et les textes qui ne changent jamais. Ici,
+les calques invariants dans le temps sont détectés et aplatis une seule fois :
+  - ceux situés sous la première vidéo forment une « plaque » RGB pleine image ;
+  - ceux situés au-dessus d'une vidéo sont regroupés en calques RGBA
+    prémultipliés, limités à leur rectangle englobant.
+Pour chaque image, on recopie la plaque dans un tampon préalloué, on y colle
+les zones vidéo, puis on mélange les groupes statiques sur leur seul rectangle.
+"""
+import numpy as np
+from moviepy.editor import ImageClip, VideoClip
+
+
+def _resolve_pos(clip, t, canvas_size):
+    """
+    Position entière (x, y) d'un clip sur le canevas, avec la même sémantique que MoviePy.
+    """
+    W, H = canvas_size
+    w, h = clip.size
+    pos = clip.pos(t)
+    if isinstance(pos, str):
+        pos = {'center': ['center', 'center'], 'left': ['left', 'center'],
+               'right': ['right', 'center'], 'top': ['center', 'top'],
+               'bottom': ['center', 'bottom']}[pos]
+    else:
+        pos = list(pos)
+    if clip.relative_pos:
+        for i, dim in enumerate((W, H)):
+            if not isinstance(pos[i], str):
+                pos[i] = dim * pos[i]
+    if isinstance(pos[0], str):
+        pos[0] = {'left': 0, 'center': (W - w) / 2, 'right': W - w}[pos[0]]
+    if isinstance(pos[1], str):
+        pos[1] = {'top': 0, 'center': (H - h) / 2, 'bottom': H - h}[pos[1]]
+    return int(pos[0]), int(pos[1])
+
+
+def _is_static(clip, duration, canvas_size):
+    """
+    Un calque est statique s'il s'agit d'une image fixe (ImageClip, ColorClip, texte),
+    au masque lui-même fixe, et dont la position ne dépend pas du temps.
+    """
+    if not isinstance(clip, ImageClip):
+        return False
+    if clip.mask is not None and not isinstance(clip.mask, ImageClip):
+        return False
+    ts = (0, duration / 2, duration) if duration else (0,)
+    return len({_resolve_pos(clip, t, canvas_size) for t in ts}) == 1
+
+
+def _clip_rect(pos, size, canvas_size):
+    """
+    Intersection d'un calque avec le canevas : (slices canevas, slices calque) ou None.
+    """
+    (x, y), (w, h), (W, H) = pos, size, canvas_size
+    x0, y0, x1, y1 = max(0, x), max(0, y), min(W, x + w), min(H, y + h)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return ((slice(y0, y1), slice(x0, x1)),
+            (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x)))
+
+
+class _StaticGroup:
+    """
+    Calques statiques consécutifs aplatis en un seul RGBA prémultiplié (float32).
+    """
+    def __init__(self, canvas_size):
+        W, H = canvas_size
+        self.canvas_size = canvas_size
+        self.rgb = np.zeros((H, W, 3), dtype=np.float32)
+        self.alpha = np.zeros((H, W), dtype=np.float32)
+        self.rects = []
+
+    def add(self, clip, pos):
+        rect = _clip_rect(pos, clip.size, self.canvas_size)
+        if rect is None:
+            return
+        dst, src = rect
+        rgb = clip.get_frame(0)[src].astype(np.float32)
+        if clip.mask is not None:
+            a = np.asarray(clip.mask.get_frame(0), dtype=np.float32)[src]
+        else:
+            a = np.ones(rgb.shape[:2], dtype=np.float32)
+        # Opérateur « over » en alpha prémultiplié
+        self.rgb[dst] = rgb * a[..., None] + self.rgb[dst] * (1.0 - a[..., None])
+        self.alpha[dst] = a + self.alpha[dst] * (1.0 - a)
+        self.rects.append((dst[0].start, dst[0].stop, dst[1].start, dst[1].stop))
+
+    def _merged_rects(self):
+        """
+        Fusionne les rectangles qui se chevauchent : deux textes éloignés (haut et bas)
+        restent deux petites zones au lieu d'un rectangle couvrant toute l'image.
+        """
+        rects = list(self.rects)
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(rects)):
+                for j in range(i + 1, len(rects)):
+                    a, b = rects[i], rects[j]
+                    if a[0] < b[1] and b[0] < a[1] and a[2] < b[3] and b[2] < a[3]:
+                        rects[i] = (min(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3]))
+                        del rects[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return rects
+
+    def finalize(self):
+        """
+        Découpe le groupe en zones (region, rgb prémultiplié, 1 - alpha, tampon de travail),
+        chacune réduite à son rectangle englobant non transparent.
+        """
+        parts = []
+        for y0, y1, x0, x1 in self._merged_rects():
+            ys, xs = np.nonzero(self.alpha[y0:y1, x0:x1] > 0)
+            if len(ys) == 0:
+                continue
+            region = (slice(y0 + ys.min(), y0 + ys.max() + 1), slice(x0 + xs.min(), x0 + xs.max() + 1))
+            premult = self.rgb[region] + 0.5  # +0.5 : arrondi lors de la conversion en uint8
+            inv_alpha = (1.0 - self.alpha[region])[..., None]
+            scratch = np.empty(premult.shape, dtype=np.float32)
+            parts.append((region, premult, inv_alpha, scratch))
+        return parts
+
+
+def composite(clips, size, duration, bg_color=(0, 0, 0)):
+    """
+    Remplace CompositeVideoClip(clips, size=size).set_duration(duration).
+    Le premier clip est dessous ; le clip retourné n'a pas d'audio.
+    """
+    W, H = size
+    plate = np.empty((H, W, 3), dtype=np.float32)
+    plate[:] = bg_color
+
+    steps = []
+    group = None
+    for clip in clips:
+        if _is_static(clip, duration, size):
+            pos = _resolve_pos(clip, 0, size)
+            if not steps:
+                # Sous toute vidéo : directement aplati dans la plaque
+                flat = _StaticGroup(size)
+                flat.add(clip, pos)
+                plate = flat.rgb + plate * (1.0 - flat.alpha[..., None])
+            else:
+                if group is None:
+                    group = _StaticGroup(size)
+                group.add(clip, pos)
+            continue
+
+        if group is not None:
+            steps.extend(('static', part) for part in group.finalize())
+            group = None
+        steps.append(('video', clip))
+
+    if group is not None:
+        steps.extend(('static', part) for part in group.finalize())
+
+    plate = np.clip(plate + 0.5, 0, 255).astype(np.uint8)
+    buffer = np.empty_like(plate)
+
+    def make_frame(t):
+        np.copyto(buffer, plate)
+        for kind, payload in steps:
+            if kind == 'video':
+                _blit_video(buffer, payload, t, size)
+            else:
+                region, premult, inv_alpha, scratch = payload
+                target = buffer[region]
+                np.multiply(target, inv_alpha, out=scratch)
+                np.add(scratch, premult, out=scratch)
+                np.copyto(target, scratch, casting='unsafe')
+        return buffer
+
+    return VideoClip(make_frame, duration=duration)
+
+
+def _blit_video(buffer, clip, t, canvas_size):
+    ct = t - clip.start
+    if ct < 0 or (clip.end is not None and t >= clip.end):
+        return
+    frame = clip.get_frame(ct)
+    rect = _clip_rect(_resolve_pos(clip, ct, canvas_size), (frame.shape[1], frame.shape[0]), canvas_size)
+    if rect is None:
+        return
+    dst, src = rect
+    if clip.mask is None:
+        buffer[dst] = frame[src]
+    else:
+        a = clip.mask.get_frame(ct)[src][..., None]
+        buffer[dst] = frame[src] * a + buffer[dst] * (1.0 - a)
@@ -1,12 +1,156 @@
 # scripts/download_clip.py
-import subprocess
-import sys
+"""
+Téléchargement des clips Twitch avec yt-dlp utilisé comme bibliothèque.
+
+Une seule instance YoutubeDL est partagée par le processus (pas de démarrage
+d'interpréteur ni de chargement des extracteurs à chaque clip). Le format
+demandé est un MP4 progressif unique (vidéo + audio) d'au plus
+DOWNLOAD_MAX_HEIGHT pixels de haut : aucune étape de fusion n'est nécessaire.
+
+Les téléchargements passent par un fichier .part et reprennent là où ils
+s'étaient arrêtés. Plusieurs clips peuvent être téléchargés en parallèle
+(download_clips ou workers du pipeline) ; le débit total de l'exécution
+est plafonné par DOWNLOAD_RATE_LIMIT (ex. "8M" octets/s, "0" = illimité).
+"""
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yt_dlp
+from yt_dlp.utils import parse_bytes
+
+DOWNLOAD_MAX_HEIGHT = int(os.getenv("DOWNLOAD_MAX_HEIGHT", "1080"))
+DOWNLOAD_RATE_LIMIT = parse_bytes(os.getenv("DOWNLOAD_RATE_LIMIT", "0")) or 0
+DOWNLOAD_WORKERS    = int(os.getenv("DOWNLOAD_WORKERS", "3"))
+# Pas d'affichage de la progression : une ligne tous les N % au plus
+PROGRESS_STEP_PERCENT = 25
+
+
+def download_format(max_height=DOWNLOAD_MAX_HEIGHT):
+    """
+    Sélecteur yt-dlp d'un MP4 progressif (vidéo + audio dans le même fichier).
+    """
+    h = int(max_height)
+    return (f"best[ext=mp4][height<={h}][vcodec!=none][acodec!=none]"
+            f"/best[ext=mp4][height<={h}]/best[height<={h}]/best")
+
+
+class _BandwidthLimiter:
+    """
+    Plafond de débit partagé par tous les téléchargements de l'exécution :
+    le hook de progression de yt-dlp attend tant que le volume reçu dépasse
+    rate * temps écoulé.
+    """
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._consumed = 0
+        self._seen = {}
+
+    def start_file(self, filename, resumed_bytes):
+        with self._lock:
+            # Les octets déjà présents dans le .part ne transitent pas par le réseau
+            self._seen[filename] = resumed_bytes
+
+    def consume(self, filename, downloaded_bytes):
+        if not self.rate:
+            return
+        with self._lock:
+            delta = max(0, downloaded_bytes - self._seen.get(filename, 0))
+            self._seen[filename] = downloaded_bytes
+            self._consumed += delta
+            ahead = self._consumed / self.rate - (time.monotonic() - self._start)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+class DownloadEngine:
+    def __init__(self, max_height=DOWNLOAD_MAX_HEIGHT, rate_limit=DOWNLOAD_RATE_LIMIT):
+        self.limiter = _BandwidthLimiter(rate_limit)
+        self._progress = {}
+        self._extract_lock = threading.Lock()
+        self.ydl = yt_dlp.YoutubeDL({
+            "format": download_format(max_height),
+            "quiet": True,
+            "noprogress": True,
+            "no_warnings": True,
+            "continuedl": True,   # reprise des fichiers .part
+            "nopart": False,
+            "retries": 5,
+            "fragment_retries": 5,
+            "progress_hooks": [self._on_progress],
+        })
+
+    def _on_progress(self, status):
+        filename = status.get("filename")
+        downloaded = status.get("downloaded_bytes") or 0
+        self.limiter.consume(filename, downloaded)
+        total = status.get("total_bytes") or status.get("total_bytes_estimate")
+        if status.get("status") == "downloading" and total:
+            step = int(100 * downloaded / total) // PROGRESS_STEP_PERCENT * PROGRESS_STEP_PERCENT
+            if step > self._progress.get(filename, -1):
+                self._progress[filename] = step
+                print(f"  ⬇️ {os.path.basename(os.path.dirname(filename))} : {step}% "
+                      f"({downloaded / 1e6:.1f} / {total / 1e6:.1f} Mo)")
+
+    def download(self, clip_url, output_path):
+        """
+        Télécharge un clip vers output_path. Retourne le chemin ou None en cas d'échec.
+        """
+        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            # Le fichier final n'apparaît qu'une fois le .part complet : il est valide
+            print(f"✅ Clip déjà téléchargé : {output_path}")
+            return output_path
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        try:
+            # L'extraction (requêtes de métadonnées) est sérialisée ; le transfert ne l'est pas
+            with self._extract_lock:
+                info = self.ydl.extract_info(clip_url, download=False)
+            part_path = output_path + ".part"
+            resumed = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if resumed:
+                print(f"↩️ Reprise du téléchargement à {resumed / 1e6:.1f} Mo.")
+            print(f"🎞️ Format retenu : {info.get('format_id')} ({info.get('height') or '?'}p, {info.get('ext')})")
+            self.limiter.start_file(output_path, resumed)
+            # dl() retourne le tuple (succès, téléchargement réel) du downloader : toujours vrai en soi
+            ok, _ = self.ydl.dl(output_path, info)
+            if not ok:
+                print("❌ Erreur lors du téléchargement du clip.")
+                return None
+        except yt_dlp.utils.YoutubeDLError as e:
+            print(f"❌ Erreur yt-dlp lors du téléchargement du clip : {e}")
+            return None
+        finally:
+            self._progress.pop(output_path, None)
+
+        if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+            print(f"❌ Téléchargement terminé sans fichier valide à {output_path}.")
+            return None
+        print(f"✅ Clip téléchargé avec succès vers : {output_path}")
+        return output_path
+
+
+_engine_lock = threading.Lock()
+_engine = None
+
+
+def get_engine():
+    """
+    Moteur de téléchargement partagé du processus (créé à la première utilisation).
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = DownloadEngine()
+        return _engine
+
 
 def download_twitch_clip(clip_url, output_path):
     """
-    Télécharge un clip Twitch en utilisant yt-dlp.
-    Le clip est enregistré au format MP4.
+    Télécharge un clip Twitch au format MP4.
 
     Args:
         clip_url (str): L'URL complète du clip Twitch (ex: https://www.twitch.tv/CLIP_ID).
@@ -17,47 +161,34 @@ def download_twitch_clip(clip_url, output_path):
     """
     print(f"📥 Téléchargement du clip Twitch depuis : {clip_url}")
     print(f"Destination : {output_path}")
-
-    # Assurez-vous que le répertoire de destination existe
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
     try:
-        # Commande yt-dlp pour télécharger la meilleure qualité vidéo disponible
-        # La durée max de youtube-dl est 1h, donc ça coupe automatiquement la vidéo à 1h
-        command = [
-            sys.executable, "-m", "yt_dlp",
-            "-f", "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
-            "--output", output_path,
-            clip_url
-        ]
-        
-        # Exécute la commande en temps réel pour voir la progression
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-        for line in process.stdout:
-            print(line, end='') # Affiche la sortie de yt-dlp en temps réel
-
-        process.wait() # Attend que le processus se termine
-
-        if process.returncode == 0:
-            print(f"✅ Clip téléchargé avec succès vers : {output_path}")
-            return output_path
-        else:
-            print(f"❌ Erreur lors du téléchargement du clip. Code de retour : {process.returncode}")
-            return None
-    except FileNotFoundError:
-        print("❌ Erreur : yt-dlp n'est pas trouvé. Assurez-vous qu'il est installé (pip install yt-dlp).")
-        return None
+        return get_engine().download(clip_url, output_path)
     except Exception as e:
         print(f"❌ Une erreur inattendue est survenue lors du téléchargement : {e}")
         return None
 
+
+def download_clips(jobs, workers=DOWNLOAD_WORKERS):
+    """
+    Télécharge plusieurs clips en parallèle.
+
+    Args:
+        jobs (list): Liste de (clip_url, output_path).
+
+    Returns:
+        list: Pour chaque job, le chemin téléchargé ou None.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return list(pool.map(lambda job: download_twitch_clip(*job), jobs))
+
+
 if __name__ == "__main__":
     # Exemple d'utilisation (pour les tests locaux)
     # Ce script est destiné à être appelé par main.py
     print("Ce script est conçu pour être exécuté via main.py.")
     print("Si vous le testez directement, assurez-vous d'avoir un CLIP_URL valide.")
-    # clip_url_test = "https://www.twitch.tv/Gotaga/clip/DignifiedPoliteTrollBudBlast-u-U6k-n2b7v2vX7Z" 
+    # clip_url_test = "https://www.twitch.tv/Gotaga/clip/DignifiedPoliteTrollBudBlast-u-U6k-n2b7v2vX7Z"
     # output_file_test = os.path.join("data", "downloaded_clip_test.mp4")
     # downloaded_file = download_twitch_clip(clip_url_test, output_file_test)
     # if downloaded_file:
-    #     print(f"Test download complete: {downloaded_file}")
\ No newline at end of file
+    #     print(f"Test download complete: {downloaded_file}")
@@ -0,0 +1,78 @@
+# scripts/encode_profiles.py
+"""
+Profils d'encodage nommés (compromis vitesse / qualité).
+
+Un profil fixe le preset x264, le CRF, le nombre de threads, la taille de GOP
+et le débit audio. Il est appliqué de la même façon par tous les moteurs de
+rendu et par la préparation de la séquence de fin : toutes les sorties
+partagent ainsi les mêmes fps, format de pixel et paramètres audio, ce qui
+permet de concaténer la fin sans ré-encodage.
+
+Sélection : ENCODE_PROFILE (variable d'environnement) ou --encode-profile.
+"""
+import os
+
+OUTPUT_FPS     = 30
+PIX_FMT        = "yuv420p"
+AUDIO_RATE     = 44100
+AUDIO_CHANNELS = 2
+
+ENCODE_PROFILES = {
+    # Itérations locales : encodage rapide, qualité suffisante pour vérifier la mise en page
+    "fast-draft": {"preset": "veryfast", "crf": 28, "threads": 0, "gop": 2 * OUTPUT_FPS, "audio_bitrate": "128k"},
+    # Publication YouTube : YouTube ré-encode de toute façon, inutile d'aller plus loin
+    "publish":    {"preset": "medium",   "crf": 21, "threads": 0, "gop": 2 * OUTPUT_FPS, "audio_bitrate": "160k"},
+    # Archivage : qualité élevée, encodage lent
+    "archive":    {"preset": "slow",     "crf": 16, "threads": 0, "gop": 2 * OUTPUT_FPS, "audio_bitrate": "256k"},
+}
+ENCODE_PROFILE = os.getenv("ENCODE_PROFILE", "publish")
+
+
+def get_encode_profile(name=None):
+    """
+    Retourne le profil demandé (ou le profil par défaut) sous forme de dict, avec sa clé 'name'.
+    """
+    name = name or ENCODE_PROFILE
+    if name not in ENCODE_PROFILES:
+        print(f"⚠️ Profil d'encodage inconnu '{name}', utilisation de 'publish'.")
+        name = "publish"
+    return dict(ENCODE_PROFILES[name], name=name)
+
+
+def _x264_params(profile):
+    # GOP fixe (pas d'images clés sur changement de scène) : la structure du flux ne
+    # dépend que de la durée, ce qui garde les segments concaténables entre eux.
+    gop = profile['gop']
+    return ["-crf", str(profile['crf']), "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0"]
+
+
+def ffmpeg_video_args(profile, fps=OUTPUT_FPS):
+    return (["-c:v", "libx264", "-preset", profile['preset'], "-pix_fmt", PIX_FMT,
+             "-r", f"{fps:g}", "-threads", str(profile['threads'])]
+            + _x264_params(profile))
+
+
+def ffmpeg_audio_args(profile):
+    return ["-c:a", "aac", "-b:a", profile['audio_bitrate'],
+            "-ar", str(AUDIO_RATE), "-ac", str(AUDIO_CHANNELS)]
+
+
+def ffmpeg_encode_args(profile, fps=OUTPUT_FPS):
+    return ffmpeg_video_args(profile, fps) + ffmpeg_audio_args(profile)
+
+
+def moviepy_write_kwargs(profile, fps=OUTPUT_FPS):
+    """
+    Arguments de VideoClip.write_videofile équivalents au profil.
+    """
+    return {
+        "fps": fps,
+        "codec": "libx264",
+        "preset": profile['preset'],
+        "threads": profile['threads'] or None,
+        "audio_codec": "aac",
+        "audio_bitrate": profile['audio_bitrate'],
+        "audio_fps": AUDIO_RATE,
+        "audio_nbytes": 2,
+        "ffmpeg_params": _x264_params(profile),
+    }
@@ -0,0 +1,163 @@
+# scripts/ffmpeg_render.py
+"""
+Moteur de rendu « ffmpeg » : la mise en page complète (fond, zones recadrées,
+textes) est traduite en un seul graphe `filter_complex` exécuté par ffmpeg.
+Aucune image ne transite par Python/NumPy. La séquence de fin est ajoutée
+ensuite en copie de flux (voir assets_cache.concat_with_outro).
+"""
+import re
+import subprocess
+
+from moviepy.config import get_setting
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+from encode_profiles import OUTPUT_FPS as FPS, AUDIO_RATE
+
+AUDIO_FORMAT = f"aformat=sample_fmts=fltp:sample_rates={AUDIO_RATE}:channel_layouts=stereo"
+
+
+def probe(path):
+    """
+    Retourne (largeur, hauteur, durée, audio_présent) pour un fichier vidéo.
+    """
+    infos = ffmpeg_parse_infos(path)
+    w, h = infos['video_size']
+    return w, h, infos['duration'], infos['audio_found']
+
+
+def visible_part(pos, size, canvas):
+    """
+    Partie visible d'une zone de taille `size` placée en `pos` sur le canevas :
+    retourne (crop_w, crop_h, crop_x, crop_y, overlay_x, overlay_y) ou None si hors champ.
+    """
+    (x, y), (w, h), (W, H) = pos, size, canvas
+    x0, y0 = max(0, -x), max(0, -y)
+    x1, y1 = min(w, W - x), min(h, H - y)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x1 - x0, y1 - y0, x0, y0, max(0, x), max(0, y)
+
+
+def crop_filter(region, time_offset=0.0):
+    """
+    Filtre crop de la zone source d'une région. Si la région porte une expression
+    'crop_x' (fonction de t, voir smart_crop), la fenêtre se déplace au cours du temps ;
+    time_offset est l'instant du clip correspondant à t = 0 (rendu d'une partie du clip).
+    """
+    x1, y1, x2, y2 = region['crop']
+    x = x1
+    if region.get('crop_x'):
+        expr = region['crop_x']
+        if time_offset:
+            expr = re.sub(r"\bt\b", f"(t+{time_offset:.3f})", expr)
+        x = f"'{expr}'"
+    return f"crop={x2 - x1}:{y2 - y1}:{x}:{y1}"
+
+
+def build_layout_command(input_path, output_path, duration, source_has_audio,
+                         resolution, regions, background_path=None, overlays=(),
+                         start=0.0, encode_args=(), metadata=None, with_audio=True):
+    """
+    Construit la commande ffmpeg qui rend la mise en page en une seule passe.
+
+    regions     : liste de zones {'crop': (x1, y1, x2, y2), 'size': (w, h), 'pos': (x, y)},
+                  dans l'ordre d'empilement (la première est dessous) ; 'crop_x' optionnel
+                  (expression ffmpeg) pour une fenêtre mobile.
+    overlays    : liste d'images RGBA {'path': ..., 'pos': (x, y)} posées au-dessus des zones.
+    encode_args : arguments d'encodage (voir encode_profiles.ffmpeg_encode_args).
+    with_audio  : False pour une sortie vidéo seule (segment d'un rendu parallèle).
+    """
+    W, H = resolution
+    ffmpeg = get_setting("FFMPEG_BINARY")
+    cmd = [ffmpeg, "-y", "-loglevel", "error"]
+    filters = []
+
+    # Entrée 0 : la source, coupée par le démuxeur avec une marge d'une seconde : la durée
+    # exacte (nombre d'images) est fixée par le fond, l'audio par atrim. Une coupe franche
+    # à la durée ferait perdre la dernière image à chaque segment d'un rendu parallèle.
+    cmd += ["-ss", f"{start:.3f}", "-t", f"{duration + 1.0:.3f}", "-i", input_path]
+
+    # Entrée 1 : le fond (image bouclée) ou une couleur unie
+    if background_path:
+        cmd += ["-loop", "1", "-framerate", str(FPS), "-t", f"{duration:.3f}", "-i", background_path]
+        filters.append(f"[1:v]scale={W}:{H},setsar=1,format=yuv420p[base0]")
+    else:
+        cmd += ["-f", "lavfi", "-t", f"{duration:.3f}", "-i", f"color=c=black:s={W}x{H}:r={FPS}"]
+        filters.append("[1:v]format=yuv420p[base0]")
+    next_input = 2
+
+    # Zones recadrées / redimensionnées, décodées une seule fois puis dupliquées
+    visible = [(r, visible_part(r['pos'], r['size'], (W, H))) for r in regions]
+    visible = [(r, v) for r, v in visible if v]
+    if visible:
+        splits = "".join(f"[src{i}]" for i in range(len(visible)))
+        filters.append(f"[0:v]fps={FPS},split={len(visible)}{splits}" if len(visible) > 1
+                       else f"[0:v]fps={FPS}[src0]")
+
+    base = "base0"
+    for i, (region, (cw, ch, cx, cy, ox, oy)) in enumerate(visible):
+        w, h = region['size']
+        filters.append(
+            f"[src{i}]{crop_filter(region, start)},scale={w}:{h},"
+            f"crop={cw}:{ch}:{cx}:{cy}[reg{i}]"
+        )
+        filters.append(f"[{base}][reg{i}]overlay={ox}:{oy}:shortest=1[base{i + 1}]")
+        base = f"base{i + 1}"
+
+    # Textes et autres images fixes : une seule image par entrée, répétée par overlay
+    for j, overlay in enumerate(overlays):
+        cmd += ["-i", overlay['path']]
+        x, y = overlay['pos']
+        filters.append(f"[{base}][{next_input}:v]overlay={int(x)}:{int(y)}:format=auto[ov{j}]")
+        base = f"ov{j}"
+        next_input += 1
+
+    # Le fond (ou la couleur unie) donne déjà la cadence FPS et le nombre exact d'images
+    filters.append(f"[{base}]format=yuv420p,setsar=1[mainv]")
+
+    # Audio de la source (ou silence si le clip n'en a pas)
+    if with_audio:
+        filters.append(_audio_filter("0:a", duration, source_has_audio, "maina"))
+
+    cmd += ["-filter_complex", ";".join(filters), "-map", "[mainv]"]
+    if with_audio:
+        cmd += ["-map", "[maina]"]
+    cmd += list(encode_args)
+    for key, value in (metadata or {}).items():
+        cmd += ["-metadata", f"{key}={value}"]
+    cmd += ["-movflags", "+faststart", output_path]
+    return cmd
+
+
+def _audio_filter(source, duration, source_has_audio, label):
+    if source_has_audio:
+        return f"[{source}]atrim=duration={duration:.3f},{AUDIO_FORMAT}[{label}]"
+    return f"anullsrc=r={AUDIO_RATE}:cl=stereo,atrim=duration={duration:.3f}[{label}]"
+
+
+def build_audio_mux_command(video_path, input_path, output_path, duration, source_has_audio,
+                            audio_args=(), metadata=None):
+    """
+    Construit la commande qui ajoute à une vidéo sans son (segments concaténés d'un
+    rendu parallèle) l'audio des `duration` premières secondes de la source, encodé
+    en une seule fois : un seul délai d'amorçage AAC, comme un rendu d'un seul tenant.
+    """
+    cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error", "-i", video_path]
+    if source_has_audio:
+        cmd += ["-t", f"{duration + 1.0:.3f}", "-i", input_path]
+    cmd += ["-filter_complex", _audio_filter("1:a", duration, source_has_audio, "maina"),
+            "-map", "0:v", "-map", "[maina]", "-c:v", "copy"]
+    cmd += list(audio_args)
+    for key, value in (metadata or {}).items():
+        cmd += ["-metadata", f"{key}={value}"]
+    cmd += ["-movflags", "+faststart", output_path]
+    return cmd
+
+
+def run_ffmpeg(cmd):
+    """
+    Exécute une commande ffmpeg ; lève RuntimeError avec la sortie d'erreur en cas d'échec.
+    """
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg a échoué (code {proc.returncode}) : {proc.stderr.strip()[-2000:]}")
@@ -0,0 +1,211 @@
+# scripts/fingerprint.py
+"""
+Empreintes perceptuelles des clips téléchargés, pour écarter les quasi-doublons.
+
+Twitch publie souvent plusieurs clips du même moment sous des ids différents.
+Avant le rendu, chaque clip est réduit à une empreinte compacte :
+  - vidéo : un dHash 64 bits par seconde (image 9x8 en niveaux de gris),
+    décodé et réduit directement par ffmpeg ;
+  - audio (optionnel) : une signature chroma 12 bits par seconde.
+Deux clips sont comparés sur le meilleur décalage temporel (deux clips du
+même moment ne commencent pas au même instant) : la distance est la
+proportion moyenne de bits différents sur la partie commune.
+
+Les empreintes des clips publiés sont conservées dans l'historique SQLite
+(voir history_store) ; celles du lot en cours restent en mémoire.
+"""
+import os
+import subprocess
+import threading
+
+import numpy as np
+from moviepy.config import get_setting
+
+# Échantillonnage (empreintes par seconde) et taille du dHash
+FINGERPRINT_FPS = 1
+_HASH_W, _HASH_H = 9, 8
+# Distance (proportion de bits différents) en dessous de laquelle deux clips sont des doublons ;
+# deux vidéos sans rapport sont autour de 0.5
+FINGERPRINT_MAX_DISTANCE = float(os.getenv("FINGERPRINT_MAX_DISTANCE", "0.15"))
+# Recouvrement minimal (en secondes) pour qu'une comparaison soit significative
+FINGERPRINT_MIN_OVERLAP = 3
+FINGERPRINT_AUDIO = os.getenv("FINGERPRINT_AUDIO", "1") == "1"
+AUDIO_WEIGHT = 0.3
+# Ancienneté maximale des publications comparées (en jours)
+FINGERPRINT_LOOKBACK_DAYS = int(os.getenv("FINGERPRINT_LOOKBACK_DAYS", "30"))
+
+_AUDIO_RATE = 8000
+# Bits utiles d'une signature audio (une par classe de hauteur), stockée sur 16 bits
+_AUDIO_BITS = 12
+# Images quasi uniformes (noir, fondu) : leur dHash n'a pas de sens, elles sont ignorées
+_FLAT_FRAME_STD = 2.0
+
+
+def _decode(cmd):
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode('utf-8', 'replace').strip())
+    return proc.stdout
+
+
+def video_hashes(path):
+    """
+    dHash 64 bits par seconde de vidéo (0 pour les images uniformes).
+    """
+    raw = _decode([get_setting("FFMPEG_BINARY"), "-loglevel", "error", "-i", path, "-an",
+                   "-vf", f"fps={FINGERPRINT_FPS},scale={_HASH_W}:{_HASH_H}:flags=area,format=gray",
+                   "-f", "rawvideo", "-"])
+    frames = np.frombuffer(raw, dtype=np.uint8)
+    frames = frames[:len(frames) // (_HASH_W * _HASH_H) * _HASH_W * _HASH_H]
+    frames = frames.reshape(-1, _HASH_H, _HASH_W).astype(np.int16)
+    bits = frames[:, :, 1:] > frames[:, :, :-1]
+    hashes = np.packbits(bits.reshape(len(frames), 64), axis=1).view('>u8').ravel().astype(np.uint64)
+    hashes[frames.reshape(len(frames), -1).std(axis=1) < _FLAT_FRAME_STD] = 0
+    return hashes
+
+
+def audio_hashes(path):
+    """
+    Signature chroma 12 bits par seconde : bit i = la classe de hauteur i
+    est plus énergique que la classe i+1. Tableau vide si le clip n'a pas d'audio.
+    """
+    try:
+        raw = _decode([get_setting("FFMPEG_BINARY"), "-loglevel", "error", "-i", path, "-vn",
+                       "-ac", "1", "-ar", str(_AUDIO_RATE), "-f", "s16le", "-"])
+    except RuntimeError:
+        return np.zeros(0, dtype=np.uint16)
+    window = _AUDIO_RATE // FINGERPRINT_FPS
+    samples = np.frombuffer(raw, dtype=np.int16).astype(np.float32)
+    count = len(samples) // window
+    if count == 0:
+        return np.zeros(0, dtype=np.uint16)
+
+    spectrum = np.abs(np.fft.rfft(samples[:count * window].reshape(count, window), axis=1))
+    freqs = np.fft.rfftfreq(window, 1.0 / _AUDIO_RATE)
+    band = (freqs >= 65) & (freqs <= 2000)
+    pitch_class = np.round(12 * np.log2(freqs[band] / 440.0) + 69).astype(int) % 12
+    chroma = np.zeros((count, 12), dtype=np.float32)
+    for pc in range(12):
+        chroma[:, pc] = spectrum[:, band][:, pitch_class == pc].sum(axis=1)
+
+    bits = chroma > np.roll(chroma, -1, axis=1)
+    hashes = (bits * (1 << np.arange(_AUDIO_BITS))).sum(axis=1).astype(np.uint16)
+    hashes[chroma.sum(axis=1) < 1e-3 * window] = 0  # silence
+    return hashes
+
+
+def compute_fingerprint(path):
+    """
+    Empreinte d'un fichier vidéo : {'video': uint64[], 'audio': uint16[]}.
+    """
+    audio = audio_hashes(path) if FINGERPRINT_AUDIO else np.zeros(0, dtype=np.uint16)
+    return {'video': video_hashes(path), 'audio': audio}
+
+
+def to_blobs(fp):
+    return fp['video'].astype('<u8').tobytes(), fp['audio'].astype('<u2').tobytes()
+
+
+def from_blobs(video_blob, audio_blob):
+    return {'video': np.frombuffer(video_blob or b'', dtype='<u8').astype(np.uint64),
+            'audio': np.frombuffer(audio_blob or b'', dtype='<u2').astype(np.uint16)}
+
+
+def _bits(hashes, nbits):
+    """
+    Les `nbits` bits de poids faible de chaque hash (les bits de bourrage du type de
+    stockage, toujours nuls, fausseraient la distance), et le masque des hashes valides.
+    """
+    width = hashes.dtype.itemsize
+    as_bytes = hashes.astype(f'>u{width}').view(np.uint8).reshape(len(hashes), width)
+    return np.unpackbits(as_bytes, axis=1)[:, -nbits:].astype(bool), hashes != 0
+
+
+def _aligned_distance(a, b, nbits):
+    """
+    Distance à chaque décalage : {décalage: proportion moyenne de bits différents}
+    (seuls les décalages avec un recouvrement suffisant sont présents).
+    """
+    a_bits, a_valid = _bits(a, nbits)
+    b_bits, b_valid = _bits(b, nbits)
+    result = {}
+    for offset in range(-(len(b) - 1), len(a)):
+        i0, j0 = max(0, offset), max(0, -offset)
+        n = min(len(a) - i0, len(b) - j0)
+        valid = a_valid[i0:i0 + n] & b_valid[j0:j0 + n]
+        if valid.sum() < FINGERPRINT_MIN_OVERLAP:
+            continue
+        diff = a_bits[i0:i0 + n][valid] != b_bits[j0:j0 + n][valid]
+        result[offset] = float(diff.mean())
+    return result
+
+
+def distance(fp_a, fp_b):
+    """
+    Distance entre deux empreintes (0 = identiques, ~0.5 = sans rapport), au meilleur décalage.
+    Retourne 1.0 si le recouvrement est insuffisant.
+    """
+    video = _aligned_distance(fp_a['video'], fp_b['video'], 64)
+    if not video:
+        return 1.0
+    audio = {}
+    if len(fp_a['audio']) and len(fp_b['audio']):
+        audio = _aligned_distance(fp_a['audio'], fp_b['audio'], _AUDIO_BITS)
+    best = 1.0
+    for offset, dv in video.items():
+        d = dv if offset not in audio else (1 - AUDIO_WEIGHT) * dv + AUDIO_WEIGHT * audio[offset]
+        best = min(best, d)
+    return best
+
+
+class DuplicateFilter:
+    """
+    Rejette les clips quasi identiques à un clip déjà publié (historique) ou
+    déjà retenu dans le lot en cours. Utilisable depuis plusieurs threads.
+    """
+    def __init__(self, history, max_distance=None, lookback_days=None):
+        self.history = history
+        self.max_distance = FINGERPRINT_MAX_DISTANCE if max_distance is None else max_distance
+        lookback_days = FINGERPRINT_LOOKBACK_DAYS if lookback_days is None else lookback_days
+        self._known = [(clip_id, from_blobs(video, audio))
+                       for clip_id, video, audio in history.fingerprints(since_days=lookback_days)]
+        self._batch = {}
+        self._lock = threading.Lock()
+
+    def check(self, clip_id, video_path):
+        """
+        Retourne l'id du clip dont `clip_id` est un quasi-doublon, sinon None
+        (le clip est alors réservé dans le lot en cours).
+        """
+        try:
+            fp = compute_fingerprint(video_path)
+        except Exception as e:
+            print(f"⚠️ Empreinte impossible pour le clip {clip_id} ({e}), pas de contrôle de doublon.")
+            return None
+
+        with self._lock:
+            for other_id, other_fp in self._known + list(self._batch.items()):
+                if other_id == clip_id:
+                    continue
+                d = distance(fp, other_fp)
+                if d <= self.max_distance:
+                    print(f"🔁 Clip {clip_id} écarté : quasi-doublon de {other_id} (distance {d:.3f}).")
+                    return other_id
+            self._batch[clip_id] = fp
+        return None
+
+    def discard(self, clip_id):
+        """
+        Libère la réservation d'un clip du lot qui n'a finalement pas été publié.
+        """
+        with self._lock:
+            self._batch.pop(clip_id, None)
+
+    def commit(self, clip_id):
+        """
+        Enregistre l'empreinte d'un clip publié dans l'historique.
+        """
+        with self._lock:
+            fp = self._batch.get(clip_id)
+        if fp is not None:
+            self.history.add_fingerprint(clip_id, *to_blobs(fp))
@@ -1,9 +1,13 @@
-import requests
 import os
 import sys
 import json
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
+import instrumentation
+import twitch_client
+
 CLIENT_ID     = os.getenv("TWITCH_CLIENT_ID")
 CLIENT_SECRET = os.getenv("TWITCH_CLIENT_SECRET")
 
@@ -11,55 +15,117 @@ if not CLIENT_ID or not CLIENT_SECRET:
     print("❌ ERREUR: TWITCH_CLIENT_ID ou TWITCH_CLIENT_SECRET non définis.")
     sys.exit(1)
 
-TWITCH_AUTH_URL = "https://id.twitch.tv/oauth2/token"
-TWITCH_API_URL  = "https://api.twitch.tv/helix/clips"
-
 TARGET_BROADCASTER_ID      = "737048563"
 CLIP_LANGUAGE              = "fr"
 MIN_VIDEO_DURATION_SECONDS = 15
 MAX_VIDEO_DURATION_SECONDS = 180
 
+# Sources de clips : liste de broadcasters et/ou de jeux (ids séparés par des virgules)
+TARGET_BROADCASTER_IDS = [b for b in os.getenv("TARGET_BROADCASTER_IDS", TARGET_BROADCASTER_ID).split(",") if b]
+TARGET_GAME_IDS        = [g for g in os.getenv("TARGET_GAME_IDS", "").split(",") if g]
+# Nombre maximal de clips lus par source en suivant la pagination Helix
+MAX_CANDIDATES_PER_SOURCE = int(os.getenv("MAX_CANDIDATES_PER_SOURCE", "200"))
+# Nombre de sources interrogées en parallèle
+CLIP_FETCH_WORKERS = int(os.getenv("CLIP_FETCH_WORKERS", "4"))
+HELIX_MAX_PAGE_SIZE = 100
+
+_END_OF_SOURCE = object()
+
 def get_twitch_access_token():
-    print("🔑 Récupération du jeton d'accès Twitch...")
-    resp = requests.post(TWITCH_AUTH_URL, data={
-        "client_id": CLIENT_ID,
-        "client_secret": CLIENT_SECRET,
-        "grant_type": "client_credentials"
-    })
-    resp.raise_for_status()
-    token = resp.json()["access_token"]
-    print("✅ Jeton d'accès Twitch récupéré.")
-    return token
-
-def fetch_clips(access_token, params):
-    headers = {
-        "Client-ID": CLIENT_ID,
-        "Authorization": f"Bearer {access_token}"
-    }
-    resp = requests.get(TWITCH_API_URL, headers=headers, params=params)
-    resp.raise_for_status()
-    return resp.json().get("data", [])
+    # Jeton mis en cache (mémoire + disque) par le client partagé
+    return twitch_client.get_client().get_token()
 
-def get_eligible_short_clips(access_token, num_clips_per_source=50, days_ago=1, already_published_clip_ids=None):
+def fetch_clips_page(params):
+    """
+    Une page de /helix/clips : retourne (clips, curseur de la page suivante ou None).
+    """
+    payload = twitch_client.get_client().helix_get("clips", params)
+    return payload.get("data", []), payload.get("pagination", {}).get("cursor")
+
+def iter_clip_pages(params, page_size=HELIX_MAX_PAGE_SIZE, max_clips=MAX_CANDIDATES_PER_SOURCE):
+    """
+    Suit le curseur de pagination Helix et produit les pages de clips une à une,
+    jusqu'à épuisement de la source ou du budget max_clips.
+    """
+    cursor = None
+    fetched = 0
+    while fetched < max_clips:
+        page_params = dict(params, first=min(page_size, HELIX_MAX_PAGE_SIZE, max_clips - fetched))
+        if cursor:
+            page_params["after"] = cursor
+        clips, cursor = fetch_clips_page(page_params)
+        if clips:
+            yield clips
+        fetched += len(clips)
+        if not cursor or not clips:
+            break
+
+def _fetch_source(params, page_size, max_clips, pages):
+    try:
+        for page in iter_clip_pages(params, page_size, max_clips):
+            pages.put(page)
+    except Exception as e:
+        # Transmise au thread qui consomme les pages, qui décide de l'ignorer ou non
+        pages.put((params, e))
+    finally:
+        pages.put(_END_OF_SOURCE)
+
+def iter_source_clips(sources, base_params, page_size, max_clips_per_source, workers=CLIP_FETCH_WORKERS):
+    """
+    Interroge toutes les sources en parallèle (pool de threads borné) et produit
+    les clips au fil de l'arrivée des pages, sans attendre la fin des autres sources.
+    Une source en échec passager (réseau, 5xx, 429) est ignorée et comptée dans
+    l'étape en cours (failed_sources) ; toute autre erreur (authentification,
+    requête refusée) est relevée.
+    """
+    pages = queue.Queue()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(sources)))) as pool:
+        for source in sources:
+            pool.submit(_fetch_source, dict(base_params, **source), page_size, max_clips_per_source, pages)
+        remaining = len(sources)
+        while remaining:
+            page = pages.get()
+            if page is _END_OF_SOURCE:
+                remaining -= 1
+                continue
+            if isinstance(page, tuple):
+                params, error = page
+                if not twitch_client.is_transient_error(error):
+                    raise error
+                print(f"⚠️ Source ignorée après échec passager ({params}) : {error}")
+                instrumentation.add(failed_sources=1)
+                continue
+            yield from page
+
+def get_eligible_short_clips(num_clips_per_source=50, days_ago=1, already_published_clip_ids=None,
+                             broadcaster_ids=None, game_ids=None, max_candidates_per_source=None):
+    # Le jeton d'accès est géré par le client Twitch partagé (twitch_client)
     if already_published_clip_ids is None:
         already_published_clip_ids = []
+    if broadcaster_ids is None and game_ids is None:
+        broadcaster_ids, game_ids = TARGET_BROADCASTER_IDS, TARGET_GAME_IDS
+    if max_candidates_per_source is None:
+        max_candidates_per_source = MAX_CANDIDATES_PER_SOURCE
 
     end_date   = datetime.now(timezone.utc)
     start_date = end_date - timedelta(days=days_ago)
     seen       = set(already_published_clip_ids)
     all_clips  = []
 
-    print(f"📊 Récupération des clips pour Anyme023...")
+    sources = ([{"broadcaster_id": b} for b in (broadcaster_ids or [])] +
+               [{"game_id": g} for g in (game_ids or [])])
+    if not sources:
+        print("⚠️ Aucune source de clips configurée (broadcaster ou jeu).")
+        return []
+
+    print(f"📊 Récupération des clips pour {len(sources)} source(s) : {sources}...")
     params = {
-        "first": num_clips_per_source,
         "started_at": start_date.strftime('%Y-%m-%dT%H:%M:%SZ'),
         "ended_at": end_date.strftime('%Y-%m-%dT%H:%M:%SZ'),
         "sort": "views",
-        "broadcaster_id": TARGET_BROADCASTER_ID,
         "language": CLIP_LANGUAGE
     }
-    clips = fetch_clips(access_token, params)
-    for clip in clips:
+    for clip in iter_source_clips(sources, params, num_clips_per_source, max_candidates_per_source):
         # debug rapide
         print(f"  ➡️ Clip récupéré ID={clip.get('id')} game_id={clip.get('game_id')} game_name={clip.get('game_name')}")
         if clip["id"] in seen:
@@ -75,19 +141,27 @@ def get_eligible_short_clips(access_token, num_clips_per_source=50, days_ago=1,
             "id": clip.get("id"),
             "url": clip.get("url"),
             "title": clip.get("title"),
+            "broadcaster_id": clip.get("broadcaster_id"),
             "broadcaster_name": clip.get("broadcaster_name"),
             "duration": duration,
             "language": clip.get("language"),
             "game_id": clip.get("game_id"),
-            "game_name": clip.get("game_name")
+            "game_name": clip.get("game_name"),
+            # Champs utilisés par le classement (clip_scoring)
+            "view_count": clip.get("view_count", 0),
+            "created_at": clip.get("created_at"),
+            "vod_offset": clip.get("vod_offset"),
+            # Champs utilisés par le pré-filtrage (prescreen)
+            "video_id": clip.get("video_id"),
+            "thumbnail_url": clip.get("thumbnail_url")
         })
         seen.add(clip["id"])
 
-    all_clips.sort(key=lambda x: x.get("viewer_count", 0), reverse=True)
+    # Ordre par défaut ; le classement fin est fait par clip_scoring.rank_clips
+    all_clips.sort(key=lambda x: x["view_count"], reverse=True)
     print(f"✅ Collecté {len(all_clips)} clips éligibles.")
     return all_clips
 
 if __name__ == "__main__":
-    token = get_twitch_access_token()
-    clips = get_eligible_short_clips(token)
+    clips = get_eligible_short_clips()
     print(clips[:2])  # debug
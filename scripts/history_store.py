@@ -0,0 +1,195 @@
+# scripts/history_store.py
+"""
+Historique des publications (Twitch clip → Short YouTube) en SQLite.
+
+Remplace data/published_shorts_history.json, relu puis réécrit en entier
+après chaque upload et dont le dédoublonnage ne portait que sur le jour
+courant. Ici :
+  - une ligne par publication, insérée dans sa propre transaction (ajout en O(1)) ;
+  - index sur l'ID du clip Twitch et sur l'ID YouTube ;
+  - journal WAL + synchronous=FULL : une publication validée survit à un crash.
+
+La table `fingerprints` sert d'index aux empreintes perceptuelles des clips
+publiés (voir fingerprint.py).
+
+L'ancien fichier JSON est importé une seule fois, à la première ouverture.
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+
+DATA_DIR            = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+HISTORY_DB_FILE     = os.path.join(DATA_DIR, 'published_history.sqlite3')
+LEGACY_HISTORY_FILE = os.path.join(DATA_DIR, 'published_shorts_history.json')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS published (
+    id               INTEGER PRIMARY KEY,
+    twitch_clip_id   TEXT NOT NULL,
+    youtube_short_id TEXT,
+    published_on     TEXT NOT NULL,
+    timestamp        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_published_clip    ON published (twitch_clip_id);
+CREATE INDEX IF NOT EXISTS idx_published_youtube ON published (youtube_short_id);
+CREATE INDEX IF NOT EXISTS idx_published_on      ON published (published_on);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    twitch_clip_id TEXT PRIMARY KEY,
+    video          BLOB,
+    audio          BLOB,
+    created_on     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_created ON fingerprints (created_on);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class HistoryStore:
+    def __init__(self, path=HISTORY_DB_FILE):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Connexion partagée entre threads (pipeline), protégée par un verrou
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --------------------------------------------------------------
+    # Écriture
+    # --------------------------------------------------------------
+    def add(self, clip_id, youtube_id, timestamp=None):
+        """
+        Enregistre une publication (une transaction par ajout).
+        """
+        ts = timestamp or datetime.now()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO published (twitch_clip_id, youtube_short_id, published_on, timestamp) "
+                "VALUES (?, ?, ?, ?)",
+                (str(clip_id), youtube_id, ts.date().isoformat(), ts.isoformat()))
+
+    def add_fingerprint(self, clip_id, video_blob, audio_blob):
+        """
+        Enregistre (ou remplace) l'empreinte perceptuelle d'un clip publié.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fingerprints (twitch_clip_id, video, audio, created_on) "
+                "VALUES (?, ?, ?, ?)",
+                (str(clip_id), video_blob, audio_blob, date.today().isoformat()))
+
+    # --------------------------------------------------------------
+    # Lecture
+    # --------------------------------------------------------------
+    def is_published(self, clip_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM published WHERE twitch_clip_id = ? LIMIT 1", (str(clip_id),)).fetchone()
+        return row is not None
+
+    def find_by_youtube_id(self, youtube_id):
+        """
+        Publication correspondant à un ID YouTube (dict) ou None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT twitch_clip_id, youtube_short_id, timestamp FROM published "
+                "WHERE youtube_short_id = ? LIMIT 1", (youtube_id,)).fetchone()
+        return dict(row) if row else None
+
+    def published_clip_ids(self, since_days=None):
+        """
+        IDs des clips déjà publiés ; limité aux `since_days` derniers jours si précisé.
+        """
+        query, args = "SELECT DISTINCT twitch_clip_id FROM published", ()
+        if since_days is not None:
+            query += " WHERE published_on >= ?"
+            args = ((date.today() - timedelta(days=since_days)).isoformat(),)
+        with self._lock:
+            return {row[0] for row in self._conn.execute(query, args)}
+
+    def fingerprints(self, since_days=None):
+        """
+        Empreintes enregistrées : liste de (clip_id, blob vidéo, blob audio).
+        """
+        query, args = "SELECT twitch_clip_id, video, audio FROM fingerprints", ()
+        if since_days is not None:
+            query += " WHERE created_on >= ?"
+            args = ((date.today() - timedelta(days=since_days)).isoformat(),)
+        with self._lock:
+            return [tuple(row) for row in self._conn.execute(query, args)]
+
+    def published_on(self, day=None):
+        """
+        Publications d'un jour donné (aujourd'hui par défaut), au format de l'ancien JSON.
+        """
+        day = (day or date.today()).isoformat()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT twitch_clip_id, youtube_short_id, timestamp FROM published "
+                "WHERE published_on = ? ORDER BY id", (day,)).fetchall()
+        return [dict(row) for row in rows]
+
+    # --------------------------------------------------------------
+    # Import de l'ancien historique JSON
+    # --------------------------------------------------------------
+    def import_legacy_json(self, json_path=LEGACY_HISTORY_FILE):
+        """
+        Importe {"AAAA-MM-JJ": [{twitch_clip_id, youtube_short_id, timestamp}, ...]}
+        une seule fois (marqueur dans la table meta). Retourne le nombre d'entrées importées.
+        """
+        with self._lock:
+            done = self._conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_json_imported'").fetchone()
+        if done or not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ancien historique illisible ({json_path}) : {e}")
+            return 0
+
+        rows = []
+        for day, items in sorted(legacy.items()):
+            for item in items or []:
+                if not item.get("twitch_clip_id"):
+                    continue
+                rows.append((str(item["twitch_clip_id"]), item.get("youtube_short_id"), day,
+                             item.get("timestamp") or f"{day}T00:00:00"))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO published (twitch_clip_id, youtube_short_id, published_on, timestamp) "
+                "VALUES (?, ?, ?, ?)", rows)
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_json_imported', ?)",
+                               (datetime.now().isoformat(),))
+        print(f"📥 {len(rows)} publication(s) importée(s) depuis {os.path.basename(json_path)}.")
+        return len(rows)
+
+
+_store_lock = threading.Lock()
+_store = None
+
+
+def get_history_store():
+    """
+    Historique partagé du processus ; importe l'ancien JSON à la première ouverture.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+            _store.import_legacy_json()
+        return _store
@@ -0,0 +1,280 @@
+# scripts/instrumentation.py
+"""
+Mesures par étape d'une exécution.
+
+Chaque étape (jeton Twitch, requêtes Helix, téléchargement yt-dlp, rendu,
+encodage, upload YouTube...) est encadrée par `stage(nom)`, qui enregistre :
+  - le temps réel et le temps CPU (thread courant + processus enfants
+    terminés pendant l'étape : ffmpeg, yt-dlp...) ;
+  - les octets lus/écrits (réseau ou fichiers), signalés par le code mesuré
+    via add(bytes_in=..., bytes_out=...) ;
+  - le pic de mémoire résidente du processus et celui de ses enfants ;
+  - le nombre d'images rendues, le coût par image (ms réelles et CPU) et,
+    pour les rendus MoviePy, le temps passé à attendre le décodage de la
+    source (le reste étant composition et encodage x264).
+
+Les étapes s'imbriquent (render → render.encode) : les compteurs d'une
+sous-étape remontent dans l'étape parente. Chaque étape terminée est écrite
+en une ligne JSON dans METRICS_FILE ; un récapitulatif par nom d'étape est
+écrit (et affiché) en fin d'exécution.
+
+STAGE_PROFILER=cprofile|pyinstrument profile en plus les étapes listées dans
+STAGE_PROFILE_STAGES (toutes si vide) ; les profils sont écrits dans
+data/metrics/profiles/. Un seul profileur est actif à la fois par thread :
+les sous-étapes d'une étape profilée sont incluses dans son profil.
+
+En mode pipeline, le temps CPU des enfants est approximatif : un processus
+enfant terminé par un autre worker pendant l'étape lui est aussi compté.
+"""
+import cProfile
+import json
+import os
+import re
+import resource
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+INSTRUMENTATION      = os.getenv("INSTRUMENTATION", "1") == "1"
+METRICS_DIR          = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'metrics'))
+METRICS_FILE         = os.getenv("METRICS_FILE", os.path.join(METRICS_DIR, "metrics.jsonl"))
+STAGE_PROFILER       = os.getenv("STAGE_PROFILER", "").lower()  # "", "cprofile" ou "pyinstrument"
+STAGE_PROFILE_STAGES = [s for s in os.getenv("STAGE_PROFILE_STAGES", "").split(",") if s]
+PROFILES_DIR         = os.path.join(METRICS_DIR, "profiles")
+# Au-delà, le fichier de mesures (conservé entre deux exécutions avec data/) est archivé en .1
+METRICS_MAX_MB       = int(os.getenv("METRICS_MAX_MB", "10"))
+
+# Compteurs additifs, remontés d'une sous-étape vers son étape parente
+COUNTERS = ("bytes_in", "bytes_out", "frames", "requests", "decode_seconds", "failed_sources")
+
+# ru_maxrss : Kio sous Linux, octets sous macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+_lock = threading.Lock()
+_local = threading.local()
+_run = {"id": None, "started_at": None, "stages": {}}
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def _peak_rss_mb(who):
+    return round(resource.getrusage(who).ru_maxrss * _RSS_UNIT / 1e6, 1)
+
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _write(event):
+    with _lock:
+        os.makedirs(os.path.dirname(METRICS_FILE), exist_ok=True)
+        with open(METRICS_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+
+
+def _rotate():
+    try:
+        if os.path.getsize(METRICS_FILE) > METRICS_MAX_MB * 1024 * 1024:
+            os.replace(METRICS_FILE, METRICS_FILE + ".1")
+    except OSError:
+        pass
+
+
+def add(**counters):
+    """
+    Ajoute des compteurs (voir COUNTERS) à l'étape en cours du thread courant.
+    Sans étape en cours (ou mesures désactivées), ne fait rien.
+    """
+    stack = _stack()
+    if not stack:
+        return
+    record = stack[-1]
+    for name, value in counters.items():
+        record[name] = record.get(name, 0) + (value or 0)
+
+
+def file_size(path):
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+
+# --------------------------------------------------------------
+# Profileurs optionnels
+# --------------------------------------------------------------
+def _profile_wanted(name):
+    if STAGE_PROFILER not in ("cprofile", "pyinstrument") or getattr(_local, "profiling", False):
+        return False
+    return not STAGE_PROFILE_STAGES or name in STAGE_PROFILE_STAGES
+
+
+def _start_profiler():
+    if STAGE_PROFILER == "pyinstrument":
+        if pyinstrument is None:
+            print("⚠️ pyinstrument n'est pas installé : profilage des étapes ignoré.")
+            return None
+        profiler = pyinstrument.Profiler()
+    else:
+        profiler = cProfile.Profile()
+    try:
+        # cProfile : un seul profileur actif à la fois dans le processus depuis Python 3.12
+        (profiler.start if STAGE_PROFILER == "pyinstrument" else profiler.enable)()
+    except (ValueError, RuntimeError) as e:
+        print(f"⚠️ Profilage impossible ({e}).")
+        return None
+    _local.profiling = True
+    return profiler
+
+
+def _stop_profiler(profiler, record):
+    _local.profiling = False
+    label = re.sub(r"[^\w.-]+", "_", "-".join(str(p) for p in (record["stage"], record.get("clip_id")) if p))
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    if STAGE_PROFILER == "pyinstrument":
+        profiler.stop()
+        path = os.path.join(PROFILES_DIR, f"{_run['id']}-{label}.html")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(profiler.output_html())
+    else:
+        profiler.disable()
+        path = os.path.join(PROFILES_DIR, f"{_run['id']}-{label}.prof")
+        profiler.dump_stats(path)
+    record["profile_file"] = path
+
+
+# --------------------------------------------------------------
+# Étapes
+# --------------------------------------------------------------
+@contextmanager
+def stage(name, **attrs):
+    """
+    Mesure le bloc comme l'étape `name` (attrs : clip_id, backend... recopiés dans
+    la ligne JSON). Produit le dict de l'étape, que le bloc peut compléter.
+    """
+    if not INSTRUMENTATION:
+        yield {}
+        return
+
+    stack = _stack()
+    record = dict(attrs, stage=name, parent=stack[-1]["stage"] if stack else None)
+    if "clip_id" not in record and stack and stack[-1].get("clip_id"):
+        record["clip_id"] = stack[-1]["clip_id"]
+    stack.append(record)
+    profiler = _start_profiler() if _profile_wanted(name) else None
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+    start_children = _children_cpu()
+    try:
+        yield record
+        record.setdefault("ok", True)
+    except BaseException as e:
+        record.update(ok=False, error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        wall = time.perf_counter() - start_wall
+        cpu = time.thread_time() - start_cpu + _children_cpu() - start_children
+        if profiler is not None:
+            _stop_profiler(profiler, record)
+        stack.pop()
+        record.update(wall_seconds=round(wall, 3), cpu_seconds=round(cpu, 3),
+                      peak_rss_mb=_peak_rss_mb(resource.RUSAGE_SELF),
+                      children_peak_rss_mb=_peak_rss_mb(resource.RUSAGE_CHILDREN))
+        if record.get("frames"):
+            record["ms_per_frame"] = round(1000 * wall / record["frames"], 2)
+            record["cpu_ms_per_frame"] = round(1000 * cpu / record["frames"], 2)
+        if record.get("decode_seconds"):
+            record["decode_seconds"] = round(record["decode_seconds"], 3)
+        if stack:
+            for counter in COUNTERS:
+                if record.get(counter):
+                    stack[-1][counter] = stack[-1].get(counter, 0) + record[counter]
+        _finish(record)
+
+
+def _finish(record):
+    # Hors d'une exécution (appel direct d'une fonction mesurée) : rien n'est enregistré
+    if not _run["id"]:
+        return
+    event = dict(record, event="stage", run_id=_run["id"], at=datetime.now().isoformat(timespec="seconds"))
+    with _lock:
+        totals = _run["stages"].setdefault(record["stage"], {"count": 0, "failed": 0, "wall_seconds": 0.0,
+                                                             "cpu_seconds": 0.0, "peak_rss_mb": 0.0})
+        totals["count"] += 1
+        totals["failed"] += 0 if record.get("ok") else 1
+        totals["wall_seconds"] += record["wall_seconds"]
+        totals["cpu_seconds"] += record["cpu_seconds"]
+        totals["peak_rss_mb"] = max(totals["peak_rss_mb"], record["peak_rss_mb"],
+                                    record["children_peak_rss_mb"])
+        for counter in COUNTERS:
+            if record.get(counter):
+                totals[counter] = totals.get(counter, 0) + record[counter]
+    _write(event)
+
+
+# --------------------------------------------------------------
+# Exécution
+# --------------------------------------------------------------
+@contextmanager
+def run(**attrs):
+    """
+    Délimite une exécution : identifiant commun à toutes les lignes, puis
+    récapitulatif par étape écrit et affiché à la sortie du bloc.
+    """
+    if not INSTRUMENTATION:
+        yield
+        return
+    _run.update(id=datetime.now().strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6],
+                started_at=time.perf_counter(), stages={})
+    _rotate()
+    _write(dict(attrs, event="run_start", run_id=_run["id"], at=datetime.now().isoformat(timespec="seconds"),
+                profiler=STAGE_PROFILER or None))
+    start_children = _children_cpu()
+    start_cpu = time.process_time()
+    try:
+        with stage("run"):
+            yield
+    finally:
+        summary = {
+            "event": "summary",
+            "run_id": _run["id"],
+            "wall_seconds": round(time.perf_counter() - _run["started_at"], 3),
+            "cpu_seconds": round(time.process_time() - start_cpu + _children_cpu() - start_children, 3),
+            "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF),
+            "children_peak_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+            "stages": {name: {k: round(v, 3) if isinstance(v, float) else v for k, v in totals.items()}
+                       for name, totals in _run["stages"].items()},
+        }
+        _write(summary)
+        print_summary(summary)
+        _run["id"] = None
+
+
+def print_summary(summary):
+    print(f"\n📊 Mesures de l'exécution {summary['run_id']} ({summary['wall_seconds']:.1f}s, "
+          f"CPU {summary['cpu_seconds']:.1f}s, pic mémoire {summary['peak_rss_mb']:.0f} Mo) :")
+    stages = sorted(summary["stages"].items(), key=lambda item: -item[1]["wall_seconds"])
+    for name, totals in stages:
+        if name == "run":
+            continue
+        details = f"{totals['count']}x, {totals['wall_seconds']:.1f}s, CPU {totals['cpu_seconds']:.1f}s"
+        if totals.get("bytes_in") or totals.get("bytes_out"):
+            details += f", {totals.get('bytes_in', 0) / 1e6:.1f} Mo ↓ / {totals.get('bytes_out', 0) / 1e6:.1f} Mo ↑"
+        if totals.get("frames"):
+            details += f", {1000 * totals['wall_seconds'] / totals['frames']:.1f} ms/image"
+        if totals.get("decode_seconds"):
+            details += f" (dont décodage {totals['decode_seconds']:.1f}s)"
+        if totals["failed"]:
+            details += f", {totals['failed']} échec(s)"
+        print(f"\t{name:<24} {details}")
+    print(f"\tDétail par étape : {METRICS_FILE}")
@@ -0,0 +1,199 @@
+# scripts/pipeline.py
+"""
+Pipeline par étages : téléchargement → rendu → upload.
+
+Chaque étage dispose de son propre pool de workers (threads) borné et les
+étages sont reliés par des files d'attente de taille limitée. Le réseau
+télécharge/uploade pendant que MoviePy encode, au lieu d'attendre la fin de
+chaque clip.
+
+Le quota de publication est respecté : on n'admet pas plus de
+`quota + lookahead` clips en vol, et un upload n'est lancé que si une place
+reste disponible dans le quota.
+"""
+import queue
+import threading
+
+# Sentinelle de fin de flux pour les workers
+_STOP = object()
+
+
+class StagedPipeline:
+    def __init__(self, download_fn, render_fn, upload_fn, quota,
+                 on_published=None, on_dropped=None, download_workers=2,
+                 render_workers=1, upload_workers=1, queue_size=2, lookahead=1):
+        """
+        download_fn(clip)                -> chemin du clip brut ou None
+        render_fn(clip, raw_path)        -> chemin du Short rendu ou None
+        upload_fn(clip, processed_path)  -> ID YouTube ou None
+        on_published(clip, video_id)     -> appelé (sous verrou) après chaque publication
+        on_dropped(clip, reason)         -> appelé pour chaque clip abandonné sans publication,
+                                            reason = "quota" (quota atteint) ou "échec"
+        """
+        self.download_fn = download_fn
+        self.render_fn = render_fn
+        self.upload_fn = upload_fn
+        self.on_published = on_published
+        self.on_dropped = on_dropped
+        self.quota = quota
+        self.lookahead = max(0, lookahead)
+        self.download_workers = max(1, download_workers)
+        self.render_workers = max(1, render_workers)
+        self.upload_workers = max(1, upload_workers)
+
+        self._render_queue = queue.Queue(maxsize=queue_size)
+        self._upload_queue = queue.Queue(maxsize=queue_size)
+        self._download_queue = queue.Queue(maxsize=queue_size)
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._uploading = 0
+        self.published = []
+
+    # --------------------------------------------------------------
+    # Gestion du quota
+    # --------------------------------------------------------------
+    def _quota_reached(self):
+        return len(self.published) >= self.quota
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _drop(self, clip, reason):
+        """
+        Sortie d'un clip sans publication : notification puis place libérée.
+        """
+        try:
+            if self.on_dropped:
+                self.on_dropped(clip, reason)
+        except Exception as e:
+            print(f"❌ [pipeline] Erreur à l'abandon de {clip['id']} : {e}")
+        finally:
+            self._release()
+
+    def _reserve_upload_slot(self):
+        with self._cond:
+            if len(self.published) + self._uploading >= self.quota:
+                return False
+            self._uploading += 1
+            return True
+
+    # --------------------------------------------------------------
+    # Workers
+    # --------------------------------------------------------------
+    def _feed(self, clips):
+        for clip in clips:
+            with self._cond:
+                while (not self._quota_reached()
+                       and len(self.published) + self._in_flight >= self.quota + self.lookahead):
+                    self._cond.wait()
+                if self._quota_reached():
+                    break
+                self._in_flight += 1
+            self._download_queue.put(clip)
+
+    def _download_worker(self):
+        while True:
+            clip = self._download_queue.get()
+            if clip is _STOP:
+                return
+            if self._quota_reached():
+                self._drop(clip, "quota")
+                continue
+            raw_path = None
+            try:
+                raw_path = self.download_fn(clip)
+            except Exception as e:
+                print(f"❌ [pipeline] Erreur de téléchargement pour {clip['id']} : {e}")
+            if raw_path:
+                self._render_queue.put((clip, raw_path))
+            else:
+                self._drop(clip, "échec")
+
+    def _render_worker(self):
+        while True:
+            item = self._render_queue.get()
+            if item is _STOP:
+                return
+            clip, raw_path = item
+            if self._quota_reached():
+                self._drop(clip, "quota")
+                continue
+            processed = None
+            try:
+                processed = self.render_fn(clip, raw_path)
+            except Exception as e:
+                print(f"❌ [pipeline] Erreur de rendu pour {clip['id']} : {e}")
+            if processed:
+                self._upload_queue.put((clip, processed))
+            else:
+                self._drop(clip, "échec")
+
+    def _upload_worker(self):
+        while True:
+            item = self._upload_queue.get()
+            if item is _STOP:
+                return
+            clip, processed = item
+            if not self._reserve_upload_slot():
+                print(f"⏩ [pipeline] Quota atteint, upload de {clip['id']} annulé.")
+                self._drop(clip, "quota")
+                continue
+            video_id = None
+            try:
+                video_id = self.upload_fn(clip, processed)
+            except Exception as e:
+                print(f"❌ [pipeline] Erreur d'upload pour {clip['id']} : {e}")
+            try:
+                with self._cond:
+                    self._uploading -= 1
+                    if video_id:
+                        # Vidéo en ligne : comptée dans le quota même si l'enregistrement échoue
+                        self.published.append((clip['id'], video_id))
+                        if self.on_published:
+                            self.on_published(clip, video_id)
+            except Exception as e:
+                print(f"❌ [pipeline] Erreur après la publication de {clip['id']} ({video_id}) : {e}")
+            finally:
+                # Toujours libérer la place : sinon _feed attend indéfiniment
+                if video_id:
+                    self._release()
+                else:
+                    self._drop(clip, "échec")
+
+    # --------------------------------------------------------------
+    # Orchestration
+    # --------------------------------------------------------------
+    @staticmethod
+    def _start(target, count, name):
+        threads = [threading.Thread(target=target, name=f"{name}-{i}", daemon=True)
+                   for i in range(count)]
+        for t in threads:
+            t.start()
+        return threads
+
+    @staticmethod
+    def _drain(threads, q):
+        for _ in threads:
+            q.put(_STOP)
+        for t in threads:
+            t.join()
+
+    def run(self, clips):
+        """
+        Traite la liste de clips et retourne la liste des (clip_id, video_id) publiés.
+        """
+        downloaders = self._start(self._download_worker, self.download_workers, "download")
+        renderers = self._start(self._render_worker, self.render_workers, "render")
+        uploaders = self._start(self._upload_worker, self.upload_workers, "upload")
+
+        self._feed(clips)
+
+        # Arrêt en cascade : chaque étage n'est arrêté qu'une fois le précédent vidé
+        self._drain(downloaders, self._download_queue)
+        self._drain(renderers, self._render_queue)
+        self._drain(uploaders, self._upload_queue)
+
+        return list(self.published)
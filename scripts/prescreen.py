@@ -0,0 +1,210 @@
+# scripts/prescreen.py
+"""
+Pré-filtrage des clips candidats à partir des seules métadonnées Helix et de
+la vignette (thumbnail_url, ~480x272), avant tout téléchargement complet.
+
+Étapes, de la moins chère à la plus chère :
+  1. listes noires (jeux, streamers, mots du titre) ;
+  2. doublons de métadonnées : deux clips de la même VOD dont les plages
+     [vod_offset, vod_offset + durée] se recouvrent ;
+  3. vignettes téléchargées en parallèle (cache disque) : écarte les écrans
+     uniformes (noir, hors-ligne) et les vignettes quasi identiques à celle
+     d'un clip mieux classé.
+
+Les candidats sont parcourus dans l'ordre du classement ; le filtrage s'arrête
+dès que `limit` clips ont survécu.
+
+La mise en page (zone webcam) n'est pas déduite de la vignette : le détecteur
+de webcam_detect a besoin de plusieurs images (bords stables, mouvement à
+l'intérieur du cadre) et travaille sur le clip téléchargé.
+"""
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+THUMBNAIL_CACHE_DIR       = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'cache', 'thumbnails'))
+THUMBNAIL_CACHE_MAX_FILES = int(os.getenv("THUMBNAIL_CACHE_MAX_FILES", "500"))
+THUMBNAIL_FETCH_WORKERS   = int(os.getenv("THUMBNAIL_FETCH_WORKERS", "8"))
+THUMBNAIL_TIMEOUT_SECONDS = 10
+
+# Listes noires (valeurs séparées par des virgules)
+BLACKLISTED_GAME_IDS     = {g for g in os.getenv("BLACKLISTED_GAME_IDS", "").split(",") if g}
+BLACKLISTED_BROADCASTERS = {b.lower() for b in os.getenv("BLACKLISTED_BROADCASTERS", "").split(",") if b}
+BLACKLISTED_TITLE_WORDS  = [w.lower() for w in os.getenv("BLACKLISTED_TITLE_WORDS", "").split(",") if w]
+
+# Distance de Hamming maximale (sur 64 bits) entre les dHash de deux vignettes « identiques »
+THUMBNAIL_MAX_HAMMING = 6
+# En dessous de cet écart-type, la vignette est considérée uniforme (écran noir, hors-ligne)
+THUMBNAIL_FLAT_STD = 4.0
+
+_session = None
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=THUMBNAIL_FETCH_WORKERS, pool_maxsize=THUMBNAIL_FETCH_WORKERS)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+# --------------------------------------------------------------
+# Métadonnées
+# --------------------------------------------------------------
+def blacklist_reason(clip):
+    """
+    Raison du rejet si le clip est sur liste noire, sinon None.
+    """
+    if str(clip.get("game_id")) in BLACKLISTED_GAME_IDS:
+        return f"jeu {clip.get('game_id')} sur liste noire"
+    if (clip.get("broadcaster_name") or "").lower() in BLACKLISTED_BROADCASTERS:
+        return f"streamer {clip.get('broadcaster_name')} sur liste noire"
+    title = (clip.get("title") or "").lower()
+    for word in BLACKLISTED_TITLE_WORDS:
+        if word in title:
+            return f"mot interdit '{word}' dans le titre"
+    return None
+
+
+def _vod_span(clip):
+    if not clip.get("video_id") or clip.get("vod_offset") is None:
+        return None
+    start = float(clip["vod_offset"])
+    return clip["video_id"], start, start + float(clip.get("duration", 0.0))
+
+
+def _overlaps(span, spans):
+    video_id, start, end = span
+    for other_id, (other_video, other_start, other_end) in spans:
+        if other_video == video_id and start < other_end and other_start < end:
+            return other_id
+    return None
+
+
+# --------------------------------------------------------------
+# Vignettes
+# --------------------------------------------------------------
+def _thumbnail_cache_path(url):
+    return os.path.join(THUMBNAIL_CACHE_DIR, hashlib.sha256(url.encode('utf-8')).hexdigest()[:24] + ".jpg")
+
+
+def fetch_thumbnail(url):
+    """
+    Télécharge la vignette (ou la lit depuis le cache). Retourne son chemin ou None.
+    """
+    if not url:
+        return None
+    path = _thumbnail_cache_path(url)
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+    try:
+        resp = _get_session().get(url, timeout=THUMBNAIL_TIMEOUT_SECONDS)
+        resp.raise_for_status()
+    except requests.RequestException as e:
+        print(f"⚠️ Vignette indisponible ({url}) : {e}")
+        return None
+    os.makedirs(THUMBNAIL_CACHE_DIR, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(resp.content)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _prune_thumbnail_cache():
+    """
+    Garde au plus THUMBNAIL_CACHE_MAX_FILES vignettes (les plus récemment utilisées).
+    """
+    try:
+        entries = [e for e in os.scandir(THUMBNAIL_CACHE_DIR) if e.name.endswith(".jpg")]
+    except FileNotFoundError:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    for entry in entries[THUMBNAIL_CACHE_MAX_FILES:]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def thumbnail_signature(path):
+    """
+    (dHash 64 bits, écart-type des niveaux de gris) d'une vignette, ou None si illisible.
+    """
+    try:
+        with Image.open(path) as img:
+            gray = img.convert('L')
+            small = np.asarray(gray.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+            std = float(np.asarray(gray.resize((64, 36)), dtype=np.float32).std())
+    except OSError:
+        return None
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0]), std
+
+
+def _thumbnail_job(clip):
+    path = fetch_thumbnail(clip.get("thumbnail_url"))
+    return path, (thumbnail_signature(path) if path else None)
+
+
+# --------------------------------------------------------------
+# Pré-filtrage
+# --------------------------------------------------------------
+def prescreen_clips(clips, limit=None, workers=None):
+    """
+    Filtre les candidats (déjà classés) et retourne au plus `limit` survivants, dans l'ordre.
+    """
+    workers = max(1, workers or THUMBNAIL_FETCH_WORKERS)
+    limit = len(clips) if limit is None else limit
+
+    candidates = []
+    spans = []
+    for clip in clips:
+        reason = blacklist_reason(clip)
+        span = _vod_span(clip)
+        if not reason and span:
+            duplicate_of = _overlaps(span, spans)
+            if duplicate_of:
+                reason = f"même moment de VOD que {duplicate_of}"
+        if reason:
+            print(f"🚫 Clip {clip['id']} écarté : {reason}.")
+            continue
+        if span:
+            spans.append((clip['id'], span))
+        candidates.append(clip)
+
+    survivors = []
+    hashes = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Vignettes téléchargées par lots, dans l'ordre du classement
+        for i in range(0, len(candidates), workers):
+            if len(survivors) >= limit:
+                break
+            batch = candidates[i:i + workers]
+            for clip, (_, signature) in zip(batch, pool.map(_thumbnail_job, batch)):
+                if len(survivors) >= limit:
+                    break
+                if signature:
+                    dhash, std = signature
+                    if std < THUMBNAIL_FLAT_STD:
+                        print(f"🚫 Clip {clip['id']} écarté : vignette uniforme (écran noir ou hors-ligne).")
+                        continue
+                    duplicate_of = next((other for other, h in hashes
+                                         if bin(dhash ^ h).count("1") <= THUMBNAIL_MAX_HAMMING), None)
+                    if duplicate_of:
+                        print(f"🚫 Clip {clip['id']} écarté : vignette identique à celle de {duplicate_of}.")
+                        continue
+                    hashes.append((clip['id'], dhash))
+                survivors.append(clip)
+
+    _prune_thumbnail_cache()
+    print(f"🔎 Pré-filtrage : {len(survivors)} clip(s) retenu(s) sur {len(clips)} candidat(s).")
+    return survivors
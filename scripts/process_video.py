@@ -1,72 +1,25 @@
 import os
-import sys
-from typing import List, Optional
 
-from moviepy.editor import VideoFileClip, CompositeVideoClip, TextClip, ImageClip, ColorClip, concatenate_videoclips
-from moviepy.video.fx.all import crop, even_size, resize as moviepy_resize
+from moviepy.editor import AudioFileClip, ImageClip, ColorClip
+from moviepy.video.fx.all import resize as moviepy_resize
 import numpy as np # Gardé car il pourrait être utile pour d'autres traitements futurs
 
-# ==============================================================================
-# ATTENTION : Vous DEVEZ implémenter cette fonction ou la remplacer par une logique
-# de détection de personne si vous voulez utiliser le rognage de webcam.
-# Pour l'instant, elle retourne toujours None, désactivant le rognage de webcam.
-# Si vous n'avez pas le code de 'get_people_coords', vous pouvez laisser _crop_webcam=False
-# dans l'appel de trim_video_for_short dans main.py.
-# ==============================================================================
-def get_people_coords(image_path: str) -> Optional[List[int]]:
-    """
-    Simule la détection de personnes.
-    Dans un vrai projet, cela ferait appel à une bibliothèque de détection de visages/corps.
-    Exemple de retour : [x, y, x1, y1] des coordonnées du cadre de la personne.
-    """
-    # print(f"DEBUG: Tentative de détection de personne sur {image_path}")
-    # Simuler l'absence de détection pour l'instant
-    return None
-
-def crop_webcam(clip: VideoFileClip) -> Optional[VideoFileClip]:
-    """
-    Tente de recadrer le clip autour de la zone de la webcam (visage du diffuseur).
-    """
-    margin_value = 20
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    temp_dir = os.path.abspath(os.path.join(script_dir, '..', 'data')) # Utilisez votre répertoire 'data'
-    frame_image = os.path.join(temp_dir, 'webcam_search_frame.png')
-
-    print("🔎 Recherche de la zone de la webcam (visage du diffuseur)...")
-    try:
-        # Assurez-vous que le répertoire existe avant d'enregistrer l'image
-        os.makedirs(temp_dir, exist_ok=True)
-        clip.save_frame(frame_image, t=1) # Sauvegarde une image pour analyse
-    except Exception as e:
-        print(f"❌ Erreur lors de la sauvegarde de l'image pour détection de webcam : {e}")
-        return None
-
-    box = get_people_coords(frame_image)
-    if not box:
-        print("\t⏩ Aucun visage de diffuseur trouvé - rognage de la webcam ignoré.")
-        return None
-    print("\t✅ Visage du diffuseur trouvé - rognage et zoom.")
-
-    x, y, x1, y1 = tuple(box)
-    x -= margin_value
-    y -= margin_value
-    x1 += margin_value
-    y1 += margin_value
-
-    # Ajustement des limites pour ne pas sortir de l'image
-    x = max(0, x)
-    y = max(0, y)
-    x1 = min(clip.w, x1)
-    y1 = min(clip.h, y1)
-
-    # Nettoyage
-    if os.path.exists(frame_image):
-        os.remove(frame_image)
-
-    return crop(clip, x1=x1, y1=y1, x2=x, y2=y)
-
-
-def trim_video_for_short(input_path, output_path, max_duration_seconds=60, clip_data=None, enable_webcam_crop=False):
+from workspace import temp_audio_path
+import assets_cache
+import compositor
+import encode_profiles
+import ffmpeg_render
+import instrumentation
+import render_cache
+import render_engine
+import smart_crop
+import text_render
+import webcam_detect
+from source_reader import SourceReader
+
+
+def trim_video_for_short(input_path, output_path, max_duration_seconds=60, clip_data=None, enable_webcam_crop=False,
+                         encode_profile=None):
     """
     Traite une vidéo pour le format Short (9:16) :
     - Coupe si elle dépasse la durée maximale.
@@ -85,22 +38,21 @@ def trim_video_for_short(input_path, output_path, max_duration_seconds=60, clip_
         return None
 
     clip = None # Initialiser clip à None pour le finally
-    end_clip = None # Initialiser end_clip à None pour le finally
+    reader = None
+    audio_clip = None
 
     try:
-        clip = VideoFileClip(input_path)
-        
-        original_width, original_height = clip.size
+        original_width, original_height, source_duration, has_audio = ffmpeg_render.probe(input_path)
         print(f"Résolution originale du clip : {original_width}x{original_height}")
 
         # --- Gérer la durée ---
-        if clip.duration > max_duration_seconds:
-            print(f"Le clip ({clip.duration:.2f}s) dépasse la durée maximale. Découpage à {max_duration_seconds}s.")
-            clip = clip.subclip(0, max_duration_seconds)
+        # La coupe est faite par ffmpeg au décodage (SourceReader), pas sur un clip déjà ouvert
+        if source_duration > max_duration_seconds:
+            print(f"Le clip ({source_duration:.2f}s) dépasse la durée maximale. Découpage à {max_duration_seconds}s.")
+            duration = max_duration_seconds
         else:
-            print(f"Le clip ({clip.duration:.2f}s) est déjà dans la limite de durée.")
-
-        duration = clip.duration
+            print(f"Le clip ({source_duration:.2f}s) est déjà dans la limite de durée.")
+            duration = source_duration
 
         # --- Définir la résolution cible pour les Shorts (9:16) ---
         target_width, target_height = 1080, 1920
@@ -122,13 +74,13 @@ def trim_video_for_short(input_path, output_path, max_duration_seconds=60, clip_
         font_path_regular = os.path.join(assets_dir, 'Roboto-Regular.ttf') # Exemple
         font_path_bold = os.path.join(assets_dir, 'Roboto-Bold.ttf')       # Exemple
 
-        # Si les fichiers de police ne sont pas trouvés, on utilise les polices par défaut de MoviePy
+        # Si les fichiers de police ne sont pas trouvés, on utilise une police système par défaut
         if not os.path.exists(font_path_regular):
-            print(f"⚠️ Police '{font_path_regular}' non trouvée. Utilisation de la police par défaut de MoviePy pour le texte normal.")
-            font_path_regular = "sans" # Police par défaut de MoviePy
+            print(f"⚠️ Police '{font_path_regular}' non trouvée. Utilisation de la police par défaut pour le texte normal.")
+            font_path_regular = text_render.FALLBACK_FONT
         if not os.path.exists(font_path_bold):
-            print(f"⚠️ Police '{font_path_bold}' non trouvée. Utilisation de la police par défaut de MoviePy (bold) pour les titres.")
-            font_path_bold = "sans" # MoviePy tentera d'utiliser une version bold si "sans" est spécifié et une est dispo.
+            print(f"⚠️ Police '{font_path_bold}' non trouvée. Utilisation de la police par défaut pour les titres.")
+            font_path_bold = text_render.FALLBACK_FONT
 
         # Tu peux décommenter et utiliser la méthode 1 si tu es sûr de ton environnement.
         # Sinon, la méthode 2 (fournir des fichiers .ttf) est la plus robuste.
@@ -147,9 +99,8 @@ def trim_video_for_short(input_path, output_path, max_duration_seconds=60, clip_
         else:
             print(f"✅ Création d'un fond personnalisé avec l'image : {os.path.basename(custom_background_image_path)}")
             try:
-                background_clip = ImageClip(custom_background_image_path)
-                # Redimensionne l'image pour qu'elle corresponde exactement à la résolution cible
-                background_clip = background_clip.resize(newsize=(target_width, target_height))
+                # Image déjà redimensionnée à la résolution cible (préparée une fois par version de l'asset)
+                background_clip = ImageClip(assets_cache.prepared_background((target_width, target_height)))
                 # Définit la durée de l'image de fond pour qu'elle dure toute la vidéo
                 background_clip = background_clip.set_duration(duration)
             except Exception as e:
@@ -159,31 +110,53 @@ def trim_video_for_short(input_path, output_path, max_duration_seconds=60, clip_
         # --- Fin de la configuration du fond personnalisé ---
 
 
-        found_webcam_and_cropped = False
+        # Zone source affichée : toute l'image, ou la zone du diffuseur si elle est détectée
+        source_box = (0, 0, original_width, original_height)
         if enable_webcam_crop:
-            cropped_webcam_clip = crop_webcam(clip)
-            if cropped_webcam_clip:
-                found_webcam_and_cropped = True
-                main_video_clip = moviepy_resize(cropped_webcam_clip, width=target_width * 2) # Facteur de zoom 2
-                
-                all_video_elements.append(background_clip)
-                all_video_elements.append(main_video_clip.set_position(("center", "center")))
+            # Détection faite une fois par streamer et par jeu, puis servie depuis le cache
+            coords = webcam_detect.cached_webcam_layout(input_path, clip_data, person=True)
+            if coords:
+                print("\t✅ Zone du diffuseur trouvée - rognage et zoom.")
+                source_box = (coords['x1'], coords['y1'], coords['x2'], coords['y2'])
             else:
                 print("La détection de webcam était activée mais n'a pas pu recadrer. Utilisation du mode fond personnalisé.")
 
-        if not found_webcam_and_cropped:
-            all_video_elements.append(background_clip.set_position(("center", "center")))
-            main_video_clip = clip.copy()
-            main_video_display_width = int(target_width * 2) # Facteur de zoom 2
-            main_video_clip = moviepy_resize(main_video_clip, width=main_video_display_width)
-            main_video_clip = main_video_clip.fx(even_size)
-
-            all_video_elements.append(main_video_clip.set_position(("center", "center")))
-        
-        video_with_visuals = CompositeVideoClip(all_video_elements, size=(target_width, target_height)).set_duration(duration)
-
+        all_video_elements.append(background_clip.set_position(("center", "center")))
+        box_width, box_height = source_box[2] - source_box[0], source_box[3] - source_box[1]
+        main_video_display_width = int(target_width * 2) # Facteur de zoom 2
+        main_video_display_height = int(round(box_height * main_video_display_width / box_width))
+        main_video_display_height -= main_video_display_height % 2 # Dimensions paires (comme even_size)
+
+        # La vidéo est décodée par ffmpeg directement recadrée et à sa taille d'affichage,
+        # limitée à sa partie visible : plus de redimensionnement image par image en Python
+        main_region = {
+            'crop': source_box,
+            'size': (main_video_display_width, main_video_display_height),
+            'pos': ((target_width - main_video_display_width) // 2,
+                    (target_height - main_video_display_height) // 2),
+        }
+        if smart_crop.SMART_CROP and source_box == (0, 0, original_width, original_height):
+            # Image entière : seule la partie visible (largeur de sortie) est gardée, et elle
+            # suit l'action au lieu de rester centrée
+            window_width = original_width * target_width / main_video_display_width
+            main_region = smart_crop.pan_region(input_path, window_width,
+                                                (target_width, main_video_display_height),
+                                                (0, main_region['pos'][1]), duration)
         title_text = clip_data.get('title', 'Titre du clip')
         streamer_name = clip_data.get('broadcaster_name', 'Nom du streamer')
+        profile = encode_profiles.get_encode_profile(encode_profile)
+
+        # Rendu identique déjà produit (même source, mise en page, textes, assets et profil)
+        cache_key = render_cache.render_key(input_path, layout="chatting", regions=[main_region], duration=duration,
+                                            backend="moviepy", profile=profile, title=title_text,
+                                            streamer=streamer_name)
+        cached = render_cache.lookup(cache_key, output_path)
+        if cached:
+            return cached
+
+        reader = SourceReader(input_path, [main_region], (target_width, target_height), duration)
+        all_video_elements.extend(reader.region_clips())
+
 
         # --- Utilise font_path_bold pour le titre du clip ---
         text_color = "white"
@@ -191,10 +164,11 @@ def trim_video_for_short(input_path, output_path, max_duration_seconds=60, clip_
         stroke_width = 1.5
         
         # Ajustements pour le titre : positionné un peu plus bas que le bord supérieur
-        title_clip = TextClip(title_text, fontsize=70, color=text_color,
-                              font=font_path_bold, stroke_color=stroke_color, stroke_width=stroke_width, # <--- ICI : Utilise font_path_bold
-                              size=(target_width * 0.9, None), # Texte sur 90% de la largeur
-                              method='caption') \
+        # Textes rastérisés par Pillow (plus d'appel à ImageMagick), mis en cache
+        title_clip = text_render.text_clip(title_text, font_path_bold, 70, # <--- ICI : Utilise font_path_bold
+                                           stroke_width=stroke_width,
+                                           width=target_width * 0.9, # Texte sur 90% de la largeur, avec retour à la ligne
+                                           color=text_color, stroke_color=stroke_color) \
                      .set_duration(duration) \
                      .set_position(("center", int(target_height * 0.08))) # 8% de la hauteur du haut
 
@@ -203,8 +177,9 @@ def trim_video_for_short(input_path, output_path, max_duration_seconds=60, clip_
         # Ajustements pour le nom du streamer : positionné un peu plus haut que le bord inférieur
         # target_height * 0.92 place le HAUT du texte à 92% de la hauteur.
         # Soustraire 40 (taille approximative de la police) assure que le bas du texte est visible.
-        streamer_clip = TextClip(f"@{streamer_name}", fontsize=40, color=text_color,
-                                 font=font_path_regular, stroke_color=stroke_color, stroke_width=stroke_width) \
+        streamer_clip = text_render.text_clip(f"@{streamer_name}", font_path_regular, 40,
+                                              stroke_width=stroke_width,
+                                              color=text_color, stroke_color=stroke_color) \
                         .set_duration(duration) \
                         .set_position(("center", int(target_height * 0.85) - 40)) 
         
@@ -229,52 +204,61 @@ def trim_video_for_short(input_path, output_path, max_duration_seconds=60, clip_
             # Ce message s'affichera si twitch_icon.png n'est pas trouvé
             print("⚠️ Fichier 'twitch_icon.png' non trouvé dans le dossier 'assets'. L'icône ne sera pas ajoutée.")
 
-        final_elements_main_video = [video_with_visuals, title_clip, streamer_clip]
+        final_elements_main_video = all_video_elements + [title_clip, streamer_clip]
         if twitch_icon_clip:
             final_elements_main_video.append(twitch_icon_clip)
 
-        # Crée le clip principal AVEC le fond, le texte et potentiellement l'icône
-        composed_main_video_clip = CompositeVideoClip(final_elements_main_video).set_duration(duration)
-
+        # Crée le clip principal AVEC le fond, le texte et potentiellement l'icône.
+        # Le fond et les textes, fixes, sont précomposés une seule fois : seule la vidéo
+        # est recopiée à chaque image.
+        if has_audio:
+            audio_clip = AudioFileClip(input_path)
+            if audio_clip.duration > duration:
+                audio_clip = audio_clip.subclip(0, duration)
+        composed_main_video_clip = compositor.composite(final_elements_main_video, (target_width, target_height), duration) \
+                                             .set_audio(audio_clip)
+
+
+        # L'écriture de la vidéo principale, qui est la partie cruciale !
+        main_path = os.path.splitext(output_path)[0] + "-main.mp4"
+        # Le profil d'encodage fixe aussi les fps de sortie (communs à tous les rendus et à la
+        # séquence de fin), quel que soit le FPS du clip original.
+        print(f"🎛️  Profil d'encodage : {profile['name']}")
+        with instrumentation.stage("render.encode", backend="moviepy", profile=profile['name']):
+            composed_main_video_clip.write_videofile(main_path,
+                                        temp_audiofile=temp_audio_path(output_path),
+                                        remove_temp=True,
+                                        logger=None,
+                                        **encode_profiles.moviepy_write_kwargs(profile))
+            instrumentation.add(frames=reader.frame_count, decode_seconds=reader.decode_seconds)
 
         # --- AJOUT DE LA SÉQUENCE DE FIN ---
+        # La séquence de fin est préparée une fois au format de sortie (résolution, fps, audio),
+        # puis concaténée en copie de flux : elle n'est plus ré-encodée à chaque clip.
         print(f"⏳ Ajout de la séquence de fin : {os.path.basename(end_short_video_path)}")
+        end_clip_path = None
         if os.path.exists(end_short_video_path):
             try:
-                end_clip = VideoFileClip(end_short_video_path)
-                
-                # Redimensionne la vidéo de fin à la taille cible (1080x1920)
-                end_clip = end_clip.resize(newsize=(target_width, target_height))
-                
                 # S'assurer que le clip de fin a la bonne durée (1.2s)
-                # Si ta vidéo est exactement de 1.2s, pas besoin de subclip.
-                # Mais c'est une bonne sécurité au cas où elle serait plus longue.
-                if end_clip.duration > 1.2:
-                    end_clip = end_clip.subclip(0, 1.2)
-                elif end_clip.duration < 1.2:
-                    print(f"⚠️ La vidéo de fin ({end_clip.duration:.2f}s) est plus courte que 1.2s. Elle ne sera pas étirée.")
-                
-                # Concaténer le clip principal traité avec le clip de fin
-                final_video = concatenate_videoclips([composed_main_video_clip, end_clip])
-                print("✅ Séquence de fin ajoutée avec succès.")
-
+                end_clip_path = assets_cache.prepared_outro((target_width, target_height), profile, max_duration=1.2)
             except Exception as e:
-                print(f"❌ Erreur lors du chargement ou du traitement de la vidéo de fin : {e}. Le Short sera créé sans séquence de fin.")
-                final_video = composed_main_video_clip # Utilise seulement le clip principal si la fin échoue
+                print(f"❌ Erreur lors de la préparation de la vidéo de fin : {e}. Le Short sera créé sans séquence de fin.")
         else:
             print(f"⚠️ Fichier 'fin_de_short.mp4' non trouvé dans le dossier 'assets'. Le Short sera créé sans séquence de fin.")
-            final_video = composed_main_video_clip # Utilise seulement le clip principal si le fichier n'est pas trouvé
-        # --- FIN DE L'AJOUT DE LA SÉQUENCE DE FIN ---
 
+        if end_clip_path:
+            with instrumentation.stage("render.outro"):
+                assets_cache.concat_with_outro(main_path, output_path, end_clip_path,
+                                               metadata=render_engine.backend_metadata("moviepy"))
+            os.remove(main_path)
+            print("✅ Séquence de fin ajoutée avec succès.")
+        else:
+            os.replace(main_path, output_path) # Utilise seulement le clip principal
+        # --- FIN DE L'AJOUT DE LA SÉQUENCE DE FIN ---
 
-        # L'écriture du fichier final, qui est la partie cruciale !
-        final_video.write_videofile(output_path,
-                                    codec="libx264",
-                                    audio_codec="aac",
-                                    temp_audiofile='temp-audio.m4a',
-                                    remove_temp=True,
-                                    fps=clip.fps, # Utilise le FPS du clip original pour la vidéo principale
-                                    logger=None)
+        render_engine.write_render_manifest(output_path, backend="moviepy", layout="chatting",
+                                            encode_profile=profile['name'])
+        render_cache.store(cache_key, output_path)
         print(f"✅ Clip traité et sauvegardé : {output_path}")
         return output_path
             
@@ -288,9 +272,9 @@ def trim_video_for_short(input_path, output_path, max_duration_seconds=60, clip_
         # S'assurer que tous les clips MoviePy sont fermés pour libérer les ressources
         if 'clip' in locals() and clip is not None:
             clip.close()
+        if reader is not None:
+            reader.close()
+        if audio_clip is not None:
+            audio_clip.close()
         if 'composed_main_video_clip' in locals() and composed_main_video_clip is not None:
             composed_main_video_clip.close()
-        if 'end_clip' in locals() and end_clip is not None: # Ferme le clip de fin aussi
-            end_clip.close()
-        if 'final_video' in locals() and final_video is not None:
-            final_video.close()
\ No newline at end of file
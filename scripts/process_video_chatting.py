@@ -1,4 +1,5 @@
 from scripts.process_video import trim_video_for_short
 
-def process_chatting_clip(input_path, output_path, max_duration_seconds, clip_data):
-    return trim_video_for_short(input_path, output_path, max_duration_seconds, clip_data, enable_webcam_crop=True)
+def process_chatting_clip(input_path, output_path, max_duration_seconds, clip_data, encode_profile=None):
+    return trim_video_for_short(input_path, output_path, max_duration_seconds, clip_data, enable_webcam_crop=True,
+                                encode_profile=encode_profile)
@@ -2,135 +2,388 @@
 
 import sys
 import os
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 from moviepy.editor import (
-    VideoFileClip,
-    CompositeVideoClip,
-    TextClip,
+    AudioFileClip,
     ImageClip,
-    concatenate_videoclips,
     ColorClip
 )
-from moviepy.video.fx.resize import resize
-from moviepy.config import change_settings
 
-# 👇 Déclaration explicite du chemin vers ImageMagick
-change_settings({"IMAGEMAGICK_BINARY": "/usr/bin/convert"})
+from workspace import temp_audio_path
+import assets_cache
+import compositor
+import encode_profiles
+import ffmpeg_render
+import instrumentation
+import render_cache
+import render_engine
+import smart_crop
+import text_render
+import webcam_detect
+from source_reader import SourceReader
 
 # ------------------------------
 # Configuration globale
 # ------------------------------
 RESOLUTION    = (1080, 1920)
+FPS           = encode_profiles.OUTPUT_FPS
 MAX_DURATION  = 180  # secondes
+# Zone webcam par défaut (source 1920x1080), si la détection automatique ne trouve rien
 WEBCAM_COORDS = {'x1': 5, 'y1': 8, 'x2': 542, 'y2': 282}
+# Part minimale de l'image source laissée au jeu à côté de la webcam ; en dessous, la zone
+# détectée est rejetée (zones par défaut, puis plein écran)
+MIN_GAME_AREA_RATIO = 0.35
+# Mise en page : "split" (webcam + jeu), "fullscreen" (plein écran recadré intelligemment)
+# ou "auto" (plein écran si aucune webcam n'est détectée)
+GAMEPLAY_LAYOUT = os.getenv("GAMEPLAY_LAYOUT", "split")
+# Rendu parallèle : nombre de segments rendus chacun dans un processus ("auto" = nombre de
+# cœurs, "1" = rendu en un seul processus), et durée minimale d'un segment
+RENDER_SHARDS = os.getenv("RENDER_SHARDS", "auto")
+RENDER_SHARD_MIN_SECONDS = float(os.getenv("RENDER_SHARD_MIN_SECONDS", "8"))
 ASSETS_DIR    = os.path.join(os.path.dirname(__file__), '..', 'assets')
 OUTPUT_FILE   = None  # on écrira vers le chemin passé en argument
 
 # ------------------------------
 # Fonctions utilitaires
 # ------------------------------
-def load_clip(path):
-    clip = VideoFileClip(path)
-    if clip.duration > MAX_DURATION:
-        clip = clip.subclip(0, MAX_DURATION)
-    return clip
-
-def create_background(duration):
-    bg_path = os.path.join(ASSETS_DIR, "fond_short.png")
-    if os.path.exists(bg_path):
-        bg = ImageClip(bg_path).resize(RESOLUTION)
+def create_background(duration, bg_path=None):
+    # Fond déjà redimensionné à RESOLUTION (préparé une fois par version de l'asset)
+    bg_path = bg_path or assets_cache.prepared_background(RESOLUTION)
+    if bg_path:
+        bg = ImageClip(bg_path)
     else:
         bg = ColorClip(RESOLUTION, color=(0, 0, 0))
     return bg.set_duration(duration)
 
-def extract_webcam(clip):
-    cam = clip.crop(
-        x1=WEBCAM_COORDS['x1'], y1=WEBCAM_COORDS['y1'],
-        x2=WEBCAM_COORDS['x2'], y2=WEBCAM_COORDS['y2']
-    )
-    cam = cam.resize(height=int(RESOLUTION[1] * 0.33))
-    x_pos = (RESOLUTION[0] - cam.w) // 2
-    return cam.set_position((x_pos, 0))
-
-def extract_gameplay(clip):
-    game = clip.crop(y1=WEBCAM_COORDS['y2'], y2=clip.h)
-    game = game.resize(height=int(RESOLUTION[1] * 0.67))
-    x_pos = (RESOLUTION[0] - game.w) // 2
-    y_pos = int(RESOLUTION[1] * 0.33)
-    return game.set_position((x_pos, y_pos))
-
-def full_screen_clip(clip):
-    c = clip.resize(height=RESOLUTION[1])
-    c = c.crop(
-        x_center=c.w/2, width=RESOLUTION[0],
-        y_center=c.h/2, height=RESOLUTION[1]
-    )
-    return c.set_position((0, 0))
+def _clamp_box(coords, src_w, src_h):
+    """
+    Zone (x1, y1, x2, y2) ramenée dans l'image, ou None si elle est vide ou dégénérée.
+    """
+    x1, x2 = max(0, min(coords['x1'], src_w)), max(0, min(coords['x2'], src_w))
+    y1, y2 = max(0, min(coords['y1'], src_h)), max(0, min(coords['y2'], src_h))
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return None
+    return (x1, y1, x2, y2)
 
-def create_text_clip(text, font, size, stroke, y_pos, duration):
-    try:
-        txt = TextClip(
-            text, fontsize=size, font=font,
-            color='white', stroke_color='black', stroke_width=stroke
-        )
-    except:
-        txt = TextClip(
-            text, fontsize=size,
-            color='white', stroke_color='black', stroke_width=stroke
-        )
-    return txt.set_position(('center', y_pos)).set_duration(duration)
-
-def append_end_sequence(main_clip):
-    end_path = os.path.join(ASSETS_DIR, "fin_de_short.mp4")
-    if os.path.exists(end_path):
-        end_clip = VideoFileClip(end_path).resize(RESOLUTION)
-        return concatenate_videoclips([main_clip, end_clip])
-    return main_clip
+def game_crop_around(cam_crop, src_w, src_h):
+    """
+    Zone de jeu : la plus grande bande de la source qui ne contient pas la webcam
+    (au-dessus, en dessous, à gauche ou à droite), quelle que soit la position de
+    la webcam. None si cette bande laisse trop peu d'image au jeu.
+    """
+    x1, y1, x2, y2 = cam_crop
+    # Bandes horizontales d'abord : à surface égale, on garde toute la largeur du jeu
+    bands = [(0, y2, src_w, src_h), (0, 0, src_w, y1), (x2, 0, src_w, src_h), (0, 0, x1, src_h)]
+    best = max(bands, key=lambda b: (b[2] - b[0]) * (b[3] - b[1]))
+    if (best[2] - best[0]) * (best[3] - best[1]) < MIN_GAME_AREA_RATIO * src_w * src_h:
+        return None
+    return best
+
+def gameplay_layout(src_w, src_h, webcam_coords=None):
+    """
+    Calcule la disposition gameplay (zones source → zones cibles) pour une
+    source de taille src_w x src_h. Partagée par tous les moteurs de rendu
+    pour qu'ils produisent exactement la même mise en page.
+
+    Chaque zone contient :
+      - 'crop' : (x1, y1, x2, y2) dans la source
+      - 'size' : (w, h) après redimensionnement
+      - 'pos'  : (x, y) dans l'image finale (peut être négatif : la zone déborde)
+
+    Une zone webcam inutilisable (hors champ, ou laissant trop peu de place au jeu)
+    est remplacée par WEBCAM_COORDS ; si celle-ci ne convient pas non plus, retourne None.
+    """
+    W, H = RESOLUTION
+    cam_crop = game_crop = None
+    for coords in (webcam_coords, WEBCAM_COORDS):
+        if coords is None:
+            continue
+        cam_crop = _clamp_box(coords, src_w, src_h)
+        game_crop = cam_crop and game_crop_around(cam_crop, src_w, src_h)
+        if game_crop:
+            break
+        print(f"⚠️ Zone webcam {coords} inutilisable pour une source {src_w}x{src_h}.")
+    if not game_crop:
+        return None
+
+    cam_h = int(H * 0.33)
+    cam_w = int((cam_crop[2] - cam_crop[0]) * cam_h / (cam_crop[3] - cam_crop[1]))
+
+    game_h = int(H * 0.67)
+    game_w = int((game_crop[2] - game_crop[0]) * game_h / (game_crop[3] - game_crop[1]))
+
+    return {
+        'webcam': {
+            'crop': cam_crop,
+            'size': (cam_w, cam_h),
+            'pos': ((W - cam_w) // 2, 0),
+        },
+        'gameplay': {
+            'crop': game_crop,
+            'size': (game_w, game_h),
+            'pos': ((W - game_w) // 2, int(H * 0.33)),
+        },
+    }
+
+def full_screen_layout(input_path, src_w, src_h, duration):
+    """
+    Mise en page plein écran : une fenêtre 9:16 de toute la hauteur de la source,
+    qui suit l'action (smart_crop) ou reste centrée si SMART_CROP=0.
+    """
+    window_w = int(src_h * RESOLUTION[0] / RESOLUTION[1])
+    if smart_crop.SMART_CROP:
+        return smart_crop.pan_region(input_path, window_w, RESOLUTION, (0, 0), duration)
+    x1 = (src_w - window_w) // 2
+    return {'crop': (x1, 0, x1 + window_w, src_h), 'size': RESOLUTION, 'pos': (0, 0)}
+
+def layout_regions(input_path, webcam_coords, duration):
+    """
+    Zones à rendre, dans l'ordre d'empilement, selon GAMEPLAY_LAYOUT.
+    webcam_coords vaut None si aucune webcam n'a été détectée.
+    """
+    src_w, src_h, _, _ = ffmpeg_render.probe(input_path)
+    if GAMEPLAY_LAYOUT == "fullscreen" or (GAMEPLAY_LAYOUT == "auto" and webcam_coords is None):
+        return [full_screen_layout(input_path, src_w, src_h, duration)]
+    layout = gameplay_layout(src_w, src_h, webcam_coords)
+    if layout is None:
+        print("📺 Aucune mise en page webcam + jeu possible : plein écran.")
+        return [full_screen_layout(input_path, src_w, src_h, duration)]
+    return [layout['gameplay'], layout['webcam']]
+
+def append_end_sequence(main_path, output_path, profile, metadata=None):
+    """
+    Ajoute la séquence de fin préparée à la vidéo principale déjà encodée
+    (concaténation en copie de flux, sans ré-encodage).
+    """
+    end_path = assets_cache.prepared_outro(RESOLUTION, profile)
+    if end_path:
+        assets_cache.concat_with_outro(main_path, output_path, end_path, metadata=metadata)
+        os.remove(main_path)
+    else:
+        os.replace(main_path, output_path)
+    return output_path
 
 # ------------------------------
 # Fonction principale exposée
 # ------------------------------
-def process_gameplay_clip(input_path, output_path, max_duration_seconds, clip_data):
+def process_gameplay_clip(input_path, output_path, max_duration_seconds, clip_data, backend=None,
+                          encode_profile=None):
     """
     input_path: chemin vers le MP4 brut
     output_path: chemin où enregistrer le Short final
     clip_data doit contenir 'title', 'broadcaster_name', 'game_name'
+    backend: 'moviepy' ou 'ffmpeg' (par défaut : render_engine.RENDER_BACKEND)
+    encode_profile: nom du profil d'encodage (par défaut : encode_profiles.ENCODE_PROFILE)
+    """
+    backend = render_engine.resolve_backend(backend)
+    profile = encode_profiles.get_encode_profile(encode_profile)
+    print(f"🎞️  Moteur de rendu : {backend} (profil d'encodage : {profile['name']})")
+    with instrumentation.stage("render.layout"):
+        # Zone webcam détectée (une fois par streamer et par jeu, puis en cache)
+        webcam_coords = webcam_detect.cached_webcam_layout(input_path, clip_data)
+        duration = min(ffmpeg_render.probe(input_path)[2], MAX_DURATION)
+        regions = layout_regions(input_path, webcam_coords, duration)
+    layout_name = "gameplay" if len(regions) > 1 else "fullscreen"
+
+    # Rendu identique déjà produit (même source, mise en page, textes, assets et profil)
+    cache_key = render_cache.render_key(
+        input_path, layout=layout_name, regions=regions, duration=duration, backend=backend, profile=profile,
+        title=clip_data.get('title', 'Titre du clip'), streamer=clip_data.get('broadcaster_name', 'Streamer'))
+    cached = render_cache.lookup(cache_key, output_path)
+    if cached:
+        return cached
+
+    with instrumentation.stage("render.encode", backend=backend, profile=profile['name']):
+        main_path = render_main_part(backend, input_path, _main_part_path(output_path), clip_data, profile,
+                                     regions, duration)
+        instrumentation.add(frames=int(math.ceil(duration * FPS - 1e-6)))
+    with instrumentation.stage("render.outro"):
+        result = append_end_sequence(main_path, output_path, profile, render_engine.backend_metadata(backend))
+    if result:
+        render_engine.write_render_manifest(result, backend=backend, layout=layout_name,
+                                            encode_profile=profile['name'], webcam=webcam_coords)
+        render_cache.store(cache_key, result)
+    return result
+
+# ------------------------------
+# Rendu parallèle par segments
+# ------------------------------
+def shard_count(duration):
+    """
+    Nombre de segments pour un clip de `duration` secondes (selon RENDER_SHARDS et les cœurs).
+    """
+    wanted = (os.cpu_count() or 1) if RENDER_SHARDS == "auto" else int(RENDER_SHARDS)
+    return max(1, min(wanted, int(duration // max(RENDER_SHARD_MIN_SECONDS, 1.0))))
+
+def shard_ranges(duration, shards, gop_frames, fps=FPS):
+    """
+    Découpe [0, duration] en au plus `shards` plages (début, durée) dont les bornes tombent
+    sur des images clés : chaque plage compte un multiple de gop_frames images, si bien que
+    les segments concaténés ont la même structure de GOP qu'un rendu d'un seul tenant.
+    """
+    total_frames = int(math.ceil(duration * fps - 1e-6))
+    gops = int(math.ceil(total_frames / gop_frames))
+    frames_per_shard = int(math.ceil(gops / max(1, shards))) * gop_frames
+    ranges = []
+    for first in range(0, total_frames, frames_per_shard):
+        start = first / fps
+        length = min(frames_per_shard / fps, duration - start)
+        ranges.append((start, length))
+    return ranges
+
+def _render_part(backend, input_path, part_path, overlays, profile, regions, start, duration, quiet=False,
+                 with_audio=True):
+    render = _render_with_ffmpeg if backend == "ffmpeg" else _render_with_moviepy
+    return render(input_path, part_path, overlays, profile, regions, start=start, duration=duration, quiet=quiet,
+                  with_audio=with_audio)
+
+def render_main_part(backend, input_path, main_path, clip_data, profile, regions, duration):
+    """
+    Rend la vidéo principale (sans séquence de fin). Si plusieurs segments sont possibles,
+    chacun est rendu sans son dans un processus avec la même mise en page et les mêmes
+    paramètres d'encodage, puis les segments sont concaténés en copie de flux et l'audio
+    de tout le clip est encodé une seule fois par-dessus (un encodeur AAC par segment
+    ajouterait à chaque raccord son délai d'amorçage, et décalerait le son).
+    """
+    ranges = shard_ranges(duration, shard_count(duration), profile['gop'])
+    # Fond et textes préparés ici, une fois : les segments ne font que lire les fichiers en cache
+    overlays = prepare_overlays(clip_data)
+    if len(ranges) == 1:
+        return _render_part(backend, input_path, main_path, overlays, profile, regions, 0.0, duration)
+
+    print(f"🧩 Rendu parallèle : {len(ranges)} segments de {ranges[0][1]:.0f}s max.")
+    # Les cœurs sont répartis entre les encodeurs des segments
+    shard_profile = dict(profile, threads=max(1, (os.cpu_count() or 1) // len(ranges)))
+    root = os.path.splitext(main_path)[0]
+    parts = [f"{root}-part{i:02d}.mp4" for i in range(len(ranges))]
+    video_path = f"{root}-video.mp4"
+    try:
+        # "spawn" : pas de fork d'un processus qui a déjà des threads (mode pipeline)
+        with ProcessPoolExecutor(max_workers=len(ranges), mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_render_part, backend, input_path, part, overlays, shard_profile,
+                                   regions, start, length, True, False)
+                       for part, (start, length) in zip(parts, ranges)]
+            for future in futures:
+                future.result()
+        assets_cache.concat_files(parts, video_path)
+        has_audio = ffmpeg_render.probe(input_path)[3]
+        ffmpeg_render.run_ffmpeg(ffmpeg_render.build_audio_mux_command(
+            video_path, input_path, main_path, duration, has_audio,
+            audio_args=encode_profiles.ffmpeg_audio_args(profile)))
+    finally:
+        for part in parts + [video_path]:
+            if os.path.exists(part):
+                os.remove(part)
+    return main_path
+
+# ------------------------------
+# Moteurs de rendu
+# ------------------------------
+def _render_with_moviepy(input_path, main_path, overlays, profile, regions, start=0.0, duration=None,
+                         quiet=False, with_audio=True):
+    """
+    Rend la plage [start, start + duration] de la vidéo principale vers main_path.
+    overlays : fond et textes préparés par prepare_overlays.
+    with_audio : False pour un segment sans son (rendu parallèle).
     """
     # On ignore max_duration_seconds ici, on utilise MAX_DURATION
-    clip = load_clip(input_path)
-    duration = clip.duration
-    bg = create_background(duration)
+    src_w, src_h, src_duration, has_audio = ffmpeg_render.probe(input_path)
+    if duration is None:
+        duration = min(src_duration, MAX_DURATION) - start
+    bg = create_background(duration, overlays['background'])
 
-    # Layout gameplay : webcam + zone de jeu
-    webcam = extract_webcam(clip)
-    gameplay = extract_gameplay(clip)
-    overlays = [gameplay, webcam]
+    # Zones (webcam + jeu, ou plein écran) décodées par ffmpeg directement coupées,
+    # recadrées et redimensionnées (aucun resize image par image en Python)
+    reader = SourceReader(input_path, regions, RESOLUTION, duration, start=start)
+    layers = reader.region_clips()
+    audio = AudioFileClip(input_path) if has_audio and with_audio else None
+    if audio is not None and (start > 0 or audio.duration > start + duration):
+        audio = audio.subclip(start, min(audio.duration, start + duration))
 
-    # Textes
-    title_text = clip_data.get('title', 'Titre du clip')
-    streamer   = clip_data.get('broadcaster_name', 'Streamer')
-    title_clip = create_text_clip(title_text, "Roboto-Bold.ttf", 70, 1.5, 'top', duration)
-    streamer_clip = create_text_clip(f"@{streamer}", "Roboto-Regular.ttf", 40, 0.5, 'bottom', duration)
-    overlays.extend([title_clip, streamer_clip])
-
-    # Composition
-    composed = CompositeVideoClip([bg] + overlays, size=RESOLUTION).set_audio(clip.audio)
-    final    = append_end_sequence(composed)
-
-    # Écriture du fichier
-    final.write_videofile(
-        output_path,
-        fps=30,
-        codec="libx264",
-        audio_codec="aac"
+    # Textes (PNG déjà rastérisés, à leur position finale)
+    layers.extend(text_render.png_clip(o['path']).set_position(o['pos']).set_duration(duration)
+                  for o in overlays['texts'])
+
+    # Composition : fond et textes précomposés une fois, seules les zones vidéo sont copiées à chaque image
+    composed = compositor.composite([bg] + layers, RESOLUTION, duration).set_audio(audio)
+
+    # Écriture de la vidéo principale (la séquence de fin est ajoutée ensuite)
+    composed.write_videofile(
+        main_path,
+        temp_audiofile=temp_audio_path(main_path),
+        remove_temp=True,
+        audio=with_audio,
+        logger=None if quiet else "bar",
+        **encode_profiles.moviepy_write_kwargs(profile, FPS)
     )
 
-    # Fermer les clips pour libérer la mémoire
-    clip.close()
+    # Fermer le décodeur et les clips pour libérer la mémoire
+    instrumentation.add(decode_seconds=reader.decode_seconds)
+    reader.close()
+    if audio is not None:
+        audio.close()
     composed.close()
-    final.close()
+    return main_path
 
-    return output_path
+def _main_part_path(output_path):
+    return os.path.splitext(output_path)[0] + "-main.mp4"
+
+def _text_overlay(text, font, size, stroke, y_pos, width=None):
+    """
+    PNG RGBA du texte (rastérisé par Pillow, servi depuis le cache)
+    et sa position finale dans l'image, calculée comme le fait MoviePy.
+    width : largeur maximale en pixels, avec retour à la ligne (None : une seule ligne).
+    """
+    png_path = text_render.text_png(text, font, size, stroke_width=stroke, width=width)
+    rgb, _ = text_render.text_image(text, font, size, stroke_width=stroke, width=width)
+    h, w = rgb.shape[:2]
+    x = int((RESOLUTION[0] - w) / 2)
+    y = 0 if y_pos == 'top' else RESOLUTION[1] - h
+    return {'path': png_path, 'pos': (x, y)}
+
+def prepare_overlays(clip_data):
+    """
+    Fond et textes (PNG en cache avec leur position), préparés dans le processus
+    principal et passés tels quels aux segments rendus en parallèle.
+    """
+    title_text = clip_data.get('title', 'Titre du clip')
+    streamer   = clip_data.get('broadcaster_name', 'Streamer')
+    return {
+        'background': assets_cache.prepared_background(RESOLUTION),
+        'texts': [
+            # Titre sur 90% de la largeur, avec retour à la ligne (comme process_video.py)
+            _text_overlay(title_text, "Roboto-Bold.ttf", 70, 1.5, 'top', width=RESOLUTION[0] * 0.9),
+            _text_overlay(f"@{streamer}", "Roboto-Regular.ttf", 40, 0.5, 'bottom'),
+        ],
+    }
+
+def _render_with_ffmpeg(input_path, main_path, overlays, profile, regions, start=0.0, duration=None,
+                        quiet=False, with_audio=True):
+    """
+    Rend la plage [start, start + duration] de la vidéo principale vers main_path.
+    overlays : fond et textes préparés par prepare_overlays.
+    with_audio : False pour un segment sans son (rendu parallèle).
+    """
+    src_w, src_h, src_duration, has_audio = ffmpeg_render.probe(input_path)
+    if duration is None:
+        duration = min(src_duration, MAX_DURATION) - start
+
+    # Les textes sont rastérisés une fois en PNG (cache), puis superposés par ffmpeg
+    cmd = ffmpeg_render.build_layout_command(
+        input_path, main_path, duration, has_audio, RESOLUTION,
+        regions=regions,
+        background_path=overlays['background'],
+        overlays=overlays['texts'],
+        start=start,
+        encode_args=(encode_profiles.ffmpeg_encode_args(profile, FPS) if with_audio
+                     else encode_profiles.ffmpeg_video_args(profile, FPS)),
+        with_audio=with_audio
+    )
+    ffmpeg_render.run_ffmpeg(cmd)
+    return main_path
 
 # ------------------------------
 # Entrée en mode standalone (facultatif)
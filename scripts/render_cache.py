@@ -0,0 +1,108 @@
+# scripts/render_cache.py
+"""
+Cache des Shorts rendus.
+
+La clé d'un rendu est le hash de tout ce qui le détermine : contenu du clip
+source, paramètres de mise en page (zones, fenêtre de recadrage), textes
+affichés, versions des assets (fond, séquence de fin, polices), profil
+d'encodage et moteur de rendu. Un rendu identique déjà produit est recopié
+depuis data/cache/renders/ au lieu d'être ré-encodé : réessayer un upload
+échoué ou retoucher les métadonnées ne coûte plus de rendu.
+
+Le cache est borné en taille (RENDER_CACHE_MAX_MB) ; les rendus les moins
+récemment utilisés sont supprimés en premier.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import render_engine
+from assets_cache import ASSETS_DIR, BACKGROUND_ASSET, OUTRO_ASSET, asset_hash
+
+RENDER_CACHE        = os.getenv("RENDER_CACHE", "1") == "1"
+RENDER_CACHE_DIR    = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'cache', 'renders'))
+RENDER_CACHE_MAX_MB = int(os.getenv("RENDER_CACHE_MAX_MB", "1024"))
+# À incrémenter quand le code de rendu change le résultat à paramètres égaux
+RENDER_CACHE_VERSION = 1
+
+FONT_ASSETS = (os.path.join(ASSETS_DIR, 'Roboto-Bold.ttf'), os.path.join(ASSETS_DIR, 'Roboto-Regular.ttf'))
+
+_lock = threading.Lock()
+
+
+def render_key(source_path, **params):
+    """
+    Clé de cache du rendu de `source_path` avec les paramètres donnés
+    (valeurs sérialisables en JSON : zones, textes, profil, moteur...).
+    """
+    assets = {os.path.basename(p): asset_hash(p)
+              for p in (BACKGROUND_ASSET, OUTRO_ASSET) + FONT_ASSETS if os.path.exists(p)}
+    payload = json.dumps({"version": RENDER_CACHE_VERSION, "source": asset_hash(source_path),
+                          "assets": assets, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:24]
+
+
+def _entry_path(key):
+    return os.path.join(RENDER_CACHE_DIR, key + ".mp4")
+
+
+def lookup(key, output_path):
+    """
+    Copie le rendu en cache vers output_path (avec son manifeste).
+    Retourne output_path si le rendu était en cache, sinon None.
+    """
+    if not RENDER_CACHE:
+        return None
+    path = _entry_path(key)
+    with _lock:
+        if not os.path.exists(path):
+            return None
+        os.utime(path)
+        # Copie (et non lien) : un rendu ultérieur vers output_path ne doit pas écraser le cache
+        shutil.copyfile(path, output_path)
+        if os.path.exists(render_engine.manifest_path(path)):
+            shutil.copyfile(render_engine.manifest_path(path), render_engine.manifest_path(output_path))
+    print(f"⚡ Rendu déjà en cache ({key}), aucun ré-encodage.")
+    return output_path
+
+
+def store(key, output_path):
+    """
+    Ajoute le rendu output_path (et son manifeste) au cache, puis applique la limite de taille.
+    """
+    if not RENDER_CACHE or not output_path or not os.path.exists(output_path):
+        return
+    path = _entry_path(key)
+    with _lock:
+        os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+        tmp_path = path + ".tmp"
+        shutil.copyfile(output_path, tmp_path)
+        os.replace(tmp_path, path)
+        if os.path.exists(render_engine.manifest_path(output_path)):
+            shutil.copyfile(render_engine.manifest_path(output_path), render_engine.manifest_path(path))
+        _prune()
+
+
+def _prune():
+    """
+    Supprime les rendus les moins récemment utilisés jusqu'à repasser sous la limite.
+    """
+    budget = RENDER_CACHE_MAX_MB * 1024 * 1024
+    entries = [e for e in os.scandir(RENDER_CACHE_DIR) if e.name.endswith(".mp4")]
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    total = sum(e.stat().st_size for e in entries)
+    removed = 0
+    for entry in entries:
+        if total <= budget:
+            break
+        total -= entry.stat().st_size
+        for path in (entry.path, render_engine.manifest_path(entry.path)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        removed += 1
+    if removed:
+        print(f"🧹 {removed} rendu(s) supprimé(s) du cache (limite : {RENDER_CACHE_MAX_MB} Mo).")
@@ -0,0 +1,48 @@
+# scripts/render_engine.py
+"""
+Sélection du moteur de rendu et manifeste de rendu.
+
+Deux moteurs sont disponibles :
+  - 'moviepy' : composition image par image en Python (historique) ;
+  - 'ffmpeg'  : un seul graphe filter_complex exécuté par ffmpeg.
+
+Le moteur utilisé est enregistré à côté de la vidéo produite, dans
+<sortie>.render.json, ainsi que dans le tag 'comment' du conteneur.
+"""
+import json
+import os
+
+RENDER_BACKENDS = ("moviepy", "ffmpeg")
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "moviepy")
+
+
+def resolve_backend(backend=None):
+    backend = backend or RENDER_BACKEND
+    if backend not in RENDER_BACKENDS:
+        print(f"⚠️ Moteur de rendu inconnu '{backend}', utilisation de 'moviepy'.")
+        return "moviepy"
+    return backend
+
+
+def backend_metadata(backend):
+    """
+    Métadonnées à écrire dans le conteneur MP4.
+    """
+    return {"comment": f"render_backend={backend}"}
+
+
+def manifest_path(output_path):
+    return output_path + ".render.json"
+
+
+def write_render_manifest(output_path, **info):
+    with open(manifest_path(output_path), 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=2, ensure_ascii=False)
+
+
+def read_render_manifest(output_path):
+    try:
+        with open(manifest_path(output_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
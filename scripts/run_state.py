@@ -0,0 +1,195 @@
+# scripts/run_state.py
+"""
+Points de reprise par clip.
+
+Chaque clip traité suit une machine à états persistée dans data/state/
+(un fichier JSON par clip, réécrit atomiquement à chaque étape) :
+
+    fetched → downloaded → classified → rendered → uploaded
+
+Pour chaque étape sont enregistrés le hash des entrées qui l'ont produite
+et, le cas échéant, l'artefact produit (chemin, taille, SHA-256 du contenu).
+Si une exécution est interrompue (job GitHub Actions tué en plein rendu ou
+en plein upload), l'exécution suivante reprend chaque clip après sa dernière
+étape terminée : une étape n'est refaite que si ses entrées ont changé ou si
+son artefact a disparu ou a été modifié.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+STATE_DIR          = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'state'))
+STATE_TTL_HOURS    = int(os.getenv("STATE_TTL_HOURS", "48"))
+# Au-delà de ce nombre d'échecs, un clip n'est plus repris automatiquement
+STATE_MAX_ATTEMPTS = int(os.getenv("STATE_MAX_ATTEMPTS", "3"))
+
+STAGES = ("fetched", "downloaded", "classified", "rendered", "uploaded")
+
+_lock = threading.Lock()
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def inputs_hash(*parts):
+    """
+    Hash court et stable d'un ensemble d'entrées (valeurs sérialisables en JSON).
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def _state_path(clip_id):
+    return os.path.join(STATE_DIR, hashlib.sha256(str(clip_id).encode('utf-8')).hexdigest()[:16] + ".json")
+
+
+class ClipState:
+    def __init__(self, clip_id, data=None):
+        self.clip_id = clip_id
+        self.data = data or {"twitch_clip_id": clip_id, "stage": None, "stages": {}, "attempts": 0}
+
+    @property
+    def path(self):
+        return _state_path(self.clip_id)
+
+    @property
+    def stage(self):
+        return self.data.get("stage")
+
+    @property
+    def clip(self):
+        return self.data.get("clip")
+
+    def reached(self, stage):
+        return self.stage is not None and STAGES.index(self.stage) >= STAGES.index(stage)
+
+    def resume(self, stage, inputs=None):
+        """
+        Enregistrement de l'étape si elle est terminée avec les mêmes entrées et
+        que son artefact est intact, sinon None (l'étape est à refaire).
+        """
+        record = self.data["stages"].get(stage)
+        if not record or not self.reached(stage):
+            return None
+        if inputs is not None and record.get("inputs") != inputs:
+            return None
+        artifact = record.get("artifact")
+        if artifact:
+            path = artifact["path"]
+            if (not os.path.exists(path) or os.path.getsize(path) != artifact["size"]
+                    or file_sha256(path) != artifact["sha256"]):
+                print(f"⚠️ Artefact de l'étape {stage} absent ou modifié pour {self.clip_id} : étape refaite.")
+                return None
+        print(f"↩️ Reprise : étape {stage} déjà faite pour {self.clip_id}.")
+        return record
+
+    def advance(self, stage, inputs=None, artifact=None, **values):
+        """
+        Marque l'étape comme terminée. Les étapes suivantes, calculées à partir
+        d'entrées qui viennent de changer, sont oubliées.
+        """
+        index = STAGES.index(stage)
+        stages = {name: rec for name, rec in self.data["stages"].items() if STAGES.index(name) < index}
+        record = {"inputs": inputs, "completed_at": time.time(), **values}
+        if artifact:
+            record["artifact"] = {"path": os.path.abspath(artifact), "size": os.path.getsize(artifact),
+                                  "sha256": file_sha256(artifact)}
+        stages[stage] = record
+        self.data.update(stage=stage, stages=stages, error=None)
+        self.save()
+        return record
+
+    def fail(self, reason, final=False):
+        """
+        Enregistre un échec. final=True : le clip ne sera plus repris (doublon, rejet).
+        """
+        self.data["attempts"] = self.data.get("attempts", 0) + 1
+        self.data["error"] = reason
+        if final:
+            self.data["closed"] = True
+        self.save()
+
+    def save(self):
+        self.data["updated_at"] = time.time()
+        with _lock:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, indent=2, ensure_ascii=False, default=str)
+            os.replace(tmp_path, self.path)
+
+
+def load_state(clip_id):
+    try:
+        with open(_state_path(clip_id), 'r', encoding='utf-8') as f:
+            return ClipState(clip_id, json.load(f))
+    except (OSError, ValueError):
+        return ClipState(clip_id)
+
+
+def start_clip(clip):
+    """
+    État du clip, repris s'il existe, sinon créé à l'étape 'fetched'.
+    Les métadonnées du clip sont conservées pour la reprise.
+    """
+    state = load_state(clip['id'])
+    state.data["clip"] = clip
+    if state.stage is None:
+        state.advance("fetched", inputs=inputs_hash(clip.get("url"), clip.get("title")))
+    else:
+        state.save()
+    return state
+
+
+def _iter_states():
+    try:
+        names = [n for n in os.listdir(STATE_DIR) if n.endswith(".json")]
+    except FileNotFoundError:
+        return
+    for name in names:
+        path = os.path.join(STATE_DIR, name)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        yield path, ClipState(data.get("twitch_clip_id"), data)
+
+
+def pending_clips(exclude_ids=()):
+    """
+    Clips interrompus lors d'une exécution précédente (ni publiés, ni abandonnés),
+    les plus avancés d'abord. Les états expirés sont supprimés au passage.
+    """
+    exclude_ids = set(exclude_ids)
+    now = time.time()
+    pending = []
+    for path, state in _iter_states():
+        if now - state.data.get("updated_at", 0) > STATE_TTL_HOURS * 3600:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        if (state.clip_id in exclude_ids or state.stage == "uploaded" or state.data.get("closed")
+                or state.data.get("attempts", 0) >= STATE_MAX_ATTEMPTS or not state.clip):
+            continue
+        pending.append(state)
+    pending.sort(key=lambda s: STAGES.index(s.stage), reverse=True)
+    return [s.clip for s in pending]
+
+
+def uploaded_states():
+    """
+    (clip_id, video_id) des clips dont l'upload est enregistré ici.
+    """
+    for _, state in _iter_states():
+        if state.stage == "uploaded":
+            yield state.clip_id, state.data["stages"]["uploaded"].get("video_id")
@@ -0,0 +1,163 @@
+# scripts/smart_crop.py
+"""
+Recadrage intelligent d'une source 16:9 vers une fenêtre verticale.
+
+Au lieu de garder le centre de l'image, la fenêtre suit le contenu :
+  1. une seule passe ffmpeg produit des images basse résolution en niveaux
+     de gris (ANALYSIS_WIDTH pixels de large, ANALYSIS_FPS images/s) ;
+  2. pour chaque image, l'énergie par colonne combine le mouvement
+     (différence avec l'image précédente) et la saillance (gradient),
+     le tout vectorisé avec NumPy ;
+  3. la meilleure position de la fenêtre est cherchée par somme glissante,
+     puis la trajectoire est lissée (moyenne gaussienne) et sa vitesse bornée.
+
+La trajectoire est rendue sous forme d'expression ffmpeg pour le filtre crop :
+les images pleine résolution ne sont traitées que dans ffmpeg, au décodage
+du rendu, et ne transitent jamais par Python.
+"""
+import os
+import subprocess
+
+import numpy as np
+from moviepy.config import get_setting
+
+from ffmpeg_render import probe
+
+SMART_CROP = os.getenv("SMART_CROP", "1") == "1"
+
+ANALYSIS_WIDTH = 192
+ANALYSIS_FPS   = 5
+# Poids de la saillance statique (gradient) par rapport au mouvement
+SALIENCY_WEIGHT = 0.25
+# Lissage de la trajectoire (écart-type en secondes) et vitesse maximale (largeurs de source par seconde)
+SMOOTHING_SECONDS = 1.0
+MAX_PAN_SPEED = 0.25
+# Intervalle entre deux points de la trajectoire transmise à ffmpeg
+KEYFRAME_INTERVAL = 0.5
+# Image « plate » (sans contenu notable) : énergie moyenne par pixel de la fenêtre sous ce seuil
+# (en niveaux de gris, 0-255) ; la fenêtre garde alors sa position précédente
+FLAT_ENERGY_PER_PIXEL = 0.05
+
+
+def _iter_lowres_frames(path, width, height, duration, start=0.0):
+    cmd = [get_setting("FFMPEG_BINARY"), "-loglevel", "error",
+           "-ss", f"{start:.3f}", "-t", f"{duration:.3f}", "-i", path, "-an",
+           "-vf", f"fps={ANALYSIS_FPS},scale={width}:{height}:flags=area,format=gray",
+           "-f", "rawvideo", "-"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    frame_size = width * height
+    try:
+        while True:
+            raw = proc.stdout.read(frame_size)
+            if len(raw) < frame_size:
+                break
+            yield np.frombuffer(raw, dtype=np.uint8).reshape(height, width)
+    finally:
+        proc.stdout.close()
+        proc.wait()
+
+
+def column_energy(path, duration, start=0.0):
+    """
+    Énergie (mouvement + saillance) par colonne basse résolution, moyennée sur la hauteur
+    (énergie par pixel) : tableau (n_images, ANALYSIS_WIDTH).
+    """
+    src_w, src_h, _, _ = probe(path)
+    width = ANALYSIS_WIDTH
+    height = max(2, int(round(src_h * width / src_w / 2)) * 2)
+    rows = []
+    previous = None
+    for frame in _iter_lowres_frames(path, width, height, duration, start):
+        f = frame.astype(np.float32)
+        saliency = np.zeros(width, dtype=np.float32)
+        saliency[1:] = np.abs(np.diff(f, axis=1)).sum(axis=0)
+        motion = np.abs(f - previous).sum(axis=0) if previous is not None else np.zeros(width, dtype=np.float32)
+        rows.append((motion + SALIENCY_WEIGHT * saliency) / height)
+        previous = f
+    if not rows:
+        return np.zeros((0, width), dtype=np.float32)
+    return np.stack(rows)
+
+
+def _gaussian_smooth(values, sigma):
+    if sigma <= 0 or len(values) < 3:
+        return values
+    radius = int(3 * sigma)
+    kernel = np.exp(-0.5 * (np.arange(-radius, radius + 1) / sigma) ** 2)
+    kernel /= kernel.sum()
+    padded = np.pad(values, radius, mode='edge')
+    return np.convolve(padded, kernel, mode='valid')
+
+
+def pan_path(path, window_width, duration, start=0.0):
+    """
+    Trajectoire de la fenêtre de largeur `window_width` (pixels source) :
+    retourne (instants en secondes, bord gauche de la fenêtre en pixels source).
+    """
+    src_w, _, _, _ = probe(path)
+    max_left = max(0, src_w - window_width)
+    energy = column_energy(path, duration, start)
+    if len(energy) == 0 or max_left == 0:
+        return np.array([0.0]), np.array([max_left / 2])
+
+    # Somme glissante de l'énergie sur la largeur de la fenêtre (basse résolution)
+    low_w = energy.shape[1]
+    win = max(1, int(round(window_width * low_w / src_w)))
+    cumulative = np.concatenate([np.zeros((len(energy), 1), dtype=np.float32), np.cumsum(energy, axis=1)], axis=1)
+    window_energy = cumulative[:, win:] - cumulative[:, :-win]
+    best = window_energy.argmax(axis=1).astype(np.float32)
+
+    # Images sans contenu notable : on garde la position précédente (centre au départ)
+    flat = window_energy.max(axis=1) < FLAT_ENERGY_PER_PIXEL * win
+    center = (low_w - win) / 2
+    for i in range(len(best)):
+        if flat[i]:
+            best[i] = best[i - 1] if i else center
+
+    lefts = best * src_w / low_w
+    lefts = _gaussian_smooth(lefts, SMOOTHING_SECONDS * ANALYSIS_FPS)
+
+    # Vitesse bornée, puis bornes de l'image
+    max_step = MAX_PAN_SPEED * src_w / ANALYSIS_FPS
+    for i in range(1, len(lefts)):
+        lefts[i] = lefts[i - 1] + np.clip(lefts[i] - lefts[i - 1], -max_step, max_step)
+    lefts = np.clip(lefts, 0, max_left)
+    times = np.arange(len(lefts)) / ANALYSIS_FPS
+    return times, lefts
+
+
+def pan_expression(times, lefts, interval=KEYFRAME_INTERVAL):
+    """
+    Expression ffmpeg (variable t) interpolant linéairement la trajectoire :
+    x0 + somme des pentes * clip(t - ti, 0, dt), sans imbrication.
+    """
+    if len(times) < 2:
+        return f"{float(lefts[0]):.1f}"
+    key_t = np.arange(0.0, times[-1] + 1e-6, interval)
+    if key_t[-1] < times[-1]:
+        key_t = np.append(key_t, times[-1])
+    key_x = np.interp(key_t, times, lefts)
+    terms = [f"{key_x[0]:.1f}"]
+    for (t0, x0), (t1, x1) in zip(zip(key_t, key_x), zip(key_t[1:], key_x[1:])):
+        slope = (x1 - x0) / (t1 - t0)
+        if abs(slope) >= 0.05:
+            terms.append(f"{slope:+.3f}*clip(t-{t0:.2f},0,{t1 - t0:.2f})")
+    return "+".join(terms).replace("+-", "-").replace("++", "+")
+
+
+def pan_region(path, window_width, size, pos, duration, start=0.0):
+    """
+    Zone de mise en page (format de gameplay_layout) dont la fenêtre source, de
+    largeur `window_width` et de toute la hauteur, suit la trajectoire calculée.
+    """
+    src_w, src_h, _, _ = probe(path)
+    window_width = min(src_w, int(window_width) // 2 * 2)
+    times, lefts = pan_path(path, window_width, duration, start)
+    print(f"🎯 Recadrage intelligent : fenêtre de {window_width}px, "
+          f"bord gauche entre {lefts.min():.0f} et {lefts.max():.0f}px.")
+    return {
+        'crop': (0, 0, window_width, src_h),
+        'crop_x': pan_expression(times, lefts),
+        'size': size,
+        'pos': pos,
+    }
@@ -0,0 +1,142 @@
+# scripts/source_reader.py
+"""
+Lecture de la source directement aux tailles de la mise en page.
+
+VideoFileClip décode chaque image à la résolution source vers NumPy, puis
+MoviePy recadre et redimensionne chaque zone en Python. Ici, un seul
+processus ffmpeg fait tout le travail au décodage :
+  - coupe (-ss / -t) au niveau du démuxeur ;
+  - fps de sortie, recadrage, redimensionnement et découpe de la partie
+    visible de chaque zone dans le graphe de filtres ;
+  - zones empilées (pad + vstack) dans une seule image brute RGB.
+Chaque image est lue dans un tampon préalloué réutilisé ; les zones en sont
+des vues NumPy, sans copie. Les clips retournés par region_clips() sont des
+calques dynamiques ordinaires pour compositor.composite.
+"""
+import subprocess
+import time
+
+import numpy as np
+from moviepy.config import get_setting
+from moviepy.editor import VideoClip
+
+from encode_profiles import OUTPUT_FPS
+from ffmpeg_render import crop_filter, visible_part
+
+
+class SourceReader:
+    def __init__(self, path, regions, canvas_size, duration, start=0.0, fps=OUTPUT_FPS):
+        """
+        regions : zones {'crop': (x1, y1, x2, y2), 'size': (w, h), 'pos': (x, y)}
+                  (même format que process_video_gameplay.gameplay_layout).
+        Les zones entièrement hors champ sont ignorées.
+        """
+        self.path = path
+        self.duration = duration
+        self.start = start
+        self.fps = fps
+
+        self.layers = []
+        for region in regions:
+            visible = visible_part(region['pos'], region['size'], canvas_size)
+            if visible:
+                self.layers.append((region, visible))
+
+        width = max((v[0] for _, v in self.layers), default=1)
+        height = sum(v[1] for _, v in self.layers) or 1
+        self.buffer = np.zeros((height, width, 3), dtype=np.uint8)
+        self._raw = memoryview(self.buffer).cast('B')
+        self.views = []
+        y = 0
+        for _, (cw, ch, _, _, _, _) in self.layers:
+            self.views.append(self.buffer[y:y + ch, :cw])
+            y += ch
+
+        self.frame_count = max(1, int(round(duration * fps)))
+        self._proc = None
+        self._index = -1
+        # Temps passé à attendre le décodeur (relances comprises), pour les mesures par étape
+        self.decode_seconds = 0.0
+
+    def _filter_graph(self, offset=0.0):
+        width = self.buffer.shape[1]
+        n = len(self.layers)
+        # Horodatage recalé sur le temps du clip : les fenêtres mobiles (crop_x en fonction
+        # de t) restent correctes après une relance de ffmpeg au milieu du clip
+        head = f"[0:v]setpts=PTS-STARTPTS+{offset:.3f}/TB,fps={self.fps:g}"
+        filters = [f"{head},split={n}" + "".join(f"[s{i}]" for i in range(n)) if n > 1 else f"{head}[s0]"]
+        for i, (region, (cw, ch, cx, cy, _, _)) in enumerate(self.layers):
+            w, h = region['size']
+            filters.append(f"[s{i}]{crop_filter(region, self.start)},scale={w}:{h},"
+                           f"crop={cw}:{ch}:{cx}:{cy},pad={width}:{ch}:0:0[r{i}]")
+        if n > 1:
+            filters.append("".join(f"[r{i}]" for i in range(n)) + f"vstack=inputs={n}[out]")
+        else:
+            filters.append("[r0]null[out]")
+        return ";".join(filters)
+
+    def _open(self, index):
+        self.close()
+        offset = index / self.fps
+        cmd = [get_setting("FFMPEG_BINARY"), "-loglevel", "error",
+               "-ss", f"{self.start + offset:.3f}", "-t", f"{max(0.0, self.duration - offset):.3f}",
+               "-i", self.path, "-an", "-filter_complex", self._filter_graph(offset), "-map", "[out]",
+               "-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
+        self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                      bufsize=self.buffer.nbytes)
+        self._index = index - 1
+
+    def _read_next(self):
+        """
+        Lit l'image suivante dans le tampon ; en fin de flux, la dernière image est conservée.
+        """
+        filled = 0
+        while filled < len(self._raw):
+            n = self._proc.stdout.readinto(self._raw[filled:])
+            if not n:
+                return False
+            filled += n
+        self._index += 1
+        return True
+
+    def seek(self, index):
+        """
+        Place le tampon sur l'image `index` : lecture vers l'avant, ou relance de
+        ffmpeg au bon instant si l'on recule (ou si l'on saute loin devant).
+        """
+        index = min(max(0, index), self.frame_count - 1)
+        if index == self._index:
+            return
+        start = time.perf_counter()
+        if self._proc is None or index < self._index or index - self._index > 2 * self.fps:
+            self._open(index)
+        while self._index < index:
+            if not self._read_next():
+                break
+        self.decode_seconds += time.perf_counter() - start
+
+    def get_frames(self, t):
+        """
+        Vues (h, w, 3) de chaque zone pour l'instant t (valides jusqu'à l'appel suivant).
+        """
+        self.seek(int(t * self.fps + 1e-6))
+        return self.views
+
+    def region_clips(self):
+        """
+        Un VideoClip positionné par zone visible, dans l'ordre des zones.
+        Toutes les zones partagent le même décodage.
+        """
+        clips = []
+        for i, (_, (_, _, _, _, ox, oy)) in enumerate(self.layers):
+            make_frame = (lambda i: lambda t: self.get_frames(t)[i])(i)
+            clips.append(VideoClip(make_frame, duration=self.duration).set_position((ox, oy)))
+        return clips
+
+    def close(self):
+        if self._proc is not None:
+            self._proc.stdout.close()
+            self._proc.terminate()
+            self._proc.wait()
+            self._proc = None
+            self._index = -1
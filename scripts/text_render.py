@@ -0,0 +1,151 @@
+# scripts/text_render.py
+"""
+Rastérisation des textes (titre, nom du streamer) avec Pillow.
+
+Remplace TextClip de MoviePy, qui lance ImageMagick à chaque texte.
+Les polices Roboto du dossier assets sont utilisées directement ; le rendu
+(retour à la ligne, contour) produit une image RGBA statique, mise en cache
+en mémoire (LRU) et sur disque sous data/cache/text/.
+"""
+import hashlib
+import math
+import os
+import tempfile
+from functools import lru_cache
+
+import numpy as np
+from moviepy.editor import ImageClip
+from PIL import Image, ImageDraw, ImageFont
+
+from assets_cache import ASSETS_DIR, asset_hash
+
+TEXT_CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'cache', 'text'))
+FALLBACK_FONT  = "DejaVuSans.ttf"
+LINE_SPACING   = 1.1  # hauteur de ligne relative à la taille de police
+
+
+def font_path(font):
+    """
+    Résout un nom de police ('Roboto-Bold.ttf') en chemin dans assets/, sinon le retourne tel quel.
+    """
+    candidate = os.path.join(ASSETS_DIR, font)
+    return candidate if os.path.exists(candidate) else font
+
+
+@lru_cache(maxsize=16)
+def _load_font(font, size):
+    try:
+        return ImageFont.truetype(font_path(font), size)
+    except OSError:
+        print(f"⚠️ Police '{font}' introuvable, utilisation de {FALLBACK_FONT}.")
+        try:
+            return ImageFont.truetype(FALLBACK_FONT, size)
+        except OSError:
+            return ImageFont.load_default()
+
+
+def _wrap(draw, text, font, stroke, max_width):
+    """
+    Découpe le texte en lignes ne dépassant pas max_width pixels (mode 'caption').
+    """
+    lines = []
+    for paragraph in text.split("\n"):
+        current = ""
+        for word in paragraph.split():
+            trial = f"{current} {word}".strip()
+            if current and draw.textlength(trial, font=font) + 2 * stroke > max_width:
+                lines.append(current)
+                current = word
+            else:
+                current = trial
+        lines.append(current)
+    return lines
+
+
+def _rasterize(text, font, size, stroke_width, width, color, stroke_color):
+    pil_font = _load_font(font, size)
+    stroke = int(math.ceil(stroke_width)) if stroke_width else 0
+    scratch = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+
+    lines = _wrap(scratch, text, pil_font, stroke, width) if width else text.split("\n")
+    boxes = [scratch.textbbox((0, 0), line, font=pil_font, stroke_width=stroke) for line in lines]
+    ascent, descent = pil_font.getmetrics()
+    line_height = max(int(size * LINE_SPACING), ascent + descent) + 2 * stroke
+
+    img_w = int(width) if width else max(b[2] - b[0] for b in boxes)
+    img_h = line_height * len(lines)
+    img = Image.new('RGBA', (max(1, img_w), max(1, img_h)), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for i, (line, box) in enumerate(zip(lines, boxes)):
+        # Lignes centrées, comme le mode 'caption' d'ImageMagick
+        x = (img_w - (box[2] - box[0])) // 2 - box[0]
+        draw.text((x, i * line_height + stroke), line, font=pil_font, fill=color,
+                  stroke_width=stroke, stroke_fill=stroke_color)
+    return img
+
+
+def text_png(text, font, size, stroke_width=0, width=None, color='white', stroke_color='black'):
+    """
+    Retourne le chemin d'un PNG RGBA du texte, rendu une seule fois puis servi depuis le cache disque.
+    """
+    return _text_png(text, font, size, float(stroke_width), int(width) if width else None, color, stroke_color)
+
+
+@lru_cache(maxsize=256)
+def _text_png_path(text, font, size, stroke_width, width, color, stroke_color):
+    resolved = font_path(font)
+    font_version = asset_hash(resolved) if os.path.exists(resolved) else font
+    key = repr((text, font_version, size, stroke_width, width, color, stroke_color))
+    return os.path.join(TEXT_CACHE_DIR, hashlib.sha256(key.encode('utf-8')).hexdigest()[:24] + ".png")
+
+
+def _text_png(text, font, size, stroke_width, width, color, stroke_color):
+    # Seul le chemin est mis en cache mémoire : le PNG a pu être supprimé du disque
+    # depuis (purge de data/cache), il est alors rastérisé de nouveau
+    path = _text_png_path(text, font, size, stroke_width, width, color, stroke_color)
+    if not os.path.exists(path):
+        os.makedirs(TEXT_CACHE_DIR, exist_ok=True)
+        # Fichier temporaire propre à chaque appel : plusieurs threads (pipeline) ou processus
+        # (rendu par segments) peuvent rastériser le même texte en même temps
+        with tempfile.NamedTemporaryFile(dir=TEXT_CACHE_DIR, suffix=".tmp.png", delete=False) as tmp:
+            tmp_path = tmp.name
+        try:
+            _rasterize(text, font, size, stroke_width, width, color, stroke_color).save(tmp_path, format="PNG")
+            # Rendu identique déjà publié par un autre : le remplacement reste sans effet visible
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return path
+
+
+@lru_cache(maxsize=64)
+def _text_arrays(path):
+    rgba = np.array(Image.open(path).convert('RGBA'))
+    rgb, alpha = rgba[:, :, :3], rgba[:, :, 3] / 255.0
+    rgb.flags.writeable = False
+    alpha.flags.writeable = False
+    return rgb, alpha
+
+
+def text_image(text, font, size, stroke_width=0, width=None, color='white', stroke_color='black'):
+    """
+    Retourne (rgb, alpha) en tableaux NumPy : uint8 (h, w, 3) et float (h, w) dans [0, 1].
+    Les tableaux sont partagés via le cache : ne pas les modifier.
+    """
+    return _text_arrays(text_png(text, font, size, stroke_width, width, color, stroke_color))
+
+
+def png_clip(path):
+    """
+    ImageClip RGB avec masque alpha d'un PNG de texte déjà rastérisé (voir text_png).
+    """
+    rgb, alpha = _text_arrays(path)
+    return ImageClip(rgb).set_mask(ImageClip(alpha, ismask=True))
+
+
+def text_clip(text, font, size, stroke_width=0, width=None, color='white', stroke_color='black'):
+    """
+    Équivalent statique de TextClip : ImageClip RGB avec le masque alpha du texte.
+    """
+    return png_clip(text_png(text, font, size, stroke_width, width, color, stroke_color))
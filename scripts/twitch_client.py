@@ -0,0 +1,209 @@
+# scripts/twitch_client.py
+"""
+Client Twitch partagé : tous les appels Helix de scripts/ passent par ici.
+
+- une seule requests.Session (connexions keep-alive réutilisées) ;
+- jeton d'application mis en cache avec son expiration, en mémoire et, hors CI,
+  sur disque en dehors de data/ (fichier lisible par l'utilisateur seulement :
+  un secret n'a pas sa place dans les données de l'exécution, que le workflow
+  peut conserver d'une exécution à l'autre) ;
+- respect des en-têtes Ratelimit-Remaining / Ratelimit-Reset de Helix
+  (attente avant épuisement du quota, puis nouvelle tentative sur 429).
+
+Les URL sont configurables (TWITCH_AUTH_URL, TWITCH_API_BASE) pour pouvoir
+pointer le client vers un serveur HTTP local de test.
+"""
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import instrumentation
+
+TWITCH_AUTH_URL = os.getenv("TWITCH_AUTH_URL", "https://id.twitch.tv/oauth2/token")
+TWITCH_API_BASE = os.getenv("TWITCH_API_BASE", "https://api.twitch.tv/helix")
+
+# Jeton en mémoire seulement en CI ; TWITCH_TOKEN_CACHE_FILE="" le désactive aussi en local
+_DEFAULT_TOKEN_CACHE = "" if os.getenv("CI") else os.path.join(os.path.expanduser("~"), '.cache', 'autocliptest',
+                                                               'twitch_token.json')
+TOKEN_CACHE_FILE = os.getenv("TWITCH_TOKEN_CACHE_FILE", _DEFAULT_TOKEN_CACHE) or None
+
+# Marge avant expiration à partir de laquelle le jeton est renouvelé
+TOKEN_EXPIRY_MARGIN_SECONDS = 300
+# En dessous de ce nombre de points restants, on attend la réinitialisation du quota
+RATELIMIT_MIN_REMAINING = 2
+MAX_RETRIES = 3
+POOL_SIZE = 8
+
+
+class TwitchAPIError(Exception):
+    pass
+
+
+def is_transient_error(exc):
+    """
+    True si l'échec est passager (réseau, 5xx ou 429 après épuisement des nouvelles
+    tentatives) ; False pour une erreur qui se reproduira (authentification, requête invalide).
+    """
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return False
+
+
+class TwitchClient:
+    def __init__(self, client_id, client_secret, auth_url=None, api_base=None,
+                 token_cache_file=TOKEN_CACHE_FILE, session=None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.auth_url = auth_url or TWITCH_AUTH_URL
+        self.api_base = (api_base or TWITCH_API_BASE).rstrip('/')
+        self.token_cache_file = token_cache_file
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+
+        self._token_lock = threading.Lock()
+        self._token = None
+        self._token_expires_at = 0.0
+
+        self._ratelimit_lock = threading.Lock()
+        self._ratelimit_remaining = None
+        self._ratelimit_reset = 0.0
+
+    # --------------------------------------------------------------
+    # Jeton d'application
+    # --------------------------------------------------------------
+    def _token_valid(self):
+        return self._token and time.time() < self._token_expires_at - TOKEN_EXPIRY_MARGIN_SECONDS
+
+    def _load_cached_token(self):
+        if not self.token_cache_file:
+            return
+        try:
+            with open(self.token_cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("client_id") == self.client_id:
+            self._token = data.get("access_token")
+            self._token_expires_at = float(data.get("expires_at", 0))
+
+    def _save_cached_token(self):
+        if not self.token_cache_file:
+            return
+        os.makedirs(os.path.dirname(self.token_cache_file), exist_ok=True)
+        tmp_path = self.token_cache_file + ".tmp"
+        # Lisible par l'utilisateur seulement : c'est un secret
+        with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as f:
+            json.dump({"client_id": self.client_id, "access_token": self._token,
+                       "expires_at": self._token_expires_at}, f)
+        os.replace(tmp_path, self.token_cache_file)
+
+    def get_token(self, force_refresh=False):
+        """
+        Jeton d'application valide : mémoire, puis cache disque, puis nouvelle requête OAuth.
+        """
+        with self._token_lock:
+            if not force_refresh:
+                if self._token_valid():
+                    return self._token
+                self._load_cached_token()
+                if self._token_valid():
+                    return self._token
+
+            print("🔑 Récupération du jeton d'accès Twitch...")
+            resp = self.session.post(self.auth_url, data={
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "grant_type": "client_credentials"
+            })
+            resp.raise_for_status()
+            payload = resp.json()
+            self._token = payload["access_token"]
+            self._token_expires_at = time.time() + float(payload.get("expires_in", 3600))
+            self._save_cached_token()
+            print("✅ Jeton d'accès Twitch récupéré.")
+            return self._token
+
+    # --------------------------------------------------------------
+    # Limitation de débit Helix
+    # --------------------------------------------------------------
+    def _wait_for_ratelimit(self):
+        with self._ratelimit_lock:
+            remaining, reset = self._ratelimit_remaining, self._ratelimit_reset
+        if remaining is not None and remaining < RATELIMIT_MIN_REMAINING:
+            delay = reset - time.time()
+            if delay > 0:
+                print(f"⏳ Limite Helix presque atteinte, pause de {delay:.1f}s.")
+                time.sleep(delay)
+
+    def _record_ratelimit(self, resp):
+        remaining = resp.headers.get("Ratelimit-Remaining")
+        reset = resp.headers.get("Ratelimit-Reset")
+        if remaining is None or reset is None:
+            return
+        with self._ratelimit_lock:
+            self._ratelimit_remaining = int(remaining)
+            self._ratelimit_reset = float(reset)
+
+    # --------------------------------------------------------------
+    # Requêtes Helix
+    # --------------------------------------------------------------
+    def helix_get(self, endpoint, params=None):
+        """
+        GET sur /helix/<endpoint> ; retourne le JSON décodé.
+        params peut être un dict ou une liste de paires (pour répéter 'id').
+        """
+        url = f"{self.api_base}/{endpoint.lstrip('/')}"
+        token_refreshed = False
+        for attempt in range(MAX_RETRIES + 1):
+            self._wait_for_ratelimit()
+            headers = {
+                "Client-ID": self.client_id,
+                "Authorization": f"Bearer {self.get_token()}"
+            }
+            resp = self.session.get(url, headers=headers, params=params)
+            self._record_ratelimit(resp)
+            instrumentation.add(bytes_in=len(resp.content), requests=1)
+
+            if resp.status_code == 401 and not token_refreshed:
+                # Jeton révoqué ou expiré côté Twitch : on en redemande un
+                token_refreshed = True
+                self.get_token(force_refresh=True)
+                continue
+            if resp.status_code == 429 and attempt < MAX_RETRIES:
+                reset = resp.headers.get("Ratelimit-Reset")
+                delay = max(0.0, float(reset) - time.time()) if reset else 2 ** attempt
+                print(f"⏳ Helix 429 (trop de requêtes), nouvelle tentative dans {delay:.1f}s.")
+                time.sleep(delay)
+                continue
+            if resp.status_code >= 500 and attempt < MAX_RETRIES:
+                time.sleep(2 ** attempt)
+                continue
+            resp.raise_for_status()
+            return resp.json()
+        raise TwitchAPIError(f"Échec de la requête Helix {endpoint} après {MAX_RETRIES + 1} tentatives.")
+
+
+_client_lock = threading.Lock()
+_client = None
+
+
+def get_client():
+    """
+    Client partagé du processus (créé à la première utilisation).
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = TwitchClient(os.getenv("TWITCH_CLIENT_ID"), os.getenv("TWITCH_CLIENT_SECRET"))
+        return _client
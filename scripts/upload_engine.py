@@ -0,0 +1,247 @@
+# scripts/upload_engine.py
+"""
+Upload YouTube par le protocole d'upload reprenable, par blocs.
+
+MediaFileUpload envoyait le fichier avec la taille de bloc par défaut, sans
+nouvelle tentative : la moindre erreur réseau ou 5xx faisait perdre tout
+l'upload. Ici :
+  - la session d'upload (URI renvoyée par YouTube) est enregistrée sur disque
+    (data/state/uploads/) dès sa création ;
+  - le fichier est envoyé par blocs de UPLOAD_CHUNK_MB Mo (multiple de 256 Kio) ;
+  - sur erreur réseau, 429, 5xx ou bloc non acquitté, on attend (backoff
+    exponentiel avec gigue), on demande au serveur le dernier octet reçu, puis
+    on reprend à partir de là ;
+  - une session enregistrée par une exécution précédente est reprise au dernier
+    octet acquitté au lieu de renvoyer tout le fichier.
+
+L'URL de base est injectable (YOUTUBE_UPLOAD_BASE_URL ou paramètre base_url),
+ce qui permet de tester le moteur contre un faux serveur local.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import time
+
+import requests
+
+import instrumentation
+
+UPLOAD_BASE_URL     = os.getenv("YOUTUBE_UPLOAD_BASE_URL", "https://www.googleapis.com")
+UPLOAD_CHUNK_MB     = float(os.getenv("UPLOAD_CHUNK_MB", "8"))
+UPLOAD_MAX_RETRIES  = int(os.getenv("UPLOAD_MAX_RETRIES", "8"))
+UPLOAD_BACKOFF_BASE = 1.0   # secondes
+UPLOAD_BACKOFF_MAX  = 64.0  # secondes
+UPLOAD_TIMEOUT      = 120   # secondes par requête
+UPLOAD_SESSIONS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'state', 'uploads'))
+# Une session d'upload YouTube expire au bout d'une semaine environ
+UPLOAD_SESSION_TTL_SECONDS = 6 * 24 * 3600
+
+CHUNK_GRANULARITY = 256 * 1024
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+PROGRESS_STEP_PERCENT = 25
+
+
+class UploadError(Exception):
+    """Échec définitif de l'upload (erreur non récupérable ou nouvelles tentatives épuisées)."""
+
+
+class _SessionExpired(Exception):
+    pass
+
+
+def chunk_size_bytes(chunk_mb=UPLOAD_CHUNK_MB):
+    """
+    Taille de bloc en octets, arrondie au multiple de 256 Kio imposé par le protocole.
+    """
+    return max(1, int(chunk_mb * 1024 * 1024) // CHUNK_GRANULARITY) * CHUNK_GRANULARITY
+
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _error_message(resp):
+    try:
+        error = resp.json().get("error", {})
+        reasons = ", ".join(e.get("reason", "?") for e in error.get("errors", []))
+        return f"HTTP {resp.status_code} : {error.get('message', resp.text[:200])} ({reasons or 'sans raison'})"
+    except ValueError:
+        return f"HTTP {resp.status_code} : {resp.text[:200]}"
+
+
+class ResumableUploadEngine:
+    def __init__(self, session, base_url=UPLOAD_BASE_URL, chunk_size=None, max_retries=UPLOAD_MAX_RETRIES,
+                 sessions_dir=UPLOAD_SESSIONS_DIR):
+        """
+        session : objet compatible requests.Session, déjà authentifié
+                  (google.auth.transport.requests.AuthorizedSession en production).
+        """
+        self.session = session
+        self.base_url = base_url.rstrip("/")
+        self.chunk_size = chunk_size or chunk_size_bytes()
+        self.max_retries = max_retries
+        self.sessions_dir = sessions_dir
+
+    # --------------------------------------------------------------
+    # Sessions persistées
+    # --------------------------------------------------------------
+    def _session_file(self, key):
+        return os.path.join(self.sessions_dir, key + ".json")
+
+    def _load_session(self, key):
+        try:
+            with open(self._session_file(key), 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - saved.get("created_at", 0) > UPLOAD_SESSION_TTL_SECONDS:
+            self._forget_session(key)
+            return None
+        return saved.get("session_uri")
+
+    def _save_session(self, key, session_uri, video_path):
+        os.makedirs(self.sessions_dir, exist_ok=True)
+        tmp_path = self._session_file(key) + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"session_uri": session_uri, "video_path": video_path, "created_at": time.time()}, f)
+        os.replace(tmp_path, self._session_file(key))
+
+    def _forget_session(self, key):
+        try:
+            os.remove(self._session_file(key))
+        except OSError:
+            pass
+
+    # --------------------------------------------------------------
+    # Requêtes
+    # --------------------------------------------------------------
+    def _backoff(self, attempt, reason):
+        if attempt >= self.max_retries:
+            raise UploadError(f"abandon après {attempt} tentatives ({reason})")
+        delay = min(UPLOAD_BACKOFF_MAX, UPLOAD_BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+        print(f"  ⏳ Upload : {reason}, nouvelle tentative dans {delay:.1f}s ({attempt + 1}/{self.max_retries}).")
+        time.sleep(delay)
+
+    def _with_retries(self, send):
+        """
+        Exécute send() en réessayant sur erreur réseau ou statut transitoire.
+        """
+        attempt = 0
+        while True:
+            try:
+                resp = send()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._backoff(attempt, f"erreur réseau ({type(e).__name__})")
+            else:
+                if resp.status_code not in RETRYABLE_STATUSES:
+                    return resp
+                self._backoff(attempt, f"HTTP {resp.status_code}")
+            attempt += 1
+
+    def _start(self, body, size, params):
+        url = f"{self.base_url}/upload/youtube/v3/videos"
+        query = dict(params or {}, uploadType="resumable")
+        headers = {"X-Upload-Content-Type": "video/mp4", "X-Upload-Content-Length": str(size)}
+        resp = self._with_retries(lambda: self.session.post(url, params=query, json=body, headers=headers,
+                                                            timeout=UPLOAD_TIMEOUT))
+        if resp.status_code != 200 or not resp.headers.get("Location"):
+            raise UploadError(f"création de la session impossible : {_error_message(resp)}")
+        return resp.headers["Location"]
+
+    @staticmethod
+    def _parse_response(resp):
+        """
+        ('done', ressource vidéo) ou ('partial', prochain octet à envoyer).
+        """
+        if resp.status_code in (200, 201):
+            return "done", resp.json()
+        if resp.status_code == 308:
+            match = re.match(r"bytes=0-(\d+)", resp.headers.get("Range", ""))
+            return "partial", int(match.group(1)) + 1 if match else 0
+        if resp.status_code in (404, 410):
+            raise _SessionExpired()
+        raise UploadError(_error_message(resp))
+
+    def _query_offset(self, session_uri, size):
+        resp = self._with_retries(lambda: self.session.put(
+            session_uri, headers={"Content-Range": f"bytes */{size}", "Content-Length": "0"},
+            timeout=UPLOAD_TIMEOUT))
+        return self._parse_response(resp)
+
+    def _send_chunks(self, session_uri, video_path, size, state):
+        kind, value = state
+        attempt = 0
+        last_step = -1
+        with open(video_path, 'rb') as f:
+            while kind == "partial":
+                offset = value
+                step = int(100 * offset / size) // PROGRESS_STEP_PERCENT * PROGRESS_STEP_PERCENT
+                if step > last_step:
+                    last_step = step
+                    print(f"  📤 Progression de l'upload : {step}% ({offset / 1e6:.1f} / {size / 1e6:.1f} Mo)")
+                f.seek(offset)
+                data = f.read(self.chunk_size)
+                end = offset + len(data) - 1
+                try:
+                    resp = self.session.put(session_uri, data=data, timeout=UPLOAD_TIMEOUT,
+                                            headers={"Content-Range": f"bytes {offset}-{end}/{size}"})
+                    instrumentation.add(bytes_out=len(data), requests=1)
+                    if resp.status_code in RETRYABLE_STATUSES:
+                        raise requests.ConnectionError(f"HTTP {resp.status_code}")
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    # Bloc perdu ou partiellement reçu : on repart du dernier octet acquitté
+                    self._backoff(attempt, f"bloc {offset}-{end} interrompu ({e})")
+                    attempt += 1
+                    kind, value = self._query_offset(session_uri, size)
+                    continue
+                kind, value = self._parse_response(resp)
+                if kind == "partial":
+                    if value > offset:
+                        attempt = 0
+                        continue
+                    # 308 sans progression (Range absent ou inchangé) : compté comme un échec,
+                    # sinon le même bloc serait renvoyé en boucle
+                    self._backoff(attempt, f"bloc {offset}-{end} non acquitté")
+                    attempt += 1
+        return value
+
+    # --------------------------------------------------------------
+    # Entrée principale
+    # --------------------------------------------------------------
+    def upload(self, video_path, body, params=None):
+        """
+        Uploade video_path avec les métadonnées `body` (snippet, status...).
+        Retourne la ressource vidéo créée (dict). Lève UploadError en cas d'échec.
+        """
+        size = os.path.getsize(video_path)
+        if size == 0:
+            raise UploadError("fichier vide")
+        key = hashlib.sha256(json.dumps([_file_sha256(video_path), body, params], sort_keys=True)
+                             .encode('utf-8')).hexdigest()[:24]
+
+        session_uri = self._load_session(key)
+        for _ in range(2):
+            try:
+                if session_uri:
+                    state = self._query_offset(session_uri, size)
+                    if state[0] == "partial":
+                        print(f"↩️ Reprise de l'upload à {state[1] / 1e6:.1f} Mo sur {size / 1e6:.1f} Mo.")
+                else:
+                    session_uri = self._start(body, size, params)
+                    self._save_session(key, session_uri, video_path)
+                    state = ("partial", 0)
+                resource = self._send_chunks(session_uri, video_path, size, state)
+            except _SessionExpired:
+                print("⚠️ Session d'upload expirée, nouvelle session.")
+                self._forget_session(key)
+                session_uri = None
+                continue
+            self._forget_session(key)
+            return resource
+        raise UploadError("session d'upload expirée deux fois de suite")
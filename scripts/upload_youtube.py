@@ -1,16 +1,16 @@
 # scripts/upload_youtube.py
 import os
+import threading
+from datetime import datetime, timedelta, timezone
+
 import google_auth_oauthlib.flow
 import google.auth.transport.requests
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload
-import json
+from google.auth.transport.requests import AuthorizedSession
+
+from upload_engine import ResumableUploadEngine, UploadError
 
 # L'API scope nécessaire pour uploader des vidéos
 SCOPES = ['https://www.googleapis.com/auth/youtube.upload']
-API_SERVICE_NAME = 'youtube'
-API_VERSION = 'v3'
 
 # Chemin vers le fichier client_secret.json que vous avez téléchargé depuis Google Cloud Console
 # Ce fichier NE DOIT PAS ÊTRE COMMITTÉ sur GitHub.
@@ -18,11 +18,17 @@ API_VERSION = 'v3'
 CLIENT_SECRETS_FILE = 'client_secret.json' # Doit être au même niveau que le script ou un chemin défini.
 # Le fichier token.json sera créé après la première authentification réussie
 TOKEN_FILE = 'token.json'
+# Le jeton est rafraîchi s'il expire dans moins de N secondes (pas de 401 en plein upload)
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+
+def _save_credentials(credentials):
+    with open(TOKEN_FILE, 'w') as token:
+        token.write(credentials.to_json())
 
-def get_authenticated_service():
+def load_credentials():
     """
-    Authentifie l'utilisateur et retourne un objet de service YouTube.
-    Gère le flux OAuth 2.0 et stocke les jetons d'accès.
+    Charge les identifiants YouTube depuis token.json (rafraîchis si besoin),
+    ou lance le flux OAuth 2.0, puis stocke les jetons d'accès.
     """
     credentials = None
     # Charger les jetons d'accès existants s'ils sont disponibles
@@ -55,18 +61,62 @@ def get_authenticated_service():
             credentials = flow.credentials
 
         # Sauvegarder les jetons pour les exécutions futures
-        with open(TOKEN_FILE, 'w') as token:
-            token.write(credentials.to_json())
+        _save_credentials(credentials)
         print("✅ Jeton d'accès YouTube sauvegardé.")
 
-    return build(API_SERVICE_NAME, API_VERSION, credentials=credentials)
+    return credentials
 
-def upload_youtube_short(youtube_service, video_path, metadata):
+class YouTubeClient:
+    """
+    Client YouTube de l'exécution : identifiants chargés une fois, une seule
+    session HTTP (pool de connexions) partagée par tous les uploads et par les
+    rafraîchissements du jeton.
+    """
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self._lock = threading.Lock()
+        # Transport des rafraîchissements de jeton, partagé avec la session d'upload
+        self._auth_request = google.auth.transport.requests.Request()
+        self.session = AuthorizedSession(credentials, auth_request=self._auth_request)
+        self.upload_engine = ResumableUploadEngine(self.session)
+
+    def ensure_fresh_credentials(self):
+        """
+        Rafraîchit le jeton juste avant son expiration, via la session partagée.
+        """
+        with self._lock:
+            expiry = self.credentials.expiry
+            if expiry is not None and expiry.tzinfo is None:
+                # google-auth stocke l'expiration en UTC sans fuseau
+                expiry = expiry.replace(tzinfo=timezone.utc)
+            if self.credentials.valid and (expiry is None or expiry - datetime.now(timezone.utc)
+                                           > timedelta(seconds=TOKEN_REFRESH_MARGIN_SECONDS)):
+                return
+            if not self.credentials.refresh_token:
+                return
+            print("🔑 Rafraîchissement anticipé du jeton d'accès YouTube...")
+            self.credentials.refresh(self._auth_request)
+            _save_credentials(self.credentials)
+
+_client_lock = threading.Lock()
+_client = None
+
+def get_youtube_client():
+    """
+    Client YouTube partagé du processus (authentifié à la première utilisation).
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = YouTubeClient(load_credentials())
+        return _client
+
+def upload_youtube_short(youtube_client, video_path, metadata):
     """
     Uploade un fichier vidéo sur YouTube en tant que Short.
 
     Args:
-        youtube_service: L'objet de service YouTube authentifié.
+        youtube_client (YouTubeClient): Le client YouTube authentifié (get_youtube_client()).
         video_path (str): Chemin vers le fichier vidéo à uploader.
         metadata (dict): Dictionnaire contenant le titre, la description, les tags, etc.
 
@@ -110,33 +160,17 @@ def upload_youtube_short(youtube_service, video_path, metadata):
     # Le code ne vérifie pas le rapport ici, il faut s'assurer que le clip source est bien vertical
     # ou que le traitement vidéo le convertit. YouTube le détecte automatiquement comme Short.
 
-    media = MediaFileUpload(video_path, resumable=True)
-
     try:
-        request = youtube_service.videos().insert(
-            part="snippet,status",
-            body=body,
-            media_body=media
-        )
-        response = None
-        while response is None:
-            status, response = request.next_chunk()
-            if status:
-                print(f"Progression de l'upload : {int(status.resumable_progress * 100)}%")
-        
+        # Upload reprenable par blocs (voir upload_engine) sur la session partagée
+        youtube_client.ensure_fresh_credentials()
+        response = youtube_client.upload_engine.upload(video_path, body, params={"part": "snippet,status"})
         video_id = response.get('id')
         print(f"✅ Vidéo uploadée avec succès ! ID de la vidéo : {video_id}")
         print(f"Lien : https://youtu.be/{video_id}")
         return video_id
 
-    except HttpError as e:
-        error_details = json.loads(e.content.decode('utf-8'))
-        print(f"❌ Erreur lors de l'upload YouTube (HttpError) : {e}")
-        print(f"Détails de l'erreur API : {error_details}")
-        if 'error' in error_details and 'errors' in error_details['error']:
-            for err in error_details['error']['errors']:
-                print(f"  Raison: {err.get('reason')}")
-                print(f"  Message: {err.get('message')}")
+    except UploadError as e:
+        print(f"❌ Erreur lors de l'upload YouTube : {e}")
         return None
     except Exception as e:
         print(f"❌ Une erreur inattendue est survenue lors de l'upload : {e}")
@@ -148,10 +182,10 @@ if __name__ == "__main__":
     print("Pour une utilisation locale, assurez-vous que 'client_secret.json' est présent et configurez votre environnement.")
     
     # Pour le premier run local, vous devrez interagir pour l'authentification.
-    # youtube = get_authenticated_service()
+    # youtube = get_youtube_client()
     
     # if youtube:
-    #     print("Service YouTube prêt.")
+    #     print("Client YouTube prêt.")
     #     # Simulez des données de vidéo et un chemin de fichier
     #     # video_file_to_upload = os.path.join("data", "processed_clip_test.mp4") # Assurez-vous que ce fichier existe
     #     # if not os.path.exists(video_file_to_upload):
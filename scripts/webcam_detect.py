@@ -0,0 +1,329 @@
+# scripts/webcam_detect.py
+"""
+Détection automatique de la zone webcam d'un clip (CPU uniquement).
+
+Quelques images sont extraites en mémoire, en basse résolution et en niveaux
+de gris, par un seul appel ffmpeg. Le cadre d'une webcam incrustée est fixe
+alors que le jeu bouge : on ne garde que les contours présents sur presque
+toutes les images, on y cherche des segments horizontaux longs, puis les
+rectangles dont les quatre côtés sont soutenus par ces contours stables.
+Les candidats sont filtrés (surface, proportions, mouvement à l'intérieur)
+et, si OpenCV est installé, départagés par un détecteur de visages.
+
+Le résultat est mis en cache par streamer et par jeu (data/cache/layouts.json),
+en coordonnées relatives : la détection ne tourne qu'une fois, les clips
+suivants réutilisent la mise en page quelle que soit leur résolution. Une
+absence de webcam ou une détection peu sûre n'est gardée que peu de temps,
+et rien n'est mis en cache si le streamer ou le jeu du clip est inconnu.
+"""
+import json
+import os
+import subprocess
+import threading
+import time
+
+import numpy as np
+from moviepy.config import get_setting
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+from ffmpeg_render import probe
+
+LAYOUT_CACHE_FILE        = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'cache', 'layouts.json'))
+LAYOUT_CACHE_TTL_SECONDS = int(os.getenv("LAYOUT_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+# Durée de conservation d'un résultat négatif ou peu sûr (l'erreur ne dure pas un mois)
+LAYOUT_CACHE_UNSURE_TTL_SECONDS = int(os.getenv("LAYOUT_CACHE_UNSURE_TTL_SECONDS", str(24 * 3600)))
+# Score (voir scored_webcam_box) à partir duquel une détection est sûre : cadre presque
+# entièrement soutenu par des contours stables, ou visage dans la zone
+LAYOUT_CONFIDENT_SCORE = 0.97
+
+SAMPLE_FRAMES = 6
+SAMPLE_WIDTH  = 480
+# Écart de niveau de gris à partir duquel un pixel est un contour
+EDGE_THRESHOLD = 12
+# Longueur minimale d'un segment horizontal (proportion de la largeur)
+MIN_SEGMENT_RATIO = 0.08
+MAX_SEGMENTS = 40
+# Contraintes sur le rectangle webcam
+MIN_AREA_RATIO, MAX_AREA_RATIO = 0.02, 0.30
+MIN_ASPECT, MAX_ASPECT = 0.8, 2.4
+MIN_SIDE_SUPPORT = 0.6
+MIN_INSIDE_MOTION = 1.5
+
+_cache_lock = threading.Lock()
+_face_cascade = None
+
+
+# --------------------------------------------------------------
+# Échantillonnage
+# --------------------------------------------------------------
+def sample_frames(path, count=SAMPLE_FRAMES, width=SAMPLE_WIDTH):
+    """
+    `count` images réparties sur le clip, en niveaux de gris à `width` pixels de large.
+    Retourne (images (n, h, w) uint8, (largeur, hauteur) de la source).
+    """
+    src_w, src_h, duration, _ = probe(path)
+    height = max(2, int(round(src_h * width / src_w / 2)) * 2)
+    rate = count / max(duration, 0.1)
+    cmd = [get_setting("FFMPEG_BINARY"), "-loglevel", "error", "-i", path, "-an",
+           "-vf", f"fps={rate:.5f},scale={width}:{height}:flags=area,format=gray",
+           "-frames:v", str(count), "-f", "rawvideo", "-"]
+    raw = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+    n = len(raw) // (width * height)
+    frames = np.frombuffer(raw[:n * width * height], dtype=np.uint8).reshape(n, height, width)
+    return frames, (src_w, src_h)
+
+
+# --------------------------------------------------------------
+# Détection
+# --------------------------------------------------------------
+def _stable_edges(frames):
+    """
+    Contours présents sur toutes les images sauf au plus une : (contours horizontaux, verticaux).
+    """
+    f = frames.astype(np.int16)
+    gy = np.abs(np.diff(f, axis=1))
+    gx = np.abs(np.diff(f, axis=2))
+    k = 1 if len(frames) > 2 else 0
+    stable_h = np.sort(gy, axis=0)[k] > EDGE_THRESHOLD
+    stable_v = np.sort(gx, axis=0)[k] > EDGE_THRESHOLD
+    # Tolérance d'un pixel (contours légèrement flous ou en escalier)
+    stable_h[:, 1:] |= stable_h[:, :-1]
+    stable_v[1:, :] |= stable_v[:-1, :]
+    return stable_h, stable_v
+
+
+def _horizontal_segments(stable_h, min_len):
+    """
+    Segments horizontaux (y, x0, x1) de contours stables, les plus longs d'abord,
+    en fusionnant les lignes voisines qui décrivent le même trait.
+    """
+    rows, cols = stable_h.shape
+    padded = np.zeros((rows, cols + 2), dtype=np.int8)
+    padded[:, 1:-1] = stable_h
+    d = np.diff(padded, axis=1)
+    segments = []
+    for y in range(rows):
+        starts = np.flatnonzero(d[y] == 1)
+        ends = np.flatnonzero(d[y] == -1)
+        segments.extend((int(e - s), y + 1, int(s), int(e)) for s, e in zip(starts, ends) if e - s >= min_len)
+    segments.sort(reverse=True)
+
+    kept = []
+    for length, y, x0, x1 in segments:
+        if any(abs(y - ky) <= 2 and x0 < kx1 and kx0 < x1 for ky, kx0, kx1 in kept):
+            continue
+        kept.append((y, x0, x1))
+        if len(kept) >= MAX_SEGMENTS:
+            break
+    return kept
+
+
+def _side_support(edges, fixed, start, stop, axis_is_row, limit):
+    """
+    Proportion d'un côté de rectangle couverte par des contours stables
+    (1.0 si le côté est sur le bord de l'image).
+    """
+    if fixed <= 1 or fixed >= limit - 2:
+        return 1.0
+    lo, hi = max(0, fixed - 2), min(limit, fixed + 2)
+    band = edges[lo:hi, start:stop] if axis_is_row else edges[start:stop, lo:hi]
+    if band.size == 0:
+        return 0.0
+    return float(band.any(axis=0 if axis_is_row else 1).mean())
+
+
+def _face_centers(frames):
+    global _face_cascade
+    if cv2 is None:
+        return []
+    if _face_cascade is None:
+        _face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    centers = []
+    for frame in frames:
+        for (x, y, w, h) in _face_cascade.detectMultiScale(np.ascontiguousarray(frame), 1.1, 5, minSize=(16, 16)):
+            centers.append((x + w / 2, y + h / 2, w, h))
+    return centers
+
+
+def detect_webcam_box(frames):
+    """
+    Rectangle (x1, y1, x2, y2) de la webcam dans les coordonnées des images, ou None.
+    """
+    return scored_webcam_box(frames)[0]
+
+
+def scored_webcam_box(frames):
+    """
+    (rectangle ou None, score) : le score est le soutien moyen des quatre côtés
+    (0.6 à 1), plus 1 si un visage est détecté dans le rectangle.
+    """
+    if len(frames) < 2:
+        return None, 0.0
+    n, h, w = frames.shape
+    stable_h, stable_v = _stable_edges(frames)
+    segments = _horizontal_segments(stable_h, int(w * MIN_SEGMENT_RATIO))
+    # Les bords de l'image servent de côtés (webcam collée à un bord)
+    segments += [(0, 0, w), (h - 1, 0, w)]
+    motion = frames.astype(np.float32).std(axis=0)
+    faces = _face_centers(frames)
+
+    best, best_score = None, 0.0
+    for i, (ya, ax0, ax1) in enumerate(segments):
+        for yb, bx0, bx1 in segments[i + 1:]:
+            y1, y2 = min(ya, yb), max(ya, yb)
+            x1, x2 = max(ax0, bx0), min(ax1, bx1)
+            # Les deux côtés doivent se recouvrir (les bords d'image s'adaptent à l'autre côté)
+            lengths = [length for length in (ax1 - ax0, bx1 - bx0) if length < w]
+            if x2 - x1 < 0.8 * max(lengths, default=w):
+                continue
+            bw, bh = x2 - x1, y2 - y1
+            if bh <= 0 or bw <= 0:
+                continue
+            area = bw * bh / (w * h)
+            if not (MIN_AREA_RATIO <= area <= MAX_AREA_RATIO and MIN_ASPECT <= bw / bh <= MAX_ASPECT):
+                continue
+            sides = [
+                _side_support(stable_h, y1, x1, x2, True, h),
+                _side_support(stable_h, y2, x1, x2, True, h),
+                _side_support(stable_v, x1, y1, y2, False, w),
+                _side_support(stable_v, x2, y1, y2, False, w),
+            ]
+            if min(sides) < MIN_SIDE_SUPPORT:
+                continue
+            inside_motion = float(motion[y1 + 2:y2 - 1, x1 + 2:x2 - 1].mean()) if bw > 4 and bh > 4 else 0.0
+            if inside_motion < MIN_INSIDE_MOTION:
+                continue
+            score = sum(sides) / 4
+            if any(x1 <= fx <= x2 and y1 <= fy <= y2 for fx, fy, _, _ in faces):
+                score += 1.0
+            if score > best_score:
+                best, best_score = (x1, y1, x2, y2), score
+    return best, best_score
+
+
+def detect_person_box(frames):
+    """
+    Zone du streamer : la webcam si elle est détectée, sinon un cadre autour
+    du visage le plus fréquent (si OpenCV est disponible), sinon None.
+    """
+    return scored_person_box(frames)[0]
+
+
+def scored_person_box(frames):
+    """
+    (zone du streamer ou None, score) : score de la webcam, ou pour un cadre autour
+    du visage, la proportion d'images où un visage est détecté.
+    """
+    box, score = scored_webcam_box(frames)
+    if box:
+        return box, score
+    faces = _face_centers(frames)
+    if not faces:
+        return None, 0.0
+    n, h, w = frames.shape
+    fx, fy, fw, fh = np.median(np.array(faces), axis=0)
+    half_w, half_h = 1.5 * fw, 2.0 * fh
+    return ((int(max(0, fx - half_w)), int(max(0, fy - 1.2 * fh)),
+             int(min(w, fx + half_w)), int(min(h, fy - 1.2 * fh + 2 * half_h))),
+            min(1.0, len(faces) / n))
+
+
+def _to_source(box, frames, src_size):
+    h, w = frames.shape[1:]
+    sx, sy = src_size[0] / w, src_size[1] / h
+    x1, y1, x2, y2 = box
+    return {'x1': int(x1 * sx), 'y1': int(y1 * sy), 'x2': int(x2 * sx), 'y2': int(y2 * sy)}
+
+
+def detect_webcam(path, person=False):
+    """
+    Coordonnées {'x1', 'y1', 'x2', 'y2'} (pixels source) de la webcam — ou, avec
+    person=True, de la zone du streamer — ou None si rien n'est trouvé.
+    """
+    return scored_detection(path, person=person)[0]
+
+
+def scored_detection(path, person=False):
+    """
+    (coordonnées comme detect_webcam ou None, score de la détection).
+    """
+    frames, src_size = sample_frames(path)
+    box, score = scored_person_box(frames) if person else scored_webcam_box(frames)
+    return (_to_source(box, frames, src_size) if box else None), score
+
+
+# --------------------------------------------------------------
+# Cache par streamer / jeu
+# --------------------------------------------------------------
+def _layout_key(clip_data, kind):
+    """
+    Clé de cache du streamer et du jeu du clip, ou None si l'un des deux est inconnu
+    (une clé partagée par tous les jeux propagerait la mise en page d'un seul).
+    """
+    streamer = clip_data.get('broadcaster_id') or clip_data.get('broadcaster_name')
+    game = clip_data.get('game_id')
+    if not streamer or not game:
+        return None
+    return f"{kind}:{streamer}:{game}"
+
+
+def _load_cache():
+    try:
+        with open(LAYOUT_CACHE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    os.makedirs(os.path.dirname(LAYOUT_CACHE_FILE), exist_ok=True)
+    tmp_path = LAYOUT_CACHE_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, LAYOUT_CACHE_FILE)
+
+
+def cached_webcam_layout(path, clip_data, person=False):
+    """
+    Zone webcam (ou streamer) du clip, en pixels source, depuis le cache
+    streamer/jeu ou détectée puis mise en cache. None si aucune zone trouvée.
+    """
+    src_w, src_h, _, _ = probe(path)
+    key = _layout_key(clip_data or {}, "person" if person else "webcam")
+    entry = None
+    if key:
+        with _cache_lock:
+            entry = _load_cache().get(key)
+    if entry and time.time() - entry.get("detected_at", 0) < entry.get("ttl", LAYOUT_CACHE_UNSURE_TTL_SECONDS):
+        rel = entry.get("box")
+        if rel is None:
+            return None
+        print(f"📐 Mise en page en cache pour {key}.")
+        return {'x1': int(rel[0] * src_w), 'y1': int(rel[1] * src_h),
+                'x2': int(rel[2] * src_w), 'y2': int(rel[3] * src_h)}
+
+    print(f"🔎 Détection de la zone webcam ({key or 'streamer ou jeu inconnu, sans cache'})...")
+    try:
+        coords, score = scored_detection(path, person=person)
+    except Exception as e:
+        print(f"⚠️ Détection de la webcam impossible : {e}")
+        return None
+    confident = coords is not None and score >= LAYOUT_CONFIDENT_SCORE
+    if coords:
+        print(f"\t✅ Zone trouvée : {coords} (score {score:.2f}{'' if confident else ', peu sûre'})")
+    else:
+        print("\t⏩ Aucune zone webcam détectée.")
+
+    if key:
+        rel = None if coords is None else [coords['x1'] / src_w, coords['y1'] / src_h,
+                                           coords['x2'] / src_w, coords['y2'] / src_h]
+        ttl = LAYOUT_CACHE_TTL_SECONDS if confident else LAYOUT_CACHE_UNSURE_TTL_SECONDS
+        with _cache_lock:
+            cache = _load_cache()
+            cache[key] = {"box": rel, "score": round(score, 3), "ttl": ttl, "detected_at": time.time()}
+            _save_cache(cache)
+    return coords
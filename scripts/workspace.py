@@ -0,0 +1,145 @@
+# scripts/workspace.py
+"""
+Espaces de travail par clip.
+
+Chaque clip Twitch dispose de son propre dossier sous data/workspaces/,
+nommé d'après un hash de son ID : plusieurs clips peuvent ainsi être
+téléchargés et rendus en même temps sans se marcher dessus. Les dossiers
+les moins récemment utilisés sont supprimés dès que le budget disque
+(WORKSPACE_DISK_BUDGET_MB) est dépassé.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+WORKSPACES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data', 'workspaces'))
+WORKSPACE_DISK_BUDGET_MB = int(os.getenv("WORKSPACE_DISK_BUDGET_MB", "2048"))
+
+_MARKER_FILE = "workspace.json"
+
+_active_lock = threading.Lock()
+_active = set()
+
+
+def workspace_key(clip_id):
+    return hashlib.sha256(str(clip_id).encode('utf-8')).hexdigest()[:16]
+
+
+def temp_audio_path(output_path):
+    """
+    Fichier audio temporaire de MoviePy, placé à côté de la vidéo de sortie
+    (et non dans le dossier courant) pour que deux rendus ne partagent jamais le même.
+    """
+    return os.path.splitext(output_path)[0] + "-temp-audio.m4a"
+
+
+class ClipWorkspace:
+    def __init__(self, clip_id):
+        self.clip_id = clip_id
+        self.key = workspace_key(clip_id)
+        self.path = os.path.join(WORKSPACES_DIR, self.key)
+
+    @property
+    def raw_path(self):
+        return os.path.join(self.path, "raw_clip.mp4")
+
+    @property
+    def processed_path(self):
+        return os.path.join(self.path, "processed_short.mp4")
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def fresh_raw_path(self):
+        """
+        Chemin du clip brut après suppression des restes d'une exécution précédente
+        (fichiers intermédiaires d'anciens formats). Le fichier final, qui n'existe
+        qu'une fois complet, et le .part, qui permet la reprise, sont conservés.
+        """
+        keep = {os.path.basename(self.raw_path), os.path.basename(self.raw_path) + ".part"}
+        for name in os.listdir(self.path):
+            if name.startswith("raw_clip.") and name not in keep:
+                os.remove(os.path.join(self.path, name))
+        return self.raw_path
+
+    def touch(self):
+        with open(os.path.join(self.path, _MARKER_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"twitch_clip_id": self.clip_id, "last_used": time.time()}, f)
+
+    def release(self):
+        with _active_lock:
+            _active.discard(self.key)
+        enforce_disk_budget()
+
+    def remove(self):
+        with _active_lock:
+            _active.discard(self.key)
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def acquire_workspace(clip_id):
+    """
+    Crée (ou réutilise) l'espace de travail d'un clip et le marque comme actif :
+    il ne sera pas supprimé par le nettoyage tant que release() n'a pas été appelé.
+    """
+    ws = ClipWorkspace(clip_id)
+    os.makedirs(ws.path, exist_ok=True)
+    with _active_lock:
+        _active.add(ws.key)
+    ws.touch()
+    return ws
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _last_used(path):
+    try:
+        return os.path.getmtime(os.path.join(path, _MARKER_FILE))
+    except OSError:
+        return os.path.getmtime(path)
+
+
+def enforce_disk_budget(budget_mb=None):
+    """
+    Supprime les espaces de travail inactifs les plus anciens jusqu'à repasser
+    sous le budget disque. Retourne le nombre de dossiers supprimés.
+    """
+    if budget_mb is None:
+        budget_mb = WORKSPACE_DISK_BUDGET_MB
+    if not os.path.isdir(WORKSPACES_DIR):
+        return 0
+
+    budget = budget_mb * 1024 * 1024
+    entries = []
+    for key in os.listdir(WORKSPACES_DIR):
+        path = os.path.join(WORKSPACES_DIR, key)
+        if os.path.isdir(path):
+            entries.append((_last_used(path), key, path, _dir_size(path)))
+
+    total = sum(e[3] for e in entries)
+    removed = 0
+    for _, key, path, size in sorted(entries):
+        if total <= budget:
+            break
+        with _active_lock:
+            if key in _active:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed += 1
+
+    if removed:
+        print(f"🧹 {removed} espace(s) de travail supprimé(s) (budget : {budget_mb} Mo).")
+    return removed
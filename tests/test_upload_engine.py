@@ -0,0 +1,124 @@
+# tests/test_upload_engine.py
+"""
+Moteur d'upload reprenable face à une fausse session HTTP (réponses scriptées).
+"""
+import os
+import sys
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import upload_engine
+from upload_engine import ResumableUploadEngine, UploadError
+
+CHUNK = upload_engine.CHUNK_GRANULARITY
+SESSION_URI = "https://upload.test/session/1"
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None, body=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body
+        self.text = ""
+
+    def json(self):
+        if self._body is None:
+            raise ValueError("pas de JSON")
+        return self._body
+
+
+def partial(last_byte=None):
+    return FakeResponse(308, {"Range": f"bytes=0-{last_byte}"} if last_byte is not None else {})
+
+
+class FakeSession:
+    """
+    Session compatible requests : POST crée la session, chaque PUT consomme la
+    réponse scriptée suivante (FakeResponse ou exception à lever).
+    """
+    def __init__(self, put_responses):
+        self.put_responses = list(put_responses)
+        self.puts = []
+
+    def post(self, url, **kwargs):
+        return FakeResponse(200, {"Location": SESSION_URI})
+
+    def put(self, url, data=None, headers=None, **kwargs):
+        self.puts.append(headers["Content-Range"])
+        if not self.put_responses:
+            raise AssertionError(f"PUT inattendu : {headers['Content-Range']}")
+        resp = self.put_responses.pop(0)
+        if isinstance(resp, Exception):
+            raise resp
+        return resp
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "short.mp4"
+    path.write_bytes(os.urandom(2 * CHUNK))
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(upload_engine.time, "sleep", lambda seconds: None)
+
+
+def make_engine(session, tmp_path, max_retries=3):
+    return ResumableUploadEngine(session, base_url="https://upload.test", chunk_size=CHUNK,
+                                 max_retries=max_retries, sessions_dir=str(tmp_path / "sessions"))
+
+
+def test_chunks_sent_in_order(video, tmp_path):
+    session = FakeSession([partial(CHUNK - 1), FakeResponse(200, body={"id": "abc"})])
+    assert make_engine(session, tmp_path).upload(video, {"snippet": {}}) == {"id": "abc"}
+    assert session.puts == [f"bytes 0-{CHUNK - 1}/{2 * CHUNK}", f"bytes {CHUNK}-{2 * CHUNK - 1}/{2 * CHUNK}"]
+    assert not os.listdir(tmp_path / "sessions")
+
+
+def test_5xx_resumes_from_acknowledged_offset(video, tmp_path):
+    session = FakeSession([
+        partial(CHUNK - 1),
+        FakeResponse(503),                 # bloc 2 perdu
+        partial(CHUNK + 99),               # le serveur a reçu 100 octets du bloc 2
+        FakeResponse(201, body={"id": "abc"}),
+    ])
+    assert make_engine(session, tmp_path).upload(video, {})["id"] == "abc"
+    assert session.puts[2] == f"bytes */{2 * CHUNK}"
+    assert session.puts[3] == f"bytes {CHUNK + 100}-{2 * CHUNK - 1}/{2 * CHUNK}"
+
+
+def test_network_error_is_retried(video, tmp_path):
+    session = FakeSession([
+        requests.ConnectionError("coupure"),
+        partial(None),                     # rien reçu
+        partial(CHUNK - 1),
+        FakeResponse(200, body={"id": "abc"}),
+    ])
+    assert make_engine(session, tmp_path).upload(video, {})["id"] == "abc"
+    assert session.puts[2] == f"bytes 0-{CHUNK - 1}/{2 * CHUNK}"
+
+
+def test_stalled_offset_counts_as_failed_attempt(video, tmp_path):
+    # 308 sans Range puis Range inchangé : le bloc n'avance pas, jamais en boucle infinie
+    session = FakeSession([partial(None)] * 10)
+    with pytest.raises(UploadError, match="abandon après 3 tentatives"):
+        make_engine(session, tmp_path, max_retries=3).upload(video, {})
+    assert len(session.puts) == 4
+
+
+def test_stalled_offset_recovers_when_server_advances(video, tmp_path):
+    session = FakeSession([partial(None), partial(CHUNK - 1), partial(CHUNK - 1),
+                           FakeResponse(200, body={"id": "abc"})])
+    assert make_engine(session, tmp_path).upload(video, {})["id"] == "abc"
+    assert len(session.puts) == 4
+
+
+def test_non_retryable_error_fails(video, tmp_path):
+    session = FakeSession([FakeResponse(403, body={"error": {"message": "quota", "errors": [{"reason": "quotaExceeded"}]}})])
+    with pytest.raises(UploadError, match="quotaExceeded"):
+        make_engine(session, tmp_path).upload(video, {})